@@ -0,0 +1,123 @@
+"""Decode-once image cache for YOLO training.
+
+prepare_dataset.py decodes and resizes every image a single time into one
+memory-mapped uint8 array (N x S x S x 3, long side = S). A JSON manifest
+records each image's content hash, slot and shapes, plus which training
+images are near-duplicates and should be skipped. train_yolo.py reads
+training batches straight out of the memmap through CachedYOLODataset.
+"""
+import hashlib
+import json
+import logging
+import math
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+IMG_FORMATS = {"bmp", "dng", "jpeg", "jpg", "mpo", "png", "tif", "tiff", "webp", "pfm", "heic"}
+
+CACHE_DIR = Path("dataset") / "cache"
+MANIFEST_NAME = "manifest.json"
+IMAGES_NAME = "images.npy"
+
+logger = logging.getLogger(__name__)
+
+
+def list_images(path):
+    """Expand a dataset split entry (dir, list of dirs, or txt file) into image paths."""
+    if isinstance(path, (list, tuple)):
+        return [p for entry in path for p in list_images(entry)]
+    path = Path(path)
+    if path.is_file() and path.suffix == ".txt":
+        return [Path(line.strip()) for line in path.read_text().splitlines() if line.strip()]
+    return sorted(p for p in path.rglob("*") if p.suffix.lower().lstrip(".") in IMG_FORMATS)
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def resize_long_side(im, size):
+    """Same geometry and interpolation as ultralytics' rect-mode load_image."""
+    h0, w0 = im.shape[:2]
+    r = size / max(h0, w0)
+    if r != 1:
+        w, h = min(math.ceil(w0 * r), size), min(math.ceil(h0 * r), size)
+        im = cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR)
+    return im
+
+
+def dhash(im):
+    """64-bit difference hash of a BGR image; robust to re-encoding and small shifts."""
+    gray = cv2.cvtColor(im, cv2.COLOR_BGR2GRAY) if im.ndim == 3 else im
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hamming_to_all(value, hashes):
+    """Hamming distance between one 64-bit hash and an array of hashes."""
+    x = np.bitwise_xor(hashes, np.uint64(value))
+    return np.unpackbits(x.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class ImageCache:
+    """Read side of the cache. Opens the memmap lazily so it survives worker pickling."""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        with open(self.cache_dir / MANIFEST_NAME) as f:
+            manifest = json.load(f)
+        self.imgsz = manifest["imgsz"]
+        self.entries = {str(Path(e["path"]).resolve()): e for e in manifest["entries"]}
+        self.duplicates = {p for p, e in self.entries.items() if e.get("duplicate_of")}
+        self._images = None
+        self._stale = set()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_images"] = None
+        return state
+
+    @property
+    def images(self):
+        if self._images is None:
+            self._images = np.load(self.cache_dir / IMAGES_NAME, mmap_mode="r")
+        return self._images
+
+    def is_duplicate(self, path):
+        return str(Path(path).resolve()) in self.duplicates
+
+    def read(self, path):
+        """Return (image copy, original (h, w)) or None if the path is not cached."""
+        key = str(Path(path).resolve())
+        entry = self.entries.get(key)
+        if entry is None or entry.get("slot") is None or key in self._stale:
+            return None
+        if not self._is_fresh(key, entry):
+            self._stale.add(key)
+            logger.warning("⚠️ %s changed since prepare_dataset.py, decoding it from disk", path)
+            return None
+        h, w = entry["resized_shape"]
+        # Copy: augmentations write into the array in place.
+        im = np.array(self.images[entry["slot"], :h, :w])
+        return im, tuple(entry["orig_shape"])
+
+    @staticmethod
+    def _is_fresh(path, entry):
+        """The file still has the size and mtime it had when it was cached."""
+        try:
+            stat = Path(path).stat()
+        except OSError:
+            return False
+        return stat.st_size == entry.get("size") and stat.st_mtime_ns == entry.get("mtime_ns")
+
+
+def load_cache(imgsz, cache_dir=CACHE_DIR):
+    """ImageCache for this image size, or None if there is no matching cache."""
+    if not (Path(cache_dir) / MANIFEST_NAME).exists():
+        return None
+    cache = ImageCache(cache_dir)
+    return cache if cache.imgsz == imgsz else None
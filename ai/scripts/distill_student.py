@@ -0,0 +1,243 @@
+"""Distill the trained YOLO detector into a pruned bottle / not-bottle classifier.
+
+Pipeline:
+  1. Label every training image with the teacher's bottle confidence (cached).
+  2. Train StudentNet on the chute ROI with a KD + hard-label loss and an L1
+     penalty on BatchNorm scales.
+  3. Physically prune the weakest channels and fine-tune the narrower net.
+  4. Export TorchScript + sidecar JSON for RealAI.
+
+Run from the ai/ directory:
+    python scripts/distill_student.py --negatives path/to/non_bottle_images
+"""
+import argparse
+import json
+import os
+import random
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+import torch.nn.functional as F
+from ultralytics import YOLO
+from ultralytics.data.utils import check_det_dataset, img2label_paths
+
+from dataset_cache import list_images
+from student_model import (
+    DEFAULT_ROI,
+    STUDENT_DIR,
+    STUDENT_IMG_SIZE,
+    TEACHER_MODEL,
+    StudentNet,
+    bn_sparsity_penalty,
+    export_student,
+    preprocess,
+    prune_channels,
+)
+
+DATA_PATH = os.path.join("dataset", "data.yaml")
+
+EPOCHS = 40
+FINETUNE_EPOCHS = 15
+BATCH = 64
+LR = 3e-3
+TEMPERATURE = 2.0
+KD_ALPHA = 0.7          # weight of the teacher term vs. hard labels
+SPARSITY = 1e-4         # BN gamma L1 weight during the first stage
+PRUNE_RATIO = 0.5
+TEACHER_CONF = 0.05     # keep low detections so soft targets stay informative
+TEACHER_BATCH = 16
+ACCEPT_THRESHOLD = 0.3  # backend BOTTLE_CONFIDENCE_THRESHOLD
+
+BOTTLE_KEYWORDS = ("bottle", "water", "plastic")
+
+
+def hard_label(image_path, bottle_ids):
+    """1 if the YOLO label file contains a bottle box, else 0."""
+    label_path = Path(img2label_paths([str(image_path)])[0])
+    if not label_path.exists():
+        return 0
+    for line in label_path.read_text().splitlines():
+        parts = line.split()
+        if parts and int(float(parts[0])) in bottle_ids:
+            return 1
+    return 0
+
+
+def teacher_targets(teacher, images, cache_file):
+    """Teacher P(bottle) per image; cached by path + mtime so reruns skip inference."""
+    cache = {}
+    if cache_file.exists():
+        cache = json.loads(cache_file.read_text())
+
+    bottle_ids = {
+        i for i, name in teacher.names.items()
+        if any(kw in name.lower() for kw in BOTTLE_KEYWORDS)
+    }
+
+    def key(p):
+        return f"{p}:{p.stat().st_mtime_ns}"
+
+    todo = [p for p in images if key(p) not in cache]
+    for start in range(0, len(todo), TEACHER_BATCH):
+        chunk = todo[start:start + TEACHER_BATCH]
+        results = teacher.predict(source=[str(p) for p in chunk], conf=TEACHER_CONF, verbose=False)
+        for p, result in zip(chunk, results):
+            conf = 0.0
+            if result.boxes is not None and len(result.boxes) > 0:
+                for c, cls in zip(result.boxes.conf.tolist(), result.boxes.cls.tolist()):
+                    if int(cls) in bottle_ids:
+                        conf = max(conf, float(c))
+            cache[key(p)] = conf
+        print(f"  teacher: {min(start + TEACHER_BATCH, len(todo))}/{len(todo)}", end="\r")
+
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    cache_file.write_text(json.dumps(cache))
+    return np.array([cache[key(p)] for p in images], dtype=np.float32), bottle_ids
+
+
+def load_split(images, roi, img_size):
+    """Decode and preprocess once; keep uint8 to hold the whole split in RAM."""
+    out = np.empty((len(images), 3, img_size, img_size), dtype=np.uint8)
+    keep = np.ones(len(images), dtype=bool)
+    for i, p in enumerate(images):
+        frame = cv2.imread(str(p))
+        if frame is None:
+            keep[i] = False
+            continue
+        out[i] = preprocess(frame, roi, img_size).astype(np.uint8)
+    return out, keep
+
+
+def kd_loss(logits, soft, hard, temperature, alpha):
+    """Binary KD: teacher probability is turned into tempered two-class targets."""
+    soft = soft.clamp(1e-4, 1 - 1e-4)
+    teacher_logit = torch.log(soft) - torch.log1p(-soft)
+    teacher_probs = torch.stack(
+        [torch.sigmoid(-teacher_logit / temperature), torch.sigmoid(teacher_logit / temperature)], dim=1
+    )
+    kd = F.kl_div(
+        F.log_softmax(logits / temperature, dim=1), teacher_probs, reduction="batchmean"
+    ) * temperature ** 2
+    ce = F.cross_entropy(logits, hard)
+    return alpha * kd + (1 - alpha) * ce
+
+
+def augment(x):
+    if random.random() < 0.5:
+        x = x.flip(3)
+    gain = torch.empty(x.shape[0], 1, 1, 1).uniform_(0.7, 1.3)
+    return (x * gain).clamp(0, 255)
+
+
+def run_epochs(net, data, epochs, lr, sparsity, device):
+    x_all, soft_all, hard_all = data
+    opt = torch.optim.AdamW(net.parameters(), lr=lr, weight_decay=1e-4)
+    sched = torch.optim.lr_scheduler.OneCycleLR(
+        opt, max_lr=lr, total_steps=max(1, epochs * ((len(x_all) + BATCH - 1) // BATCH))
+    )
+    for epoch in range(epochs):
+        net.train()
+        order = torch.randperm(len(x_all))
+        total = 0.0
+        for start in range(0, len(order), BATCH):
+            idx = order[start:start + BATCH]
+            x = augment(torch.from_numpy(x_all[idx.numpy()]).float())
+            x = (x.flip(1) / 255.0).to(device)
+            logits = net(x)
+            loss = kd_loss(logits, soft_all[idx].to(device), hard_all[idx].to(device), TEMPERATURE, KD_ALPHA)
+            if sparsity:
+                loss = loss + sparsity * bn_sparsity_penalty(net)
+            opt.zero_grad()
+            loss.backward()
+            opt.step()
+            sched.step()
+            total += loss.item() * len(idx)
+        print(f"  epoch {epoch + 1}/{epochs}  loss={total / len(x_all):.4f}")
+
+
+@torch.no_grad()
+def agreement(net, x_all, soft_all, device):
+    net.eval()
+    preds = []
+    for start in range(0, len(x_all), 256):
+        x = torch.from_numpy(x_all[start:start + 256]).float()
+        probs = torch.softmax(net((x.flip(1) / 255.0).to(device)), dim=1)
+        preds.append(probs[:, 1].cpu() >= ACCEPT_THRESHOLD)
+    preds = torch.cat(preds)
+    return float((preds == (soft_all >= ACCEPT_THRESHOLD)).float().mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--teacher", default=str(TEACHER_MODEL))
+    parser.add_argument("--negatives", nargs="*", default=[], help="Extra directories of non-bottle images")
+    parser.add_argument("--roi", type=float, nargs=4, default=DEFAULT_ROI, metavar=("X0", "Y0", "X1", "Y1"))
+    parser.add_argument("--imgsz", type=int, default=STUDENT_IMG_SIZE)
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--finetune-epochs", type=int, default=FINETUNE_EPOCHS)
+    parser.add_argument("--prune-ratio", type=float, default=PRUNE_RATIO)
+    parser.add_argument("--out", default=str(STUDENT_DIR))
+    args = parser.parse_args()
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    out_dir = Path(args.out)
+    roi = tuple(args.roi)
+
+    print("\n🚀 Distilling bottle classifier")
+    print(f"Teacher: {args.teacher}")
+    print(f"ROI: {roi}  Image size: {args.imgsz}  Device: {device}\n")
+
+    data = check_det_dataset(args.data)
+    teacher = YOLO(args.teacher)
+
+    splits = {}
+    for split in ("train", "val"):
+        images = list_images(data[split])
+        if split == "train":
+            for neg_dir in args.negatives:
+                images += list_images(neg_dir)
+        soft, bottle_ids = teacher_targets(teacher, images, out_dir.parent / f"teacher_{split}.json")
+        hard = np.array([hard_label(p, bottle_ids) for p in images], dtype=np.int64)
+        x, keep = load_split(images, roi, args.imgsz)
+        splits[split] = (x[keep], torch.from_numpy(soft[keep]), torch.from_numpy(hard[keep]))
+        print(f"📦 {split}: {int(keep.sum())} images, {int(hard[keep].sum())} with bottles")
+
+    net = StudentNet().to(device)
+    print(f"\n🎓 Stage 1: distillation with channel sparsity ({args.epochs} epochs)")
+    run_epochs(net, splits["train"], args.epochs, LR, SPARSITY, device)
+    dense_agree = agreement(net, splits["val"][0], splits["val"][1], device)
+
+    print(f"\n✂️  Stage 2: pruning {args.prune_ratio:.0%} of channels")
+    net = prune_channels(net.cpu(), args.prune_ratio).to(device)
+    print(f"  widths after pruning: {net.widths}")
+    run_epochs(net, splits["train"], args.finetune_epochs, LR / 3, 0.0, device)
+    pruned_agree = agreement(net, splits["val"][0], splits["val"][1], device)
+
+    params = sum(p.numel() for p in net.parameters())
+    model_path = export_student(
+        net,
+        out_dir,
+        roi=roi,
+        img_size=args.imgsz,
+        extra={
+            "teacher": str(args.teacher),
+            "val_agreement_dense": dense_agree,
+            "val_agreement_pruned": pruned_agree,
+            "params": params,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+    )
+
+    print("\n✅ Distillation complete!")
+    print(f"🤝 Teacher agreement (val): dense {dense_agree:.2%} → pruned {pruned_agree:.2%}")
+    print(f"🔢 Parameters: {params:,}")
+    print(f"🏆 Student model: {model_path}")
+    print("   Compare with: python scripts/evaluate_student.py")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Compare the distilled student against the YOLO teacher on the validation split.
+
+Reports decision agreement, accuracy against ground-truth labels and
+per-scan CPU latency for both models.
+
+Run from the ai/ directory:
+    python scripts/evaluate_student.py [--threads 2]
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+from ultralytics import YOLO
+from ultralytics.data.utils import check_det_dataset
+
+from dataset_cache import list_images
+from distill_student import ACCEPT_THRESHOLD, BOTTLE_KEYWORDS, DATA_PATH, hard_label
+from student_model import STUDENT_DIR, TEACHER_MODEL, load_student, preprocess
+
+WARMUP = 5
+
+
+def teacher_decision(result, bottle_ids):
+    conf = 0.0
+    if result.boxes is not None and len(result.boxes) > 0:
+        for c, cls in zip(result.boxes.conf.tolist(), result.boxes.cls.tolist()):
+            if int(cls) in bottle_ids:
+                conf = max(conf, float(c))
+    return conf
+
+
+def summarize(name, decisions, labels, latencies):
+    decisions = np.asarray(decisions)
+    labels = np.asarray(labels)
+    tp = int(((decisions == 1) & (labels == 1)).sum())
+    fp = int(((decisions == 1) & (labels == 0)).sum())
+    fn = int(((decisions == 0) & (labels == 1)).sum())
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    lat = np.asarray(latencies) * 1000
+    print(
+        f"{name:<8} acc={float((decisions == labels).mean()):.2%}  "
+        f"P={precision:.2%}  R={recall:.2%}  "
+        f"latency p50={np.percentile(lat, 50):.2f}ms p95={np.percentile(lat, 95):.2f}ms"
+    )
+    return float(np.percentile(lat, 50))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--teacher", default=str(TEACHER_MODEL))
+    parser.add_argument("--student", default=str(STUDENT_DIR / "student.torchscript"))
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads (mimic the kiosk)")
+    parser.add_argument("--limit", type=int, default=None, help="Evaluate at most N images")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    data = check_det_dataset(args.data)
+    images = list_images(data["val"])[:args.limit]
+
+    teacher = YOLO(args.teacher)
+    teacher.to("cpu")
+    bottle_ids = {
+        i for i, name in teacher.names.items()
+        if any(kw in name.lower() for kw in BOTTLE_KEYWORDS)
+    }
+    student, meta = load_student(args.student)
+    roi, img_size = tuple(meta["roi"]), meta["img_size"]
+
+    print("\n📊 Evaluating student vs teacher (CPU)")
+    print(f"Teacher: {args.teacher}")
+    print(f"Student: {args.student} (widths={meta.get('widths')})")
+    print(f"Images: {len(images)}  Threads: {torch.get_num_threads()}\n")
+
+    frames, labels = [], []
+    for p in images:
+        frame = cv2.imread(str(p))
+        if frame is not None:
+            frames.append(frame)
+            labels.append(hard_label(p, bottle_ids))
+    warm = frames[0] if frames else np.zeros((480, 640, 3), np.uint8)
+
+    for _ in range(WARMUP):
+        teacher.predict(source=warm, conf=0.25, verbose=False)
+    t_dec, t_lat = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        result = teacher.predict(source=frame, conf=0.25, verbose=False)[0]
+        t_lat.append(time.perf_counter() - start)
+        t_dec.append(int(teacher_decision(result, bottle_ids) >= ACCEPT_THRESHOLD))
+
+    with torch.inference_mode():
+        x = torch.from_numpy(preprocess(warm, roi, img_size))[None]
+        for _ in range(WARMUP):
+            student(x)
+        s_dec, s_lat = [], []
+        for frame in frames:
+            start = time.perf_counter()
+            x = torch.from_numpy(preprocess(frame, roi, img_size))[None]
+            prob = float(student(x)[0, 1])
+            s_lat.append(time.perf_counter() - start)
+            s_dec.append(int(prob >= ACCEPT_THRESHOLD))
+
+    t_p50 = summarize("teacher", t_dec, labels, t_lat)
+    s_p50 = summarize("student", s_dec, labels, s_lat)
+    agree = float((np.asarray(t_dec) == np.asarray(s_dec)).mean())
+
+    print(f"\n🤝 Decision agreement: {agree:.2%}")
+    print(f"⚡ Speed-up (p50): {t_p50 / s_p50:.1f}x")
+    print(f"💾 Sizes: teacher {os.path.getsize(args.teacher) / 1e6:.1f}MB, "
+          f"student {Path(args.student).stat().st_size / 1e6:.2f}MB\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""Streaming batch inference over image directories and video files.
+
+Frames are decoded by a pool of worker threads into a bounded queue, run
+through YOLO in batches, and written incrementally as one row per
+detection to JSONL or Parquet (a directory of part files). Progress is
+checkpointed after every flush so an interrupted run can be resumed with
+--resume without duplicating or losing rows.
+
+Run from the ai/ directory:
+    python scripts/inference.py footage/ clips/day1.mp4 --out runs/infer/day1.parquet --resume
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import torch
+from ultralytics import YOLO
+
+from dataset_cache import IMG_FORMATS
+
+AI_ROOT = Path(__file__).parent.parent
+TRAINED_MODEL = AI_ROOT / "runs" / "detect" / "train" / "weights" / "best.pt"
+MODEL_PATH = str(TRAINED_MODEL) if TRAINED_MODEL.exists() else str(AI_ROOT / "yolo11n.pt")
+CONFIDENCE_THRESHOLD = 0.25  # Match backend threshold
+DEVICE = "cuda" if torch.cuda.is_available() else ("mps" if torch.backends.mps.is_available() else "cpu")
+
+VIDEO_FORMATS = {"asf", "avi", "gif", "m4v", "mkv", "mov", "mp4", "mpeg", "mpg", "ts", "wmv", "webm"}
+
+BATCH = 16
+WORKERS = min(8, os.cpu_count() or 4)
+IMAGE_CHUNK = 64          # images per decode work unit
+PARQUET_PART_ROWS = 50_000
+FLUSH_SECONDS = 5.0       # max time between JSONL checkpoints
+PARQUET_FLUSH_SECONDS = 60.0  # parts are files, so checkpoint less often
+
+_END = object()
+
+
+def collect_sources(paths):
+    """Split CLI paths into (sorted image files, sorted video files)."""
+    images, videos = [], []
+    for raw in paths:
+        path = Path(raw)
+        files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+        for f in files:
+            ext = f.suffix.lower().lstrip(".")
+            if ext in IMG_FORMATS:
+                images.append(f)
+            elif ext in VIDEO_FORMATS:
+                videos.append(f)
+    return images, videos
+
+
+class Progress:
+    """Append-only checkpoint log next to the output.
+
+    Each line is written only after the rows it covers are durable, and
+    records the output position (JSONL byte offset / Parquet part count)
+    at that point so a resume can discard anything written after it.
+    """
+
+    def __init__(self, out_path, resume):
+        self.path = Path(f"{out_path}.progress.jsonl")
+        self.done_images = set()
+        self.video_frames = {}
+        self.done_videos = set()
+        self.position = 0
+        if resume and self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn final line from a crash
+                    self.done_images.update(rec["images"])
+                    self.video_frames.update(rec["videos"])
+                    self.done_videos.update(rec["completed_videos"])
+                    self.position = rec["position"]
+        elif self.path.exists():
+            self.path.unlink()
+        self._f = open(self.path, "a")
+
+    def commit(self, position, images, videos, completed_videos):
+        rec = {
+            "position": position,
+            "images": images,
+            "videos": videos,
+            "completed_videos": completed_videos,
+            "time": time.time(),
+        }
+        self._f.write(json.dumps(rec) + "\n")
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self):
+        self._f.close()
+
+
+class JsonlWriter:
+    def __init__(self, path, position):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(self.path, "a+b")
+        self._f.truncate(position)
+        self._f.seek(position)
+
+    def write(self, rows):
+        for row in rows:
+            self._f.write(json.dumps(row).encode() + b"\n")
+
+    def flush(self):
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        return self._f.tell()
+
+    def close(self):
+        self._f.close()
+
+
+class ParquetWriter:
+    """Writes part-NNNNNN.parquet files into a directory; one part per flush."""
+
+    def __init__(self, path, position):
+        import polars as pl
+
+        self._pl = pl
+        self.dir = Path(path)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        for stale in self.dir.glob("part-*.parquet"):
+            if int(stale.stem.split("-")[1]) >= position:
+                stale.unlink()
+        self.parts = position
+        self.rows = []
+
+    def write(self, rows):
+        self.rows.extend(rows)
+
+    def flush(self):
+        if self.rows:
+            part = self.dir / f"part-{self.parts:06d}.parquet"
+            tmp = part.with_suffix(".tmp")
+            self._pl.DataFrame(self.rows, schema=ROW_SCHEMA).write_parquet(tmp)
+            os.replace(tmp, part)
+            self.parts += 1
+            self.rows = []
+        return self.parts
+
+    def close(self):
+        pass
+
+
+ROW_SCHEMA = {
+    "source": str,
+    "frame": int,
+    "timestamp_ms": float,
+    "class_id": int,
+    "class_name": str,
+    "confidence": float,
+    "x1": float,
+    "y1": float,
+    "x2": float,
+    "y2": float,
+    "width": int,
+    "height": int,
+}
+
+
+def decode_worker(units, frames, progress, vid_stride, stop):
+    """Pull work units and push ("frame" | "image_failed" | "video_end", ...) items."""
+    while not stop.is_set():
+        try:
+            kind, payload = units.get_nowait()
+        except queue.Empty:
+            return
+
+        if kind == "images":
+            for path in payload:
+                im = cv2.imread(str(path))
+                if im is None:
+                    print(f"⚠️ Unreadable image skipped: {path}")
+                    frames.put(("image_failed", str(path)))
+                else:
+                    frames.put(("frame", str(path), 0, None, im, True))
+            continue
+
+        path = str(payload)
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            print(f"⚠️ Cannot open video: {path}")
+            continue
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        resume_after = progress.video_frames.get(path, -1)
+        idx = -1
+        try:
+            while not stop.is_set():
+                # grab() skips the decode for frames we do not need.
+                if not cap.grab():
+                    break
+                idx += 1
+                if idx <= resume_after or idx % vid_stride:
+                    continue
+                ok, im = cap.retrieve()
+                if not ok:
+                    break
+                ts = idx * 1000.0 / fps if fps else None
+                frames.put(("frame", path, idx, ts, im, False))
+        finally:
+            cap.release()
+        if not stop.is_set():
+            frames.put(("video_end", path))
+
+
+def to_rows(result, source, frame_idx, ts, names):
+    h, w = result.orig_shape
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return []
+    rows = []
+    for (x1, y1, x2, y2), conf, cls in zip(boxes.xyxy.tolist(), boxes.conf.tolist(), boxes.cls.tolist()):
+        rows.append({
+            "source": source,
+            "frame": frame_idx,
+            "timestamp_ms": ts,
+            "class_id": int(cls),
+            "class_name": names[int(cls)],
+            "confidence": round(float(conf), 4),
+            "x1": round(x1, 1),
+            "y1": round(y1, 1),
+            "x2": round(x2, 1),
+            "y2": round(y2, 1),
+            "width": w,
+            "height": h,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="+", help="Image files/directories and video files")
+    parser.add_argument("--out", required=True, help="Output .jsonl file or .parquet directory")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--conf", type=float, default=CONFIDENCE_THRESHOLD)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--batch", type=int, default=BATCH)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--vid-stride", type=int, default=1, help="Use every Nth video frame")
+    parser.add_argument("--device", default=DEVICE)
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint")
+    args = parser.parse_args()
+
+    out = Path(args.out)
+    progress = Progress(out, args.resume)
+    if out.suffix == ".parquet":
+        writer = ParquetWriter(out, progress.position)
+        flush_seconds = PARQUET_FLUSH_SECONDS
+    else:
+        writer = JsonlWriter(out, progress.position)
+        flush_seconds = FLUSH_SECONDS
+
+    images, videos = collect_sources(args.sources)
+    images = [p for p in images if str(p) not in progress.done_images]
+    videos = [p for p in videos if str(p) not in progress.done_videos]
+
+    print(f"\n🚀 Loading model from {args.model} on device: {args.device}")
+    model = YOLO(args.model)
+    model.to(args.device)
+    names = model.names
+
+    print(f"📂 Pending: {len(images)} images, {len(videos)} videos"
+          f"{' (resumed)' if args.resume and progress.position else ''}")
+    print(f"⚙️  Batch: {args.batch}  Decode workers: {args.workers}  Output: {out}\n")
+
+    units = queue.Queue()
+    for video in videos:
+        units.put(("video", video))
+    for start in range(0, len(images), IMAGE_CHUNK):
+        units.put(("images", images[start:start + IMAGE_CHUNK]))
+
+    frames = queue.Queue(maxsize=args.batch * 4)
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=decode_worker, args=(units, frames, progress, args.vid_stride, stop), daemon=True)
+        for _ in range(max(1, args.workers))
+    ]
+    for t in threads:
+        t.start()
+
+    def close_queue():
+        for t in threads:
+            t.join()
+        frames.put(_END)
+
+    threading.Thread(target=close_queue, daemon=True).start()
+
+    pending_images, pending_videos, pending_completed = [], {}, []
+    batch = []
+    n_frames = n_rows = 0
+    last_flush = start_time = time.perf_counter()
+
+    def run_batch():
+        nonlocal n_frames, n_rows
+        if not batch:
+            return
+        results = model.predict(
+            source=[item[3] for item in batch], conf=args.conf, imgsz=args.imgsz, verbose=False
+        )
+        for (source, frame_idx, ts, _, is_image), result in zip(batch, results):
+            rows = to_rows(result, source, frame_idx, ts, names)
+            writer.write(rows)
+            n_rows += len(rows)
+            if is_image:
+                pending_images.append(source)
+            else:
+                pending_videos[source] = frame_idx
+        n_frames += len(batch)
+        batch.clear()
+
+    def checkpoint():
+        nonlocal last_flush
+        position = writer.flush()
+        progress.commit(position, pending_images[:], dict(pending_videos), pending_completed[:])
+        pending_images.clear()
+        pending_videos.clear()
+        pending_completed.clear()
+        last_flush = time.perf_counter()
+        elapsed = last_flush - start_time
+        print(f"  {n_frames} frames, {n_rows} detections, {n_frames / elapsed:.1f} fps", end="\r")
+
+    try:
+        while True:
+            item = frames.get()
+            if item is _END:
+                break
+            kind = item[0]
+            if kind == "frame":
+                batch.append(item[1:])
+                if len(batch) >= args.batch:
+                    run_batch()
+            elif kind == "image_failed":
+                pending_images.append(item[1])
+            else:
+                # A video is only complete once its last frames are committed with it.
+                run_batch()
+                pending_completed.append(item[1])
+
+            if time.perf_counter() - last_flush >= flush_seconds or (
+                isinstance(writer, ParquetWriter) and len(writer.rows) >= PARQUET_PART_ROWS
+            ):
+                run_batch()
+                checkpoint()
+        run_batch()
+        checkpoint()
+    except KeyboardInterrupt:
+        stop.set()
+        print("\n⏹️  Interrupted — progress saved up to the last checkpoint. Re-run with --resume.")
+    finally:
+        writer.close()
+        progress.close()
+
+    elapsed = time.perf_counter() - start_time
+    print(f"\n✅ Done: {n_frames} frames, {n_rows} detections in {elapsed:.1f}s "
+          f"({n_frames / max(elapsed, 1e-9):.1f} fps)")
+    print(f"📁 Output: {out}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Decode, resize and dedupe the YOLO dataset once, ahead of training.
+
+Writes dataset/cache/images.npy (memory-mapped, one slot per image) and
+dataset/cache/manifest.json (content hash, slot and shapes per image).
+Re-running is a no-op while the dataset files are unchanged.
+
+Training images whose content hash or perceptual hash (dHash) matches an
+earlier training image are flagged as duplicates and skipped by
+train_yolo.py. Validation images are cached but never dropped.
+
+Run from the ai/ directory:
+    python scripts/prepare_dataset.py
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import cv2
+import numpy as np
+from ultralytics.data.utils import check_det_dataset
+
+from dataset_cache import (
+    CACHE_DIR,
+    IMAGES_NAME,
+    MANIFEST_NAME,
+    dhash,
+    file_hash,
+    hamming_to_all,
+    list_images,
+    resize_long_side,
+)
+from train_yolo import DATA_PATH, IMG_SIZE
+
+DEDUPE_DISTANCE = 4  # max differing dHash bits for a near-duplicate
+WORKERS = os.cpu_count() or 4
+
+
+def load_manifest():
+    path = CACHE_DIR / MANIFEST_NAME
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def decode_into(images, imgsz, slot, path):
+    """Decode one image into its memmap slot; (orig hw, resized hw, dHash) or None."""
+    im = cv2.imread(str(path))
+    if im is None:
+        return None
+    orig = im.shape[:2]
+    im = resize_long_side(im, imgsz)
+    h, w = im.shape[:2]
+    images[slot, :h, :w] = im
+    return orig, (h, w), dhash(im)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--imgsz", type=int, default=IMG_SIZE)
+    parser.add_argument("--dedupe-distance", type=int, default=DEDUPE_DISTANCE,
+                        help="dHash bit distance treated as duplicate (-1 disables near-dup removal)")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    data = check_det_dataset(args.data)
+    items = [(p, "train") for p in list_images(data["train"])]
+    items += [(p, "val") for p in list_images(data["val"])]
+
+    print("\n🧰 Preparing training cache")
+    print(f"Dataset: {args.data}")
+    print(f"Images: {len(items)}  Image size: {args.imgsz}  Workers: {args.workers}\n")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.workers) as pool:
+        hashes = list(pool.map(file_hash, [p for p, _ in items]))
+
+    previous = load_manifest()
+    if (
+        previous
+        and previous["imgsz"] == args.imgsz
+        and previous.get("dedupe_distance") == args.dedupe_distance
+        and [(e["path"], e["sha1"], e.get("size"), e.get("mtime_ns")) for e in previous["entries"]]
+        == [
+            (str(p.resolve()), h, p.stat().st_size, p.stat().st_mtime_ns)
+            for (p, _), h in zip(items, hashes)
+        ]
+        and (CACHE_DIR / IMAGES_NAME).exists()
+    ):
+        print("✅ Cache is up to date, nothing to do.")
+        return
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_images = CACHE_DIR / f"{IMAGES_NAME}.tmp"
+    images = np.lib.format.open_memmap(
+        tmp_images, mode="w+", dtype=np.uint8, shape=(len(items), args.imgsz, args.imgsz, 3)
+    )
+
+    with ThreadPoolExecutor(args.workers) as pool:
+        decode = partial(decode_into, images, args.imgsz)
+        decoded = list(pool.map(decode, range(len(items)), [p for p, _ in items]))
+    images.flush()
+    # Close the memmap before the rename below (required on Windows).
+    del decode, images
+
+    entries = []
+    seen_sha = {}
+    kept_paths = []
+    kept_dhashes = np.empty(len(items), dtype=np.uint64)
+    exact = near = corrupt = 0
+    for slot, ((path, split), sha1, info) in enumerate(zip(items, hashes, decoded)):
+        stat = path.stat()
+        entry = {
+            "path": str(path.resolve()),
+            "split": split,
+            "sha1": sha1,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "slot": None,
+        }
+        entries.append(entry)
+        if info is None:
+            corrupt += 1
+            continue
+        orig, resized, dh = info
+        entry.update(slot=slot, orig_shape=list(orig), resized_shape=list(resized), dhash=f"{dh:016x}")
+        if split != "train":
+            continue
+
+        if sha1 in seen_sha:
+            entry["duplicate_of"] = seen_sha[sha1]
+            exact += 1
+            continue
+        seen_sha[sha1] = entry["path"]
+
+        if args.dedupe_distance >= 0 and kept_paths:
+            dist = hamming_to_all(dh, kept_dhashes[:len(kept_paths)])
+            j = int(dist.argmin())
+            if dist[j] <= args.dedupe_distance:
+                entry["duplicate_of"] = kept_paths[j]
+                near += 1
+                continue
+        kept_dhashes[len(kept_paths)] = dh
+        kept_paths.append(entry["path"])
+
+    os.replace(tmp_images, CACHE_DIR / IMAGES_NAME)
+    manifest = {
+        "imgsz": args.imgsz,
+        "dedupe_distance": args.dedupe_distance,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "entries": entries,
+    }
+    tmp_manifest = CACHE_DIR / f"{MANIFEST_NAME}.tmp"
+    with open(tmp_manifest, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_manifest, CACHE_DIR / MANIFEST_NAME)
+
+    size_gb = (CACHE_DIR / IMAGES_NAME).stat().st_size / 1e9
+    print(f"✅ Cached {len(items) - corrupt} images in {time.perf_counter() - start:.1f}s ({size_gb:.2f} GB)")
+    print(f"🧹 Duplicates skipped for training: {exact} exact, {near} near")
+    if corrupt:
+        print(f"⚠️ Unreadable images: {corrupt}")
+    print(f"📁 Cache: {CACHE_DIR}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Tiny bottle / not-bottle ROI classifier distilled from the YOLO detector.
+
+Shared by distill_student.py and evaluate_student.py. The exported
+TorchScript file is self-contained: the backend only needs torch and the
+JSON sidecar written next to it (see export_student).
+"""
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+
+AI_ROOT = Path(__file__).parent.parent
+TEACHER_MODEL = AI_ROOT / "runs" / "detect" / "train" / "weights" / "best.pt"
+STUDENT_DIR = AI_ROOT / "runs" / "distill" / "student" / "weights"
+
+# Index 1 must stay "bottle": the backend keys acceptance off the class name.
+CLASS_NAMES = ["other", "bottle"]
+
+STUDENT_IMG_SIZE = 96
+
+# Fixed chute region as (x0, y0, x1, y1) fractions of the camera frame.
+DEFAULT_ROI = (0.0, 0.0, 1.0, 1.0)
+
+DEFAULT_WIDTHS = (16, 32, 64, 128)
+
+
+def crop_roi(frame, roi=DEFAULT_ROI):
+    """Crop the chute region out of a BGR frame."""
+    h, w = frame.shape[:2]
+    x0, y0, x1, y1 = roi
+    return frame[int(y0 * h):int(y1 * h), int(x0 * w):int(x1 * w)]
+
+
+def preprocess(frame, roi=DEFAULT_ROI, img_size=STUDENT_IMG_SIZE):
+    """BGR uint8 frame -> float32 CHW array in [0, 255], BGR channel order."""
+    crop = crop_roi(frame, roi)
+    crop = cv2.resize(crop, (img_size, img_size), interpolation=cv2.INTER_AREA)
+    return np.ascontiguousarray(crop.transpose(2, 0, 1), dtype=np.float32)
+
+
+def conv_block(c_in, c_out):
+    return nn.Sequential(
+        nn.Conv2d(c_in, c_out, 3, stride=2, padding=1, bias=False),
+        nn.BatchNorm2d(c_out),
+        nn.ReLU(inplace=True),
+    )
+
+
+class StudentNet(nn.Module):
+    """Plain strided conv stack + global pooling.
+
+    Kept deliberately flat (no residuals or depthwise groups) so channel
+    pruning can physically drop filters without any graph surgery.
+    """
+
+    def __init__(self, widths=DEFAULT_WIDTHS, num_classes=len(CLASS_NAMES)):
+        super().__init__()
+        blocks = []
+        c_in = 3
+        for c_out in widths:
+            blocks.append(conv_block(c_in, c_out))
+            c_in = c_out
+        self.features = nn.Sequential(*blocks)
+        self.pool = nn.AdaptiveAvgPool2d(1)
+        self.head = nn.Linear(c_in, num_classes)
+
+    @property
+    def widths(self):
+        return tuple(block[0].out_channels for block in self.features)
+
+    def forward(self, x):
+        x = self.pool(self.features(x)).flatten(1)
+        return self.head(x)
+
+
+class ExportWrapper(nn.Module):
+    """Bakes input scaling and softmax into the exported graph."""
+
+    def __init__(self, net):
+        super().__init__()
+        self.net = net
+
+    def forward(self, x):
+        # x: N x 3 x H x W, BGR, 0..255
+        x = x.flip(1) / 255.0
+        return torch.softmax(self.net(x), dim=1)
+
+
+def bn_sparsity_penalty(net):
+    """L1 on BatchNorm scales (network slimming); drives prunable channels to 0."""
+    return sum(m.weight.abs().sum() for m in net.modules() if isinstance(m, nn.BatchNorm2d))
+
+
+def prune_channels(net, ratio):
+    """Return a physically narrower copy of net with the weakest channels removed.
+
+    Channels are ranked globally by |BN gamma|; every layer keeps at least a
+    quarter of its filters so no stage collapses.
+    """
+    gammas = torch.cat([block[1].weight.detach().abs() for block in net.features])
+    k = int(len(gammas) * ratio)
+    threshold = torch.sort(gammas).values[k] if k > 0 else gammas.min() - 1
+
+    keep = []
+    for block in net.features:
+        g = block[1].weight.detach().abs()
+        idx = torch.nonzero(g > threshold).flatten()
+        min_keep = max(1, block[0].out_channels // 4)
+        if len(idx) < min_keep:
+            idx = torch.argsort(g, descending=True)[:min_keep].sort().values
+        keep.append(idx)
+
+    pruned = StudentNet(widths=[len(idx) for idx in keep], num_classes=net.head.out_features)
+    prev = torch.arange(3)
+    for src, dst, idx in zip(net.features, pruned.features, keep):
+        dst[0].weight.data = src[0].weight.data[idx][:, prev].clone()
+        for name in ("weight", "bias", "running_mean", "running_var"):
+            getattr(dst[1], name).data = getattr(src[1], name).data[idx].clone()
+        prev = idx
+    pruned.head.weight.data = net.head.weight.data[:, prev].clone()
+    pruned.head.bias.data = net.head.bias.data.clone()
+    return pruned
+
+
+def export_student(net, out_dir, roi=DEFAULT_ROI, img_size=STUDENT_IMG_SIZE, extra=None):
+    """Write student.torchscript plus the student.json preprocessing sidecar."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    wrapper = ExportWrapper(net.cpu().eval())
+    example = torch.zeros(1, 3, img_size, img_size)
+    scripted = torch.jit.trace(wrapper, example)
+    scripted = torch.jit.freeze(scripted.eval())
+    model_path = out_dir / "student.torchscript"
+    scripted.save(str(model_path))
+
+    meta = {
+        "img_size": img_size,
+        "roi": list(roi),
+        "names": CLASS_NAMES,
+        "widths": list(net.widths),
+    }
+    meta.update(extra or {})
+    with open(out_dir / "student.json", "w") as f:
+        json.dump(meta, f, indent=2)
+    return model_path
+
+
+def load_student(model_path):
+    """Load an exported student and its sidecar metadata."""
+    model_path = Path(model_path)
+    model = torch.jit.load(str(model_path), map_location="cpu").eval()
+    with open(model_path.with_suffix(".json")) as f:
+        meta = json.load(f)
+    return model, meta
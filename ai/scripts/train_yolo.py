@@ -1,5 +1,12 @@
 from ultralytics import YOLO
+from ultralytics.data import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.utils import colorstr
+import cv2
 import os
+import torch
+
+from dataset_cache import load_cache
 
 DATA_PATH = os.path.join("dataset", "data.yaml")
 
@@ -9,29 +16,112 @@ IMG_SIZE = 640
 
 EPOCHS = 100
 
-BATCH = 8 
+BATCH = 8
+
+
+def select_device():
+    if torch.cuda.is_available():
+        return "cuda"
+    if torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+DEVICE = select_device()
+
+# Images are pre-decoded by prepare_dataset.py, so loader workers only run
+# augmentation; on CPU they compete with the training threads for cores.
+CPU_COUNT = os.cpu_count() or 4
+WORKERS = max(2, CPU_COUNT // 2) if DEVICE == "cpu" else min(8, CPU_COUNT)
+
+
+class CachedYOLODataset(YOLODataset):
+    """YOLODataset that reads pre-decoded images from the prepare_dataset.py memmap."""
+
+    def __init__(self, *args, image_cache=None, **kwargs):
+        self.image_cache = image_cache
+        super().__init__(*args, **kwargs)
+
+    def get_img_files(self, img_path):
+        files = super().get_img_files(img_path)
+        if self.augment:
+            files = [f for f in files if not self.image_cache.is_duplicate(f)]
+        return files
+
+    def load_image(self, i, rect_mode=True):
+        cached = self.image_cache.read(self.im_files[i])
+        if cached is None:
+            return super().load_image(i, rect_mode)
+
+        im, hw0 = cached
+        if not rect_mode and im.shape[:2] != (self.imgsz, self.imgsz):
+            im = cv2.resize(im, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
+
+        # Keep the mosaic sampling buffer behaviour; pixels live in the memmap.
+        if self.augment:
+            self.buffer.append(i)
+            if 1 < len(self.buffer) >= self.max_buffer_length:
+                self.buffer.pop(0)
+        return im, hw0, im.shape[:2]
+
+
+class CachedDetectionTrainer(DetectionTrainer):
+    image_cache = None
+
+    def build_dataset(self, img_path, mode="train", batch=None):
+        if self.image_cache is None:
+            return super().build_dataset(img_path, mode, batch)
+        gs = max(int(getattr(self, "stride", 32)), 32)
+        return CachedYOLODataset(
+            image_cache=self.image_cache,
+            img_path=img_path,
+            imgsz=self.args.imgsz,
+            batch_size=batch,
+            augment=mode == "train",
+            hyp=self.args,
+            rect=self.args.rect or mode == "val",
+            cache=None,
+            single_cls=self.args.single_cls or False,
+            stride=gs,
+            pad=0.0 if mode == "train" else 0.5,
+            prefix=colorstr(f"{mode}: "),
+            task=self.args.task,
+            classes=self.args.classes,
+            data=self.data,
+            fraction=self.args.fraction if mode == "train" else 1.0,
+        )
 
-DEVICE = "mps"
 
 def main():
+    image_cache = load_cache(IMG_SIZE)
+    CachedDetectionTrainer.image_cache = image_cache
+
     print("\n🚀 Starting optimized YOLO11 training")
     print(f"Dataset: {DATA_PATH}")
     print(f"Base Model: {MODEL_NAME}")
     print(f"Image Size: {IMG_SIZE}")
     print(f"Epochs: {EPOCHS}")
     print(f"Batch Size: {BATCH}")
-    print(f"Device: {DEVICE}\n")
+    print(f"Device: {DEVICE}")
+    print(f"Workers: {WORKERS}")
+    if image_cache is not None:
+        print(f"Image cache: {image_cache.cache_dir} ({len(image_cache.duplicates)} duplicates skipped)\n")
+    else:
+        print("Image cache: none (run scripts/prepare_dataset.py to avoid re-decoding every epoch)\n")
 
     model = YOLO(MODEL_NAME)
 
     results = model.train(
+        trainer=CachedDetectionTrainer,
         data=DATA_PATH,
         imgsz=IMG_SIZE,
         epochs=EPOCHS,
         batch=BATCH,
         device=DEVICE,
-        lr0=0.005,           
-        close_mosaic=20,     
+        workers=WORKERS,
+        cache=False,
+        lr0=0.005,
+        close_mosaic=20,
         augment=True,
 
         project="runs/detect",
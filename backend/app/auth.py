@@ -0,0 +1,48 @@
+"""Shared-secret authentication for admin and partner endpoints.
+
+CORS is open so the kiosk UI can be served from anywhere on the LAN; these
+dependencies are what keep other clients on that LAN away from endpoints
+that load code or mint value. Admin routes are disabled until
+RVM_ADMIN_TOKEN is set, and callers send it in the X-Admin-Token header.
+Partners get one token each via RVM_PARTNER_TOKENS="partner:token,..."
+and send it in X-Partner-Token; the partner id comes from the token, never
+from the request body.
+"""
+import hmac
+import os
+from typing import Dict, Optional
+
+from fastapi import Header, HTTPException
+
+ADMIN_TOKEN_ENV = "RVM_ADMIN_TOKEN"
+PARTNER_TOKENS_ENV = "RVM_PARTNER_TOKENS"
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """FastAPI dependency: reject the request unless it carries the admin token."""
+    expected = os.environ.get(ADMIN_TOKEN_ENV)
+    if not expected:
+        raise HTTPException(status_code=403, detail=f"Admin API disabled, set {ADMIN_TOKEN_ENV}")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), expected.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+def _partner_tokens() -> Dict[str, str]:
+    tokens = {}
+    for entry in os.environ.get(PARTNER_TOKENS_ENV, "").split(","):
+        partner_id, _, token = entry.strip().partition(":")
+        if partner_id and token:
+            tokens[partner_id] = token
+    return tokens
+
+
+def require_partner(x_partner_token: Optional[str] = Header(None)) -> str:
+    """FastAPI dependency: the id of the partner whose token the request carries."""
+    tokens = _partner_tokens()
+    if not tokens:
+        raise HTTPException(status_code=403, detail=f"Partner API disabled, set {PARTNER_TOKENS_ENV}")
+    if x_partner_token:
+        for partner_id, token in tokens.items():
+            if hmac.compare_digest(x_partner_token.encode(), token.encode()):
+                return partner_id
+    raise HTTPException(status_code=401, detail="Invalid partner token")
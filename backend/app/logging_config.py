@@ -0,0 +1,164 @@
+"""Non-blocking, structured logging for the backend.
+
+Callers only build a LogRecord and put it on a queue; a QueueListener
+thread formats it (JSON by default) and writes it out, so a slow terminal
+or disk never stalls a scan or the video feed.
+
+Hot loops can limit themselves per call site:
+
+    logger.warning("Failed to read frame", extra=every(5.0))   # at most once per 5 s
+    logger.debug("Frame stats", extra=sample(0.01))            # keep ~1% of records
+
+Every call site also has a flood guard (token bucket), and the next record
+that gets through reports how many were dropped in "suppressed".
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+LOG_FORMAT_ENV = "RVM_LOG_FORMAT"
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+# Attributes every LogRecord has; anything else came in via extra=.
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+_CONTROL_FIELDS = {"rate_limit", "sample"}
+
+
+def every(seconds: float) -> dict:
+    """extra= for a call site that should log at most once per `seconds`."""
+    return {"rate_limit": seconds}
+
+
+def sample(probability: float) -> dict:
+    """extra= for a call site that should keep only a fraction of its records."""
+    return {"sample": probability}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any extra= fields as top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and key not in _CONTROL_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """Per-call-site rate limiting and sampling.
+
+    A call site is (file, line). Records can ask for a minimum interval
+    (every()) or a sampling probability (sample()); all others share a
+    generous token bucket that only bites when a line floods.
+    """
+
+    def __init__(self, per_second: float = 20.0, burst: float = 50.0):
+        super().__init__()
+        self.per_second = per_second
+        self.burst = burst
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.pathname, record.lineno)
+        probability = getattr(record, "sample", None)
+        interval = getattr(record, "rate_limit", None)
+        if interval:
+            rate, burst = 1.0 / interval, 1.0
+        else:
+            rate, burst = self.per_second, self.burst
+
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                site = self._sites[key] = [burst, now, 0]
+            site[0] = min(burst, site[0] + (now - site[1]) * rate)
+            site[1] = now
+            if site[0] < 1.0 or (probability is not None and random.random() >= probability):
+                site[2] += 1
+                return False
+            site[0] -= 1.0
+            suppressed, site[2] = site[2], 0
+
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks and never pre-formats on the caller's thread."""
+
+    def __init__(self, log_queue: "queue.Queue"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener lives in this process, so the record can be handed
+        # over as-is; message formatting happens on the listener thread.
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.dropped:
+            record.dropped = self.dropped
+        try:
+            self.queue.put_nowait(record)
+            self.dropped = 0
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(level: int = logging.INFO, json_logs: Optional[bool] = None, queue_size: int = 10000):
+    """Route all logging (including uvicorn's) through a background writer.
+
+    JSON output unless RVM_LOG_FORMAT=text. Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    if json_logs is None:
+        json_logs = os.environ.get(LOG_FORMAT_ENV, "json").lower() != "text"
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if json_logs else logging.Formatter(TEXT_FORMAT))
+
+    log_queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    handler = _DroppingQueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    # uvicorn installs its own synchronous handlers; send it through ours.
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uv_logger = logging.getLogger(name)
+        uv_logger.handlers = []
+        uv_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
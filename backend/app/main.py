@@ -1,18 +1,24 @@
 """Main FastAPI application for Reverse Vending Machine."""
 import logging
 import asyncio
+import os
 import cv2
 from datetime import datetime
-from fastapi import FastAPI, HTTPException
+from typing import Optional
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
-from app.models import StatusResponse, ScanResponse, ConfirmResponse, State
-from app.services import StateManager
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+from app.models import (
+    StatusResponse, ScanResponse, ConfirmResponse, ModelCandidateRequest, CouponRequest, CouponResponse, State,
 )
+from app.auth import require_admin, require_partner
+from app.logging_config import every, setup_logging
+from app.modules.cpu_budget import apply_api_budget, pin_thread
+from app.modules.overlay import OverlayRenderer
+from app.services import CouponService, LaneRegistry, StateManager
+from app.services.telemetry_sync import TelemetrySync
+
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
@@ -30,57 +36,102 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-state_manager = StateManager()
+lanes = LaneRegistry()
+# Un-scoped /api/* routes act on the first configured lane.
+state_manager = lanes.default
+coupons = CouponService()
+
+# Fleet telemetry is opt-in: set RVM_COLLECTOR_URL to start syncing logs.
+telemetry = None
+if os.environ.get("RVM_COLLECTOR_URL"):
+    telemetry = TelemetrySync(
+        os.environ["RVM_COLLECTOR_URL"],
+        machine_id=os.environ.get("RVM_MACHINE_ID"),
+    )
+    telemetry.start()
+
+
+def _get_lane(lane_id: str) -> StateManager:
+    manager = lanes.get(lane_id)
+    if manager is None:
+        raise HTTPException(status_code=404, detail=f"Unknown lane: {lane_id}")
+    return manager
+
+
+@app.on_event("startup")
+async def apply_cpu_budget():
+    """Size the sync-endpoint threadpool and pin the event loop (video feed) thread."""
+    apply_api_budget(lanes.ai.cpu_profile)
+    pin_thread(lanes.ai.cpu_profile, "io")
+
+
+@app.on_event("startup")
+def reprint_pending_receipts():
+    """Print receipts that were confirmed but not printed before a crash."""
+    for manager in lanes.lanes.values():
+        _reprint_failed(manager)
 
 
 @app.on_event("shutdown")
 def shutdown_event():
     """Cleanup on shutdown."""
     logger.info("Shutdown event received")
-    state_manager.shutdown()
+    lanes.shutdown()
+    coupons.close()
+    if telemetry is not None:
+        telemetry.stop()
 
 
-@app.get("/api/video-feed")
-async def video_feed():
-    """Stream live camera feed with YOLO detection overlay using shared camera."""
+def _video_feed(manager: StateManager, overlay: bool = True):
+    """Stream live camera feed with YOLO detection overlay using shared camera.
+
+    Frames that carry no overlay are forwarded as the camera's own JPEG
+    when it streams MJPEG, so they are never decoded or re-encoded.
+    """
     async def generate():
-        camera = state_manager.ai.get_camera()
-        model = state_manager.ai.model
+        device = manager.camera_device
         frame_skip = 0
+        renderer = OverlayRenderer()
         
-        if camera is None:
+        if manager.ai.get_camera(device) is None:
             logger.error("Could not access shared camera for video feed")
             yield b''
             return
         
         try:
             while True:
-                with state_manager.ai.camera_lock:
-                    ret, frame = camera.read()
+                frame = manager.ai.read_frame(device)
                 
-                if not ret:
-                    logger.warning("Failed to read frame in video stream")
-                    state_manager.ai.release_camera()
-                    camera = state_manager.ai.get_camera()
-                    if camera is None:
+                if frame is None:
+                    logger.warning("Failed to read frame in video stream", extra=every(5.0))
+                    manager.ai.release_camera(device)
+                    if manager.ai.get_camera(device) is None:
                         break
                     continue
-        
+
+                frame_bytes = None
                 frame_skip += 1
-                if frame_skip % 2 == 0:
-                    if model:
+                if overlay and frame_skip % 2 == 0:
+                    # Re-read every frame so a hot-swapped model is picked up.
+                    model = manager.ai.model
+                    if model and frame.image is not None:
                         try:
-                            results = model.predict(source=frame, conf=0.25, verbose=False)
+                            results = model.predict(source=frame.image, conf=0.25, verbose=False)
                             if results and len(results) > 0:
-                                frame = results[0].plot()
+                                renderer.update(results[0])
                         except Exception as e:
-                            logger.error(f"Error in YOLO prediction: {e}")
+                            logger.error(f"Error in YOLO prediction: {e}", extra=every(5.0))
+
+                # Skipped frames reuse the last detections; with none, pass through.
+                if overlay and renderer.has_detections and frame.image is not None:
+                    ret, buffer = cv2.imencode('.jpg', renderer.draw(frame.image), [cv2.IMWRITE_JPEG_QUALITY, 80])
+                    if ret:
+                        frame_bytes = buffer.tobytes()
                 
-                ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-                if not ret:
+                if frame_bytes is None:
+                    frame_bytes = frame.to_jpeg(quality=80)
+                if frame_bytes is None:
                     continue
-                    
-                frame_bytes = buffer.tobytes()
                 
                 yield (b'--frame\r\n'
                        b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
@@ -98,6 +149,32 @@ async def video_feed():
     )
 
 
+@app.get("/api/video-feed")
+async def video_feed(overlay: bool = True):
+    """Stream live camera feed with YOLO detection overlay using shared camera."""
+    return _video_feed(state_manager, overlay)
+
+
+@app.get("/api/lanes/{lane_id}/video-feed")
+async def lane_video_feed(lane_id: str, overlay: bool = True):
+    """Live camera feed for one lane."""
+    return _video_feed(_get_lane(lane_id), overlay)
+
+
+@app.get("/api/lanes")
+def list_lanes():
+    """List configured lanes with their current state."""
+    return [
+        {
+            "lane_id": lane_id,
+            "camera_device": manager.camera_device,
+            "state": manager.get_status().state.value,
+            "arduino_status": manager.arduino.get_status(),
+        }
+        for lane_id, manager in lanes.lanes.items()
+    ]
+
+
 @app.get("/api/health")
 def health_check():
     """Health check endpoint."""
@@ -107,23 +184,35 @@ def health_check():
     }
 
 
+def _get_status(manager: StateManager):
+    """Get current system status."""
+    state = manager.get_status()
+    return state.to_dict()
+
+
 @app.get("/api/status", response_model=StatusResponse)
 def get_status():
     """Get current system status."""
-    state = state_manager.get_status()
-    return state.to_dict()
+    return _get_status(state_manager)
 
 
-@app.post("/api/scan", response_model=ScanResponse)
-def start_scan():
-    """Start scanning for an item (NO PRINTING HERE)."""
-    logger.info("\n" + "="*60)
-    logger.info("🔍 SCAN REQUEST RECEIVED")
-    logger.info("="*60)
+@app.get("/api/lanes/{lane_id}/status", response_model=StatusResponse)
+def lane_status(lane_id: str):
+    """Get current status of one lane."""
+    return _get_status(_get_lane(lane_id))
 
-    state = state_manager.get_status()
-    logger.info(f"Current state: {state.state.value}")
 
+def _start_scan(manager: StateManager):
+    """Start scanning for an item (NO PRINTING HERE)."""
+    state = manager.get_status()
+    logger.info(
+        f"🔍 Scan requested on lane {manager.lane_id} ({state.state.value})",
+        extra={"lane": manager.lane_id, "state": state.state.value},
+    )
+
+    if state.state == State.SCANNING:
+        logger.info(f"Scan requested on lane {manager.lane_id} while another scan is running")
+        raise HTTPException(status_code=409, detail="Lane is busy (scanning), please retry")
     if state.state != State.IDLE:
         logger.warning(f"❌ Scan requested while in {state.state.value} state")
         raise HTTPException(
@@ -131,14 +220,25 @@ def start_scan():
             detail=f"Cannot scan when in {state.state.value} state",
         )
 
-    logger.info("Starting scan detection...")
-    result = state_manager.start_scan()
-    logger.info(f"Scan completed. Result state: {result.state.value}")
+    result = manager.start_scan()
+    if result.state not in (State.VALID_ITEM, State.INVALID_ITEM):
+        # Another request won the scan, or a reset discarded this one; the
+        # item was never judged, so don't tell the customer it is invalid.
+        logger.info(f"Scan on lane {manager.lane_id} superseded ({result.state.value})")
+        raise HTTPException(
+            status_code=409,
+            detail=f"Lane is busy ({result.state.value}), please retry",
+        )
+
+    scan_fields = {
+        "lane": manager.lane_id,
+        "state": result.state.value,
+        "item": result.item_detected,
+        "confidence": result.confidence,
+    }
 
     if result.state == State.VALID_ITEM:
-        logger.info("✅ Valid item detected")
-        logger.info(f"📦 Detected: {result.item_detected} ({result.confidence:.2%})")
-        logger.info("="*60 + "\n")
+        logger.info(f"✅ Valid item detected: {result.item_detected} ({result.confidence:.2%})", extra=scan_fields)
 
         return ScanResponse(
             success=True,
@@ -148,8 +248,7 @@ def start_scan():
             message="Water bottle detected! Please confirm to complete.",
         )
 
-    logger.warning("❌ Invalid item detected")
-    logger.info("="*60 + "\n")
+    logger.warning(f"❌ Invalid item detected: {result.item_detected}", extra=scan_fields)
 
     return ScanResponse(
         success=False,
@@ -159,29 +258,37 @@ def start_scan():
         message=result.error_message or "Invalid item detected.",
     )
 
-@app.post("/api/confirm", response_model=ConfirmResponse)
-def confirm_drop():
-    """Confirm item drop and complete transaction (PRINTS ONCE)."""
-    state = state_manager.get_status()
 
-    # Idempotent safety: if already processed, do NOT print again
-    if state.state != State.VALID_ITEM:
-        logger.info(f"Confirm called while in {state.state.value} state - no action")
-        return ConfirmResponse(
-            success=True,
-            state=state.state.value,
-            message="Item already processed.",
-        )
+@app.post("/api/scan", response_model=ScanResponse)
+def start_scan():
+    """Start scanning for an item (NO PRINTING HERE)."""
+    return _start_scan(state_manager)
 
-    logger.info("🎟️ Processing confirm - closing trapdoor...")
-    result = state_manager.confirm_drop()
-    logger.info("✅ Valid item confirmed, transaction completed")
+
+@app.post("/api/lanes/{lane_id}/scan", response_model=ScanResponse)
+def lane_scan(lane_id: str):
+    """Start scanning on one lane."""
+    return _start_scan(_get_lane(lane_id))
+
+def _print_receipt(manager: StateManager, job: dict):
+    """Print the receipt for a claimed print job; returns the coupon code.
+
+    The coupon is issued once per job and journaled with it, so a receipt
+    reprinted after a crash or a failed print carries the same code.
+    """
+    item_detected = job["item_detected"]
+    confidence = job["confidence"] or 0.0
+    coupon_code = job.get("coupon_code")
+    if coupon_code is None:
+        try:
+            coupon_code = coupons.issue(lane_id=manager.lane_id, item=item_detected).code
+            manager.attach_coupon(job["bottle_id"], coupon_code)
+        except Exception as e:
+            logger.error(f"Coupon issue failed on confirm: {e}")
 
     # ✅ PRINT ONLY HERE
     try:
         from app.modules.printer import print_receipt
-        import random, string
-        coupon_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
         # Use ANSI escape codes for bold text (if supported by printer)
         bold_on = '\033[1m'
         bold_off = '\033[0m'
@@ -189,34 +296,93 @@ def confirm_drop():
             "================================\n"
             "      RECYCLING RECEIPT\n"
             "================================\n"
-            f"Item: {state.item_detected}\n"
-            f"Confidence: {state.confidence:.2%}\n"
+            f"Item: {item_detected}\n"
+            f"Confidence: {confidence:.2%}\n"
             f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
             "--------------------------------\n"
             "Coupon Code:\n"
-            f"{bold_on}{coupon_code}{bold_off}\n"
+            f"{bold_on}{coupon_code or 'UNAVAILABLE'}{bold_off}\n"
             "--------------------------------\n"
             "Thank you for recycling!\n"
             "\n"
         )
         if print_receipt(receipt_text):
             logger.info("📠 Receipt sent to printer successfully")
-        else:
-            logger.warning("⚠️ Failed to print receipt")
+            manager.print_finished(job["bottle_id"])
+            return coupon_code
+        logger.warning("⚠️ Failed to print receipt")
 
     except Exception as e:
         logger.error(f"Printing failed on confirm: {e}")
 
+    # Stays queued with its coupon code for /api/admin/receipts/reprint.
+    manager.print_failed(job["bottle_id"])
+    return coupon_code
+
+
+def _reprint_failed(manager: StateManager) -> dict:
+    """Retry every receipt on a lane whose print failed or was cut off by a restart."""
+    jobs = manager.claim_failed_print_jobs()
+    for job in jobs:
+        logger.warning(f"Reprinting receipt for bottle {job['bottle_id']} on lane {manager.lane_id}")
+        _print_receipt(manager, job)
+    return {
+        "lane_id": manager.lane_id,
+        "attempted": [job["bottle_id"] for job in jobs],
+        "pending": manager.pending_print_ids(),
+    }
+
+
+def _confirm_drop(manager: StateManager):
+    """Confirm item drop and complete transaction (PRINTS ONCE)."""
+    state = manager.get_status()
+
+    # Idempotent safety: if already processed, do NOT print again
+    if state.state != State.VALID_ITEM:
+        logger.info(f"Confirm called while in {state.state.value} state - no action")
+        return ConfirmResponse(
+            success=True,
+            state=state.state.value,
+            message="Item already processed.",
+        )
+
+    logger.info("🎟️ Processing confirm - closing trapdoor...")
+    result = manager.confirm_drop()
+
+    # Concurrent confirms all see the lane go idle; only one gets the job.
+    job = manager.claim_print_job()
+    if job is None:
+        return ConfirmResponse(
+            success=True,
+            state=result.state.value,
+            message="Item already processed.",
+        )
+    logger.info("✅ Valid item confirmed, transaction completed")
+
+    coupon_code = _print_receipt(manager, job)
+
     return ConfirmResponse(
         success=True,
         state=result.state.value,
         message="Item accepted. Thank you for recycling.",
+        coupon_code=coupon_code,
     )
 
-@app.post("/api/invalid-item-removed", response_model=StatusResponse)
-def invalid_item_removed():
+
+@app.post("/api/confirm", response_model=ConfirmResponse)
+def confirm_drop():
+    """Confirm item drop and complete transaction (PRINTS ONCE)."""
+    return _confirm_drop(state_manager)
+
+
+@app.post("/api/lanes/{lane_id}/confirm", response_model=ConfirmResponse)
+def lane_confirm(lane_id: str):
+    """Confirm item drop on one lane."""
+    return _confirm_drop(_get_lane(lane_id))
+
+def _invalid_item_removed(manager: StateManager):
     """Handle removal of invalid item."""
-    state = state_manager.get_status()
+    state = manager.get_status()
 
     if state.state != State.INVALID_ITEM:
         # If already idle or other state, just return ok (idempotent)
@@ -229,7 +395,7 @@ def invalid_item_removed():
             confidence=state.confidence,
         )
 
-    result = state_manager.handle_invalid_removal()
+    result = manager.handle_invalid_removal()
     logger.info("Invalid item removed, returning to IDLE")
 
     return StatusResponse(
@@ -240,6 +406,18 @@ def invalid_item_removed():
     )
 
 
+@app.post("/api/invalid-item-removed", response_model=StatusResponse)
+def invalid_item_removed():
+    """Handle removal of invalid item."""
+    return _invalid_item_removed(state_manager)
+
+
+@app.post("/api/lanes/{lane_id}/invalid-item-removed", response_model=StatusResponse)
+def lane_invalid_item_removed(lane_id: str):
+    """Handle removal of an invalid item on one lane."""
+    return _invalid_item_removed(_get_lane(lane_id))
+
+
 @app.post("/api/trigger-arduino")
 def trigger_arduino():
     """Dummy endpoint to test Arduino signal triggering."""
@@ -258,15 +436,116 @@ def trigger_arduino():
     }
 
 
-@app.post("/api/reset", response_model=StatusResponse)
-def reset_system():
+def _reset(manager: StateManager):
     """Emergency reset."""
     logger.warning("Emergency reset requested")
-    result = state_manager.reset()
+    result = manager.reset()
 
     return StatusResponse(
         state=result.state.value,
         item_detected=result.item_detected,
         confidence=result.confidence,
         error_message=result.error_message,
-    )
\ No newline at end of file
+    )
+
+
+@app.post("/api/reset", response_model=StatusResponse)
+def reset_system():
+    """Emergency reset."""
+    return _reset(state_manager)
+
+
+@app.post("/api/lanes/{lane_id}/reset", response_model=StatusResponse)
+def lane_reset(lane_id: str):
+    """Emergency reset of one lane."""
+    return _reset(_get_lane(lane_id))
+
+
+def _coupon_response(coupon) -> CouponResponse:
+    return CouponResponse(
+        code=coupon.code,
+        status=coupon.status,
+        lane_id=coupon.lane_id,
+        issued_at=coupon.issued_at,
+        redeemed_at=coupon.redeemed_at,
+        partner_id=coupon.partner_id,
+    )
+
+
+@app.post("/api/coupons/verify", response_model=CouponResponse, dependencies=[Depends(require_partner)])
+def verify_coupon(request: CouponRequest):
+    """Check whether a coupon code was issued and whether it is still unused."""
+    coupon = coupons.verify(request.code)
+    if coupon is None:
+        raise HTTPException(status_code=404, detail="Unknown coupon code")
+    return _coupon_response(coupon)
+
+
+@app.post("/api/coupons/redeem", response_model=CouponResponse)
+def redeem_coupon(request: CouponRequest, partner_id: str = Depends(require_partner)):
+    """Redeem a coupon code for the calling partner; each code can be redeemed once."""
+    redeemed, coupon = coupons.redeem(request.code, partner_id)
+    if coupon is None:
+        raise HTTPException(status_code=404, detail="Unknown coupon code")
+    if not redeemed:
+        raise HTTPException(status_code=409, detail="Coupon already redeemed")
+    return _coupon_response(coupon)
+
+
+@app.post("/api/admin/coupons", response_model=CouponResponse, dependencies=[Depends(require_admin)])
+def issue_coupon():
+    """Issue a coupon outside a transaction (e.g. goodwill after a jam)."""
+    return _coupon_response(coupons.issue())
+
+
+@app.get("/api/admin/model", dependencies=[Depends(require_admin)])
+def model_status():
+    """Live, previous and candidate model details with shadow statistics."""
+    return lanes.ai.model_status()
+
+
+@app.post("/api/admin/model/candidate", dependencies=[Depends(require_admin)])
+def load_candidate_model(request: ModelCandidateRequest):
+    """Load a candidate model in the background and shadow a sample of live scans."""
+    logger.info(f"Candidate model requested: {request.model_path}")
+    try:
+        return lanes.ai.load_candidate(request.model_path, request.sample_rate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.delete("/api/admin/model/candidate", dependencies=[Depends(require_admin)])
+def discard_candidate_model():
+    """Stop shadowing and drop the candidate model."""
+    return {"success": lanes.ai.discard_candidate()}
+
+
+@app.post("/api/admin/model/promote", dependencies=[Depends(require_admin)])
+def promote_candidate_model(min_samples: Optional[int] = None, force: bool = False):
+    """Atomically swap the shadowed candidate in as the live model."""
+    try:
+        report = lanes.ai.promote_candidate(min_samples, force=force)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "promoted": report, "status": lanes.ai.model_status()}
+
+
+@app.post("/api/admin/model/rollback", dependencies=[Depends(require_admin)])
+def rollback_model():
+    """Instantly restore the model that was live before the last promotion."""
+    try:
+        return lanes.ai.rollback_model()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/api/admin/receipts/reprint", dependencies=[Depends(require_admin)])
+def reprint_receipts():
+    """Retry receipts whose print failed, with their original coupon codes."""
+    return _reprint_failed(state_manager)
+
+
+@app.post("/api/lanes/{lane_id}/admin/receipts/reprint", dependencies=[Depends(require_admin)])
+def lane_reprint_receipts(lane_id: str):
+    """Retry failed receipts on one lane."""
+    return _reprint_failed(_get_lane(lane_id))
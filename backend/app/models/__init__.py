@@ -1,6 +1,6 @@
 """Initialize models package."""
 from .state import State, SystemState
-from .schemas import StatusResponse, ScanResponse, ConfirmResponse
+from .schemas import StatusResponse, ScanResponse, ConfirmResponse, ModelCandidateRequest, CouponRequest, CouponResponse
 
 __all__ = [
     "State",
@@ -8,4 +8,7 @@ __all__ = [
     "StatusResponse",
     "ScanResponse",
     "ConfirmResponse",
+    "ModelCandidateRequest",
+    "CouponRequest",
+    "CouponResponse",
 ]
@@ -1,5 +1,5 @@
 """Request and response schemas for API endpoints."""
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 
 
@@ -21,4 +21,23 @@ class ScanResponse(BaseModel):
 class ConfirmResponse(BaseModel):
     success: bool
     state: str
-    message: str
\ No newline at end of file
+    message: str
+    coupon_code: Optional[str] = None
+
+
+class ModelCandidateRequest(BaseModel):
+    model_path: str
+    sample_rate: float = Field(0.25, gt=0.0, le=1.0)
+
+
+class CouponRequest(BaseModel):
+    code: str
+
+
+class CouponResponse(BaseModel):
+    code: str
+    status: str
+    lane_id: Optional[str] = None
+    issued_at: Optional[float] = None
+    redeemed_at: Optional[float] = None
+    partner_id: Optional[str] = None
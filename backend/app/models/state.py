@@ -12,12 +12,15 @@ class State(str, Enum):
     PRINTING = "printing"
 
 
-@dataclass
+@dataclass(frozen=True)
 class SystemState:
+    """Immutable lane state; StateManager publishes a new one per transition."""
+
     state: State
     item_detected: Optional[str] = None
     confidence: Optional[float] = None
     error_message: Optional[str] = None
+    version: int = 0
 
     def to_dict(self):
         return {
@@ -25,4 +28,14 @@ class SystemState:
             "item_detected": self.item_detected,
             "confidence": self.confidence,
             "error_message": self.error_message,
-        }
\ No newline at end of file
+            "version": self.version,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SystemState":
+        return cls(
+            state=State(data["state"]),
+            item_detected=data.get("item_detected"),
+            confidence=data.get("confidence"),
+            error_message=data.get("error_message"),
+        )
@@ -1,6 +1,18 @@
 """Initialize modules package."""
 from .ai import RealAI
 from .arduino import ArduinoController
+from .capture import DetectorLabeler, HardNegativeCollector
+from .frames import CameraFrame
+from .recorder import ClipRecorder
+from .student import StudentClassifier
 
-__all__ = ["RealAI", "ArduinoController"]
+__all__ = [
+    "RealAI",
+    "ArduinoController",
+    "CameraFrame",
+    "DetectorLabeler",
+    "ClipRecorder",
+    "HardNegativeCollector",
+    "StudentClassifier",
+]
 
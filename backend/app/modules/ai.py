@@ -1,24 +1,56 @@
 """Real AI inference using YOLO11n."""
 import cv2
 import logging
+import os
 import threading
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional
+from typing import Any, List, Optional
 from ultralytics import YOLO
+from .cpu_budget import CpuProfile, apply_process_budget, load_profile
+from .frames import MJPG, CameraFrame
+from .shadow import CandidateModel
+from .student import StudentClassifier
 
 logger = logging.getLogger(__name__)
 
 BOTTLE_CONFIDENCE_THRESHOLD = 0.3
+MODELS_DIR_ENV = "RVM_MODELS_DIR"
+PROMOTE_MIN_SAMPLES_ENV = "RVM_PROMOTE_MIN_SAMPLES"
+DEFAULT_PROMOTE_MIN_SAMPLES = 50
+
+
+@dataclass
+class Detection:
+    """Top detection plus the frame it came from and every box (normalized xywh)."""
+    detected_class: str
+    confidence: float
+    frame: Any = None
+    boxes: List[tuple] = field(default_factory=list)
+    # "detector", "student" (never has boxes) or "none" (no inference ran).
+    source: str = "detector"
 
 
 class RealAI:
     """YOLO-based object detection service."""
 
-    def __init__(self, model_path: Optional[str] = None):
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        student_path: Optional[str] = None,
+        mjpeg: bool = True,
+        cpu_profile: Optional[CpuProfile] = None,
+    ):
         logger.info("Initializing AI module")
 
+        # Thread pools are sized before the model runs anything.
+        self.cpu_profile = cpu_profile or load_profile()
+        apply_process_budget(self.cpu_profile)
+
+        ai_root = Path(__file__).parent.parent.parent.parent / "ai"
+
         if model_path is None:
-            ai_root = Path(__file__).parent.parent.parent.parent / "ai"
             best_model = ai_root / "runs" / "detect" / "train" / "weights" / "best.pt"
 
             if best_model.exists():
@@ -36,77 +68,319 @@ class RealAI:
             self.model_loaded = False
             self.model = None
             logger.exception("Failed to load AI model")
+        self.model_path = model_path
+
+        # The distilled student, when present, answers scans instead of the
+        # detector; the detector is still used for the preview overlay.
+        if student_path is None:
+            student_model = ai_root / "runs" / "distill" / "student" / "weights" / "student.torchscript"
+            if student_model.exists():
+                student_path = str(student_model)
+
+        self.student = None
+        self.student_path = None
+        if student_path is not None:
+            try:
+                self.student = StudentClassifier(student_path, BOTTLE_CONFIDENCE_THRESHOLD)
+                self.student_path = student_path
+                logger.info("Using distilled student classifier for scans")
+            except Exception:
+                logger.exception("Failed to load student classifier, falling back to detector")
 
-        self.camera = None
+        # Cameras are keyed by device index so several lanes can share one
+        # RealAI (and one loaded model) while each reads its own camera.
         self.camera_device = 0
-        self.camera_lock = threading.Lock()
-
-    def get_camera(self):
-        """Return a shared camera instance."""
-        if self.camera is None or not self.camera.isOpened():
-            logger.info("Opening camera")
-            self.camera = cv2.VideoCapture(self.camera_device)
-            if not self.camera.isOpened():
-                logger.error("Failed to open camera")
+        self.mjpeg = mjpeg
+        self.cameras = {}
+        self.camera_locks = {}
+        self.frame_listeners = {}
+        self._cameras_lock = threading.Lock()
+
+        # Hot swap bookkeeping. Readers take one reference to self.model /
+        # self.student per call, so a swap is a single attribute store and no
+        # request ever sees a half-loaded model.
+        self.swap_lock = threading.Lock()
+        self.candidate: Optional[CandidateModel] = None
+        self.previous = None
+
+    @property
+    def camera_lock(self):
+        """Lock guarding the default camera."""
+        return self.get_camera_lock(self.camera_device)
+
+    def get_camera_lock(self, device: Optional[int] = None):
+        device = self.camera_device if device is None else device
+        with self._cameras_lock:
+            return self.camera_locks.setdefault(device, threading.Lock())
+
+    def add_frame_listener(self, callback, device: Optional[int] = None):
+        """Register a callable that receives every frame read from a camera."""
+        device = self.camera_device if device is None else device
+        with self._cameras_lock:
+            self.frame_listeners.setdefault(device, []).append(callback)
+
+    def publish_frame(self, frame: CameraFrame, device: Optional[int] = None):
+        """Hand a freshly read frame to listeners (e.g. the clip recorder)."""
+        device = self.camera_device if device is None else device
+        for callback in self.frame_listeners.get(device, ()):
+            try:
+                callback(frame)
+            except Exception:
+                logger.exception("Frame listener failed")
+
+    def get_camera(self, device: Optional[int] = None):
+        """Return the shared camera instance for a device."""
+        device = self.camera_device if device is None else device
+        camera = self.cameras.get(device)
+        if camera is None or not camera.isOpened():
+            logger.info("Opening camera %d", device)
+            camera = cv2.VideoCapture(device)
+            self.cameras[device] = camera
+            if not camera.isOpened():
+                logger.error("Failed to open camera %d", device)
                 return None
-        return self.camera
+            if self.mjpeg:
+                self._request_mjpeg(camera, device)
+        return camera
 
-    def capture_frame(self):
-        """Capture a single frame from the camera."""
-        try:
-            with self.camera_lock:
-                cam = self.get_camera()
-                if cam is None:
-                    return None
+    def _request_mjpeg(self, camera, device: int):
+        """Ask the camera for MJPEG and keep its JPEGs instead of decoding them.
 
-                ret, frame = cam.read()
-                if ret:
-                    return frame
+        Raw output is only enabled once the device confirms MJPG; on other
+        formats (e.g. YUYV) OpenCV must keep converting to BGR.
+        """
+        camera.set(cv2.CAP_PROP_FOURCC, MJPG)
+        if int(camera.get(cv2.CAP_PROP_FOURCC)) != MJPG:
+            logger.info("Camera %d does not offer MJPEG, decoding in OpenCV", device)
+            return
+        if camera.set(cv2.CAP_PROP_CONVERT_RGB, 0):
+            logger.info("Camera %d streaming MJPEG passthrough", device)
 
-                logger.error("Failed to read frame from camera")
+    def read_frame(self, device: Optional[int] = None) -> Optional[CameraFrame]:
+        """Read one frame, left compressed when the camera delivers MJPEG."""
+        with self.get_camera_lock(device):
+            cam = self.get_camera(device)
+            if cam is None:
                 return None
+            ret, raw = cam.read()
+        if not ret or raw is None:
+            return None
+        frame = CameraFrame.from_capture(raw)
+        self.publish_frame(frame, device)
+        return frame
+
+    def capture_frame(self, device: Optional[int] = None):
+        """Capture a single frame from the camera as BGR pixels."""
+        try:
+            frame = self.read_frame(device)
+            if frame is not None:
+                return frame.image
+
+            logger.error("Failed to read frame from camera")
+            return None
         except Exception:
             logger.exception("Camera capture error")
             return None
 
     def detect(self, source):
         """Run object detection using the camera or a provided frame."""
-        if not self.model_loaded or self.model is None:
+        result = self.detect_details(source)
+        return result.detected_class, result.confidence
+
+    def detect_details(self, source) -> "Detection":
+        """Like detect(), but also returns the analysed frame and all boxes."""
+        frame = source
+        if isinstance(source, int):
+            frame = self.capture_frame(source)
+            if frame is None:
+                logger.warning("Could not capture frame for detection")
+                return Detection("unknown", 0.0, source="none")
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames) -> List["Detection"]:
+        """Run one inference call over several frames (e.g. from several lanes)."""
+        # One read of each slot so a concurrent hot swap cannot mix models.
+        model, student = self.model, self.student
+        if student is None and (not self.model_loaded or model is None):
             logger.error("Model not loaded, skipping detection")
-            return "unknown", 0.0
+            return [Detection("unknown", 0.0, frame, source="none") for frame in frames]
 
         try:
-            if isinstance(source, int):
-                frame = self.capture_frame()
-                if frame is None:
-                    logger.warning("Could not capture frame for detection")
-                    return "unknown", 0.0
-                source = frame
-
-            results = self.model.predict(source=source, conf=0.25, verbose=False)
-
-            if results:
-                result = results[0]
-                if result.boxes and len(result.boxes) > 0:
-                    boxes = result.boxes
-                    conf_idx = boxes.conf.argmax()
-
-                    detected_class = result.names[int(boxes.cls[conf_idx])]
-                    confidence = float(boxes.conf[conf_idx])
-
-                    logger.info(
-                        "Detected object: %s (confidence=%.2f)",
-                        detected_class,
-                        confidence,
-                    )
-                    return detected_class, round(confidence, 2)
-
-            logger.info("No objects detected")
-            return "unknown", 0.0
-
+            start = time.perf_counter()
+            detections = self._infer_batch(model, student, frames)
+            latency = (time.perf_counter() - start) / len(frames)
         except Exception:
             logger.exception("Inference error")
-            return "unknown", 0.0
+            return [Detection("unknown", 0.0, frame, source="none") for frame in frames]
+
+        candidate = self.candidate
+        if candidate is not None and candidate.kind == self._scan_kind(student):
+            for detection in detections:
+                candidate.offer(detection.frame, detection.detected_class, detection.confidence, latency)
+        return detections
+
+    def _infer_batch(self, model, student, frames) -> List["Detection"]:
+        if student is not None:
+            detections = []
+            for frame, (detected_class, confidence) in zip(frames, student.classify_batch(frames)):
+                logger.info(
+                    "Student classified: %s (confidence=%.2f)",
+                    detected_class,
+                    confidence,
+                )
+                detections.append(Detection(detected_class, round(confidence, 2), frame, source="student"))
+            return detections
+
+        results = model.predict(source=list(frames), conf=0.25, verbose=False)
+        return [self._to_detection(result, frame) for result, frame in zip(results, frames)]
+
+    def _to_detection(self, result, frame) -> "Detection":
+        if result.boxes and len(result.boxes) > 0:
+            boxes = result.boxes
+            conf_idx = boxes.conf.argmax()
+
+            detected_class = result.names[int(boxes.cls[conf_idx])]
+            confidence = float(boxes.conf[conf_idx])
+
+            logger.info(
+                "Detected object: %s (confidence=%.2f)",
+                detected_class,
+                confidence,
+            )
+            all_boxes = [
+                (int(cls), *xywhn, float(conf))
+                for cls, xywhn, conf in zip(
+                    boxes.cls.tolist(), boxes.xywhn.tolist(), boxes.conf.tolist()
+                )
+            ]
+            return Detection(detected_class, round(confidence, 2), frame, all_boxes)
+
+        logger.info("No objects detected")
+        return Detection("unknown", 0.0, frame)
+
+    @staticmethod
+    def _scan_kind(student) -> str:
+        """Which model decides scans: the student when one is loaded, else the detector."""
+        return "student" if student is not None else "detector"
+
+    def _check_like_for_like(self, kind: str):
+        # Shadow scores are only meaningful against the model that actually
+        # decides scans, and promoting anything else would not change scans.
+        scan_kind = self._scan_kind(self.student)
+        if kind != scan_kind:
+            raise ValueError(
+                f"Scans are served by the {scan_kind}; a {kind} candidate can't be compared or promoted"
+            )
+
+    @staticmethod
+    def models_dir() -> Path:
+        """The only directory candidate models may be loaded from (RVM_MODELS_DIR)."""
+        default = Path(__file__).parent.parent.parent.parent / "ai" / "runs"
+        return Path(os.environ.get(MODELS_DIR_ENV, default)).resolve()
+
+    @staticmethod
+    def promote_min_samples() -> int:
+        """Shadow samples a candidate needs before promotion (RVM_PROMOTE_MIN_SAMPLES)."""
+        value = os.environ.get(PROMOTE_MIN_SAMPLES_ENV)
+        try:
+            return int(value) if value else DEFAULT_PROMOTE_MIN_SAMPLES
+        except ValueError:
+            logger.warning("Ignoring invalid %s=%r", PROMOTE_MIN_SAMPLES_ENV, value)
+            return DEFAULT_PROMOTE_MIN_SAMPLES
+
+    def resolve_candidate_path(self, model_path: str) -> str:
+        """Resolve a requested model path, refusing anything outside models_dir().
+
+        Both .pt and TorchScript files can run arbitrary code when loaded,
+        so only files the operator put in the models directory are allowed.
+        """
+        root = self.models_dir()
+        path = Path(model_path)
+        path = (path if path.is_absolute() else root / path).resolve()
+        if root not in path.parents:
+            raise ValueError(f"Candidate models must be inside {root}")
+        if path.suffix not in (".pt", ".torchscript") or not path.is_file():
+            raise ValueError(f"Model not found: {model_path}")
+        return str(path)
+
+    def load_candidate(self, model_path: str, sample_rate: float = 0.25) -> dict:
+        """Start loading a candidate model in the background for shadow evaluation."""
+        model_path = self.resolve_candidate_path(model_path)
+        with self.swap_lock:
+            self._check_like_for_like(CandidateModel.kind_of(model_path))
+            if self.candidate is not None:
+                self.candidate.close()
+            self.candidate = CandidateModel(model_path, sample_rate, self.is_water_bottle)
+            logger.info("Loading candidate model %s", model_path)
+            return self.candidate.report()
+
+    def discard_candidate(self) -> bool:
+        with self.swap_lock:
+            if self.candidate is None:
+                return False
+            self.candidate.close()
+            self.candidate = None
+            logger.info("Candidate model discarded")
+            return True
+
+    def promote_candidate(self, min_samples: Optional[int] = None, force: bool = False) -> dict:
+        """Atomically make the shadowed candidate the live model.
+
+        The candidate must have shadowed at least `min_samples` live scans
+        (default promote_min_samples()); a minimum below 1 needs `force`.
+        """
+        if min_samples is None:
+            min_samples = self.promote_min_samples()
+        if min_samples < 1 and not force:
+            raise ValueError("Promoting without shadow samples requires force=true")
+        with self.swap_lock:
+            candidate = self.candidate
+            if candidate is None or candidate.status != "shadow":
+                raise ValueError("No loaded candidate model to promote")
+            if candidate.samples < min_samples:
+                raise ValueError(
+                    f"Candidate has {candidate.samples} shadow samples, {min_samples} required"
+                )
+            self._check_like_for_like(candidate.kind)
+            candidate.close()
+            self._swap(candidate.kind, candidate.model, candidate.path)
+            self.candidate = None
+            logger.warning("Promoted %s model %s", candidate.kind, candidate.path)
+            return candidate.report()
+
+    def rollback_model(self) -> dict:
+        """Swap the previously live model back in; promoting twice is a no-op pair."""
+        with self.swap_lock:
+            if self.previous is None:
+                raise ValueError("No previous model to roll back to")
+            kind, model, path = self.previous
+            self._swap(kind, model, path)
+            logger.warning("Rolled back to %s model %s", kind, path)
+            return self.model_status()
+
+    def _swap(self, kind, model, path):
+        # The outgoing model stays referenced in self.previous, which makes
+        # rollback instant (no reload) and keeps in-flight calls valid.
+        if kind == "student":
+            self.previous = ("student", self.student, self.student_path)
+            self.student, self.student_path = model, path
+        else:
+            self.previous = ("detector", self.model, self.model_path)
+            self.model, self.model_path = model, path
+            self.model_loaded = model is not None
+
+    def model_status(self) -> dict:
+        candidate = self.candidate
+        return {
+            "model_path": self.model_path,
+            "model_loaded": self.model_loaded,
+            "student_path": self.student_path,
+            "scans_served_by": self._scan_kind(self.student),
+            "previous": (
+                {"kind": self.previous[0], "path": self.previous[2]} if self.previous else None
+            ),
+            "candidate": candidate.report() if candidate else None,
+        }
 
     def is_water_bottle(self, detected_class: str, confidence: float) -> bool:
         """Check if detection qualifies as a water bottle."""
@@ -114,9 +388,11 @@ class RealAI:
         is_bottle = any(kw in detected_class.lower() for kw in bottle_keywords)
         return is_bottle and confidence >= BOTTLE_CONFIDENCE_THRESHOLD
 
-    def release_camera(self):
-        """Release the camera resource."""
-        if self.camera is not None:
-            logger.info("Releasing camera")
-            self.camera.release()
-            self.camera = None
\ No newline at end of file
+    def release_camera(self, device: Optional[int] = None):
+        """Release one camera, or every camera when no device is given."""
+        devices = list(self.cameras) if device is None else [device]
+        for dev in devices:
+            camera = self.cameras.pop(dev, None)
+            if camera is not None:
+                logger.info("Releasing camera %d", dev)
+                camera.release()
@@ -0,0 +1,191 @@
+"""Background capture of hard-negative scan frames for retraining."""
+import json
+import logging
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# (class_id, x_center, y_center, width, height, confidence), normalized 0..1
+Box = Tuple[int, float, float, float, float, float]
+
+
+def dhash(frame) -> int:
+    """64-bit difference hash; near-identical frames differ in only a few bits."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    value = 0
+    for bit in (small[:, 1:] > small[:, :-1]).flatten():
+        value = (value << 1) | int(bit)
+    return value
+
+
+class DetectorLabeler:
+    """Boxes from the YOLO detector for frames that were judged without one.
+
+    Runs on the collector's writer thread with its own model instance, so
+    it never shares an ultralytics predictor with the preview or the
+    inference scheduler. `model_path` is read on each call and the model is
+    reloaded after a detector hot swap.
+    """
+
+    def __init__(self, model_path: Callable[[], Optional[str]], conf: float = 0.25):
+        self.model_path = model_path
+        self.conf = conf
+        self._model = None
+        self._loaded_path = None
+
+    def __call__(self, frame) -> Optional[List[Box]]:
+        path = self.model_path()
+        if path is None:
+            return None
+        if path != self._loaded_path:
+            from ultralytics import YOLO
+
+            self._model, self._loaded_path = YOLO(path), path
+        result = self._model.predict(source=frame, conf=self.conf, verbose=False)[0]
+        if result.boxes is None or len(result.boxes) == 0:
+            return []
+        boxes = result.boxes
+        return [
+            (int(cls), *xywhn, float(conf))
+            for cls, xywhn, conf in zip(boxes.cls.tolist(), boxes.xywhn.tolist(), boxes.conf.tolist())
+        ]
+
+
+class HardNegativeCollector:
+    """Saves rejected and low-confidence scan frames in YOLO dataset layout.
+
+    Writes <output_dir>/images/<name>.jpg and <output_dir>/labels/<name>.txt,
+    plus one line per sample in captures.jsonl for review. The labels are
+    the model's own boxes, so they are pseudo-labels to be checked before
+    the folder is added to the train list in dataset/data.yaml.
+
+    Frames submitted without boxes (boxes=None, e.g. student-classifier
+    scans) are labelled by `labeler` on the writer thread. An empty label
+    file means "background", so an accepted (low_conf) frame is only kept
+    when it has at least one box.
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        max_bytes: int = 1024**3,
+        hash_distance: int = 6,
+        recent_hashes: int = 2048,
+        queue_size: int = 8,
+        labeler: Optional[Callable[[object], Optional[List[Box]]]] = None,
+    ):
+        self.output_dir = Path(output_dir)
+        self.labeler = labeler
+        self.images_dir = self.output_dir / "images"
+        self.labels_dir = self.output_dir / "labels"
+        self.max_bytes = max_bytes
+        self.hash_distance = hash_distance
+
+        self._hashes = deque(maxlen=recent_hashes)
+        self._total_bytes = None
+        self._cap_warned = False
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="hard-negative-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, frame, boxes: Optional[List[Box]], reason: str, detected_class: str, confidence: float):
+        """Queue a sample; drops it instead of blocking when the writer is behind.
+
+        Pass boxes=None when no detector looked at the frame; it is then
+        labelled on the writer thread.
+        """
+        if frame is None:
+            return
+        try:
+            self._queue.put_nowait((frame, boxes, reason, detected_class, confidence, datetime.now()))
+        except queue.Full:
+            logger.debug("Hard-negative queue full, dropping sample")
+
+    def close(self, timeout: float = 5.0):
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        self._load_index()
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                self._save(*job)
+            except Exception:
+                logger.exception("Failed to save hard-negative sample")
+
+    def _load_index(self):
+        """Seed the size counter and dedupe window from earlier runs."""
+        self.images_dir.mkdir(parents=True, exist_ok=True)
+        self.labels_dir.mkdir(parents=True, exist_ok=True)
+        self._total_bytes = sum(
+            p.stat().st_size for d in (self.images_dir, self.labels_dir) for p in d.iterdir()
+        )
+        index = self.output_dir / "captures.jsonl"
+        if index.exists():
+            with open(index) as f:
+                for line in f:
+                    try:
+                        self._hashes.append(int(json.loads(line)["dhash"], 16))
+                    except (ValueError, KeyError):
+                        continue
+
+    def _is_duplicate(self, value: int) -> bool:
+        return any(bin(value ^ h).count("1") <= self.hash_distance for h in self._hashes)
+
+    def _save(self, frame, boxes, reason, detected_class, confidence, when):
+        if self._total_bytes >= self.max_bytes:
+            if not self._cap_warned:
+                logger.warning("Hard-negative capture disk cap reached (%d bytes)", self.max_bytes)
+                self._cap_warned = True
+            return
+
+        value = dhash(frame)
+        if self._is_duplicate(value):
+            logger.debug("Skipping near-duplicate hard-negative frame")
+            return
+
+        if boxes is None:
+            boxes = self.labeler(frame) if self.labeler is not None else None
+            if boxes is None:
+                logger.debug("No detector to label a %s frame, skipping", reason)
+                return
+        if reason == "low_conf" and not boxes:
+            # The item was accepted as a bottle; an empty label would call it background.
+            logger.debug("Accepted frame has no detector boxes, skipping")
+            return
+
+        ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        if not ok:
+            return
+
+        name = f"{when.strftime('%Y%m%d_%H%M%S_%f')}_{reason}"
+        label_text = "".join(
+            f"{cls} {xc:.6f} {yc:.6f} {w:.6f} {h:.6f}\n" for cls, xc, yc, w, h, _ in boxes
+        )
+        (self.images_dir / f"{name}.jpg").write_bytes(buffer.tobytes())
+        (self.labels_dir / f"{name}.txt").write_text(label_text)
+        self._total_bytes += len(buffer) + len(label_text)
+        self._hashes.append(value)
+
+        with open(self.output_dir / "captures.jsonl", "a") as f:
+            f.write(json.dumps({
+                "name": name,
+                "reason": reason,
+                "detected_class": detected_class,
+                "confidence": confidence,
+                "boxes": boxes,
+                "dhash": f"{value:016x}",
+                "timestamp": when.isoformat(),
+            }) + "\n")
+        logger.info("Saved hard-negative sample %s", name)
@@ -0,0 +1,271 @@
+"""CPU thread budget for torch, OpenCV and the API threadpool.
+
+Left to their defaults, torch (one intra-op thread per core), OpenCV's own
+pool and FastAPI's 40-thread sync-endpoint pool all assume they have the
+whole machine. On the 4-core kiosks that oversubscription shows up as scan
+latency spikes whenever the preview is open. A profile splits the cores
+between subsystems; choose one with RVM_CPU_PROFILE (none is applied by
+default).
+
+Calibrate on the kiosk itself (runs each profile in a fresh process, since
+torch's inter-op pool and CPU affinity are process-wide):
+
+    cd backend
+    python -m app.modules.cpu_budget --calibrate --seconds 20
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENV = "RVM_CPU_PROFILE"
+# No thread limits or pinning until a profile has been calibrated for the
+# host: the pinned profiles assume a 4-core kiosk and would strand any
+# extra cores elsewhere.
+DEFAULT_PROFILE = "default"
+
+
+@dataclass(frozen=True)
+class CpuProfile:
+    """Thread counts per subsystem; None keeps the library default."""
+    name: str
+    torch_threads: Optional[int] = None
+    torch_interop_threads: Optional[int] = None
+    opencv_threads: Optional[int] = None
+    api_threads: Optional[int] = None
+    # CPU affinity for the inference thread and for the event loop / API
+    # threads (the preview stream runs on the event loop).
+    inference_cpus: Optional[Tuple[int, ...]] = None
+    io_cpus: Optional[Tuple[int, ...]] = None
+
+
+PROFILES = {
+    "default": CpuProfile("default"),
+    "balanced": CpuProfile(
+        "balanced",
+        torch_threads=2,
+        torch_interop_threads=1,
+        opencv_threads=1,
+        api_threads=8,
+        inference_cpus=(2, 3),
+        io_cpus=(0, 1),
+    ),
+    "scan_first": CpuProfile(
+        "scan_first",
+        torch_threads=3,
+        torch_interop_threads=1,
+        opencv_threads=1,
+        api_threads=4,
+        inference_cpus=(1, 2, 3),
+        io_cpus=(0,),
+    ),
+    "stream_first": CpuProfile(
+        "stream_first",
+        torch_threads=2,
+        torch_interop_threads=1,
+        opencv_threads=2,
+        api_threads=8,
+    ),
+}
+
+
+def load_profile(name: Optional[str] = None) -> CpuProfile:
+    name = name or os.environ.get(PROFILE_ENV, DEFAULT_PROFILE)
+    profile = PROFILES.get(name)
+    if profile is None:
+        logger.warning("Unknown CPU profile %r, using %s", name, DEFAULT_PROFILE)
+        profile = PROFILES[DEFAULT_PROFILE]
+    return profile
+
+
+def _usable_cpus(cpus: Optional[Tuple[int, ...]]):
+    """The profile's CPUs, or None if affinity is unsupported or any CPU is missing."""
+    if not cpus or not hasattr(os, "sched_getaffinity"):
+        return None
+    if not set(cpus) <= os.sched_getaffinity(0):
+        return None
+    return set(cpus)
+
+
+def apply_process_budget(profile: CpuProfile):
+    """Set torch and OpenCV thread pools; call before the first inference."""
+    import cv2
+    import torch
+
+    if profile.torch_threads:
+        torch.set_num_threads(profile.torch_threads)
+    if profile.torch_interop_threads:
+        try:
+            torch.set_num_interop_threads(profile.torch_interop_threads)
+        except RuntimeError:
+            # Only settable once per process, before any inter-op work.
+            logger.debug("torch inter-op threads already fixed")
+    if profile.opencv_threads is not None:
+        cv2.setNumThreads(profile.opencv_threads)
+    logger.info(
+        "CPU profile %s: torch=%s opencv=%s",
+        profile.name, torch.get_num_threads(), cv2.getNumThreads(),
+    )
+
+
+def apply_api_budget(profile: CpuProfile):
+    """Size the anyio threadpool that runs sync FastAPI endpoints.
+
+    Must be called from the event loop thread (e.g. a startup hook).
+    """
+    if not profile.api_threads:
+        return
+    import anyio.to_thread
+
+    anyio.to_thread.current_default_thread_limiter().total_tokens = profile.api_threads
+    logger.info("CPU profile %s: api threads=%d", profile.name, profile.api_threads)
+
+
+def pin_thread(profile: CpuProfile, role: str):
+    """Pin the calling thread to the profile's CPUs for a role ("inference" or "io").
+
+    The thread's torch pool is capped at the number of pinned CPUs, so e.g.
+    the preview's predict on the io-pinned event loop does not run three
+    intra-op threads on one core. Threads started afterwards from this
+    thread inherit the mask and the thread count.
+    """
+    cpus = _usable_cpus(profile.inference_cpus if role == "inference" else profile.io_cpus)
+    if cpus is None:
+        return
+    try:
+        os.sched_setaffinity(0, cpus)  # 0 = calling thread on Linux
+    except OSError as e:
+        logger.warning("Could not pin %s thread: %s", role, e)
+        return
+    import torch
+
+    # Per calling thread: torch's OpenMP pool size is thread-local.
+    torch.set_num_threads(min(profile.torch_threads or len(cpus), len(cpus)))
+    logger.info("Pinned %s thread to CPUs %s (torch=%d)", role, sorted(cpus), torch.get_num_threads())
+
+
+# -- calibration ------------------------------------------------------------
+
+def _measure(profile_name: str, seconds: float, scan_interval: float) -> dict:
+    """Run the preview loop and periodic scans together and time both.
+
+    Scans go through InferenceScheduler like a lane's do, so they run on
+    the scheduler's pinned inference thread, and the timing includes the
+    hand-off.
+    """
+    import cv2
+    import numpy as np
+    from ..services.inference_scheduler import InferenceScheduler
+    from .ai import RealAI
+    from .overlay import OverlayRenderer
+
+    profile = load_profile(profile_name)
+    ai = RealAI(cpu_profile=profile)
+    pin_thread(profile, "io")
+    scheduler = InferenceScheduler(ai)
+
+    frame = ai.capture_frame(0)
+    if frame is None:
+        logger.warning("No camera, calibrating on a synthetic frame")
+        frame = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+    scheduler.detect(frame)  # warm-up
+
+    stop = threading.Event()
+    latencies = []
+
+    def scan_loop():
+        # Started from the io-pinned thread, like the API threads that run scans.
+        while not stop.is_set():
+            start = time.perf_counter()
+            with scheduler.scanning():
+                scheduler.detect(frame)
+            latencies.append(time.perf_counter() - start)
+            stop.wait(scan_interval)
+
+    scanner = threading.Thread(target=scan_loop, daemon=True)
+    scanner.start()
+
+    renderer = OverlayRenderer()
+    frames, deadline = 0, time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if frames % 2 == 0 and ai.model is not None:
+            results = ai.model.predict(source=frame, conf=0.25, verbose=False)
+            renderer.update(results[0])
+        cv2.imencode(".jpg", renderer.draw(frame), [cv2.IMWRITE_JPEG_QUALITY, 80])
+        frames += 1
+    stop.set()
+    scanner.join()
+    scheduler.shutdown()
+
+    latencies.sort()
+    return {
+        "profile": profile_name,
+        "stream_fps": round(frames / seconds, 1),
+        "scans": len(latencies),
+        "scan_p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        "scan_p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1) if latencies else None,
+    }
+
+
+def calibrate(seconds: float, scan_interval: float) -> Optional[str]:
+    results = []
+    for name in PROFILES:
+        print(f"⏱️  Measuring profile {name} for {seconds:.0f}s...")
+        proc = subprocess.run(
+            [sys.executable, "-m", "app.modules.cpu_budget", "--measure", name,
+             "--seconds", str(seconds), "--scan-interval", str(scan_interval)],
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0 or not proc.stdout.strip():
+            print(f"❌ Profile {name} failed:\n{proc.stderr[-2000:]}")
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    results = [r for r in results if r["scan_p95_ms"] is not None]
+    if not results:
+        print("❌ No profile produced measurements")
+        return None
+
+    print(f"\n{'profile':<14}{'stream fps':>12}{'scan p50 ms':>14}{'scan p95 ms':>14}")
+    for r in results:
+        print(f"{r['profile']:<14}{r['stream_fps']:>12}{r['scan_p50_ms']:>14}{r['scan_p95_ms']:>14}")
+
+    # Scans are what customers wait on: lowest tail latency among profiles
+    # that keep the preview within 10% of the best frame rate.
+    best_fps = max(r["stream_fps"] for r in results)
+    eligible = [r for r in results if r["stream_fps"] >= 0.9 * best_fps]
+    best = min(eligible, key=lambda r: r["scan_p95_ms"])
+    print(f"\n✅ Recommended: {PROFILE_ENV}={best['profile']}")
+    return best["profile"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply or calibrate CPU thread profiles")
+    parser.add_argument("--calibrate", action="store_true", help="Measure every profile and recommend one")
+    parser.add_argument("--measure", metavar="PROFILE", help=argparse.SUPPRESS)
+    parser.add_argument("--seconds", type=float, default=15.0)
+    parser.add_argument("--scan-interval", type=float, default=0.5, help="Pause between simulated scans")
+    args = parser.parse_args()
+
+    if args.measure:
+        logging.basicConfig(level=logging.WARNING)
+        print(json.dumps(_measure(args.measure, args.seconds, args.scan_interval)))
+    elif args.calibrate:
+        calibrate(args.seconds, args.scan_interval)
+    else:
+        for profile in PROFILES.values():
+            print(json.dumps(asdict(profile)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Camera frames that can stay JPEG-compressed until pixels are needed."""
+import logging
+from typing import Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MJPG = cv2.VideoWriter_fourcc(*"MJPG")
+
+
+class CameraFrame:
+    """One camera read, holding the device's JPEG and/or decoded BGR pixels.
+
+    In MJPEG mode the camera hands us the compressed bytes; the preview can
+    forward them untouched and only inference, overlays and clip writing
+    pay for a decode, which happens at most once per frame.
+    """
+
+    __slots__ = ("jpeg", "_image")
+
+    def __init__(self, jpeg: Optional[bytes] = None, image: Optional[np.ndarray] = None):
+        if jpeg is None and image is None:
+            raise ValueError("CameraFrame needs JPEG bytes or an image")
+        self.jpeg = jpeg
+        self._image = image
+
+    @classmethod
+    def from_capture(cls, raw: np.ndarray) -> "CameraFrame":
+        """Wrap a VideoCapture.read() result; with CONVERT_RGB off it is a 1-row byte buffer."""
+        if raw.ndim == 1 or (raw.ndim == 2 and raw.shape[0] == 1):
+            return cls(jpeg=raw.tobytes())
+        return cls(image=raw)
+
+    @property
+    def image(self) -> Optional[np.ndarray]:
+        if self._image is None:
+            self._image = cv2.imdecode(np.frombuffer(self.jpeg, np.uint8), cv2.IMREAD_COLOR)
+            if self._image is None:
+                logger.warning("Could not decode MJPEG frame (%d bytes)", len(self.jpeg))
+        return self._image
+
+    def to_jpeg(self, quality: int = 80) -> Optional[bytes]:
+        """The camera's own JPEG when there is one, otherwise an encode of the pixels."""
+        if self.jpeg is not None:
+            return self.jpeg
+        ok, buffer = cv2.imencode(".jpg", self._image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return buffer.tobytes() if ok else None
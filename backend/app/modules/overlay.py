@@ -0,0 +1,116 @@
+"""Minimal detection overlay for the live preview."""
+import logging
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 0.5
+THICKNESS = 2
+MAX_GLYPHS = 512
+
+# BGR, indexed by class id.
+PALETTE = [
+    (56, 56, 255),
+    (151, 157, 255),
+    (31, 112, 255),
+    (29, 178, 255),
+    (49, 210, 207),
+    (10, 249, 72),
+    (23, 204, 146),
+    (134, 219, 61),
+]
+
+
+class OverlayRenderer:
+    """Draws boxes and labels onto a reused buffer.
+
+    ultralytics' Results.plot() copies the frame and goes through a general
+    annotator on every call. We only ever draw a handful of boxes for a few
+    classes, so boxes are painted with array slices and each label is
+    rendered once into a small image that is then just copied into place.
+    The last detections are kept, so frames that skip inference still show
+    where the item was.
+    """
+
+    def __init__(self):
+        self._buffer: Optional[np.ndarray] = None
+        self._glyphs: Dict[Tuple[str, int], np.ndarray] = {}
+        self._boxes = np.empty((0, 4), dtype=np.int32)
+        self._classes = np.empty(0, dtype=np.int32)
+        self._confs = np.empty(0, dtype=np.float32)
+        self._names: Dict[int, str] = {}
+
+    @property
+    def has_detections(self) -> bool:
+        return len(self._boxes) > 0
+
+    def update(self, result):
+        """Remember the boxes of one ultralytics result for the following frames."""
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            self.clear()
+            return
+        self._boxes = boxes.xyxy.cpu().numpy().astype(np.int32)
+        self._classes = boxes.cls.cpu().numpy().astype(np.int32)
+        self._confs = boxes.conf.cpu().numpy()
+        self._names = result.names
+
+    def clear(self):
+        self._boxes = self._boxes[:0]
+        self._classes = self._classes[:0]
+        self._confs = self._confs[:0]
+
+    def draw(self, image: np.ndarray) -> np.ndarray:
+        """Return the frame with the current detections drawn.
+
+        The source image is left untouched (it may be buffered for clips);
+        drawing happens on a buffer that is reused across frames.
+        """
+        if self._buffer is None or self._buffer.shape != image.shape:
+            self._buffer = np.empty_like(image)
+        canvas = self._buffer
+        np.copyto(canvas, image)
+
+        h, w = canvas.shape[:2]
+        boxes = self._boxes.copy()
+        if len(boxes):
+            boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, w - 1)
+            boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, h - 1)
+
+        t = THICKNESS
+        for (x1, y1, x2, y2), cls, conf in zip(boxes, self._classes, self._confs):
+            color = PALETTE[int(cls) % len(PALETTE)]
+            canvas[y1:y1 + t, x1:x2 + 1] = color
+            canvas[max(y2 - t + 1, 0):y2 + 1, x1:x2 + 1] = color
+            canvas[y1:y2 + 1, x1:x1 + t] = color
+            canvas[y1:y2 + 1, max(x2 - t + 1, 0):x2 + 1] = color
+            self._blit_label(canvas, int(cls), float(conf), int(x1), int(y1), color)
+        return canvas
+
+    def _glyph(self, cls: int, conf: float, color) -> np.ndarray:
+        key = (self._names.get(cls, str(cls)), int(round(conf * 100)))
+        glyph = self._glyphs.get(key)
+        if glyph is None:
+            text = f"{key[0]} {key[1] / 100:.2f}"
+            (tw, th), baseline = cv2.getTextSize(text, FONT, FONT_SCALE, 1)
+            glyph = np.empty((th + baseline + 4, tw + 4, 3), dtype=np.uint8)
+            glyph[:] = color
+            cv2.putText(glyph, text, (2, th + 2), FONT, FONT_SCALE, (255, 255, 255), 1, cv2.LINE_AA)
+            if len(self._glyphs) >= MAX_GLYPHS:
+                self._glyphs.clear()
+            self._glyphs[key] = glyph
+        return glyph
+
+    def _blit_label(self, canvas, cls, conf, x, y, color):
+        glyph = self._glyph(cls, conf, color)
+        gh, gw = glyph.shape[:2]
+        h, w = canvas.shape[:2]
+        top = y - gh if y - gh >= 0 else y  # inside the box when there is no room above
+        gh = min(gh, h - top)
+        gw = min(gw, w - x)
+        if gh > 0 and gw > 0:
+            canvas[top:top + gh, x:x + gw] = glyph[:gh, :gw]
@@ -0,0 +1,139 @@
+"""Event-triggered transaction clip recorder."""
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import cv2
+
+from .frames import CameraFrame
+
+logger = logging.getLogger(__name__)
+
+
+class ClipRecorder:
+    """Keeps the last few seconds of camera frames and dumps them on events.
+
+    Frames are handed in by whoever already reads the camera (preview or
+    scan), so recording never takes a frame away from them. push() only
+    stores a reference; decoding, encoding and disk I/O happen on a writer
+    thread, so MJPEG frames are only decoded for clips that get written.
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        buffer_seconds: float = 4.0,
+        max_fps: float = 10.0,
+        max_bytes: int = 2 * 1024**3,
+        max_age_days: float = 14.0,
+        queue_size: int = 4,
+    ):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.buffer_seconds = buffer_seconds
+        self.min_interval = 1.0 / max_fps
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_days * 86400
+
+        self._frames = deque()
+        self._frames_lock = threading.Lock()
+        self._last_push = 0.0
+
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="clip-recorder", daemon=True)
+        self._thread.start()
+
+    def push(self, frame):
+        """Add a frame (CameraFrame or BGR array) to the ring; frames faster than max_fps are skipped."""
+        now = time.monotonic()
+        if now - self._last_push < self.min_interval:
+            return
+        with self._frames_lock:
+            self._last_push = now
+            self._frames.append((now, frame))
+            while self._frames and now - self._frames[0][0] > self.buffer_seconds:
+                self._frames.popleft()
+
+    def trigger(self, event: str, metadata: Optional[dict] = None):
+        """Queue the current ring contents as a clip; never blocks the caller."""
+        with self._frames_lock:
+            frames = list(self._frames)
+        if not frames:
+            logger.debug("No buffered frames for %s clip", event)
+            return
+        try:
+            self._queue.put_nowait((event, datetime.now(), frames, metadata or {}))
+        except queue.Full:
+            logger.warning("Clip writer busy, dropping %s clip", event)
+
+    def close(self, timeout: float = 5.0):
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                self._write_clip(*job)
+                self._enforce_retention()
+            except Exception:
+                logger.exception("Failed to write clip")
+
+    def _write_clip(self, event, when, frames, metadata):
+        stem = f"{when.strftime('%Y%m%d_%H%M%S_%f')}_{event}"
+        clip_path = self.output_dir / f"{stem}.mp4"
+        frames = [
+            (t, frame.image if isinstance(frame, CameraFrame) else frame) for t, frame in frames
+        ]
+        frames = [(t, frame) for t, frame in frames if frame is not None]
+        if not frames:
+            return
+
+        h, w = frames[-1][1].shape[:2]
+        span = frames[-1][0] - frames[0][0]
+        fps = (len(frames) - 1) / span if span > 0 else 1.0
+        writer = cv2.VideoWriter(str(clip_path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+        try:
+            for _, frame in frames:
+                if frame.shape[:2] != (h, w):
+                    frame = cv2.resize(frame, (w, h))
+                writer.write(frame)
+        finally:
+            writer.release()
+
+        with open(self.output_dir / f"{stem}.json", "w") as f:
+            json.dump(
+                {
+                    "event": event,
+                    "timestamp": when.isoformat(),
+                    "frames": len(frames),
+                    "fps": round(fps, 2),
+                    "metadata": metadata,
+                },
+                f,
+                indent=2,
+                default=str,
+            )
+        logger.info("Saved %s clip (%d frames) to %s", event, len(frames), clip_path.name)
+
+    def _enforce_retention(self):
+        files = sorted(
+            (p for p in self.output_dir.iterdir() if p.suffix in (".mp4", ".json")),
+            key=lambda p: p.stat().st_mtime,
+        )
+        now = time.time()
+        total = sum(p.stat().st_size for p in files)
+        for p in files:
+            expired = now - p.stat().st_mtime > self.max_age_seconds
+            if not expired and total <= self.max_bytes:
+                break
+            total -= p.stat().st_size
+            p.unlink(missing_ok=True)
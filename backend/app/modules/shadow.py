@@ -0,0 +1,149 @@
+"""Candidate model loading and shadow evaluation for hot model swaps."""
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WARMUP_RUNS = 3
+
+
+def top_detection(model, frame, conf: float = 0.25):
+    """(class, confidence) of the strongest YOLO box, like RealAI.detect."""
+    results = model.predict(source=frame, conf=conf, verbose=False)
+    if results:
+        result = results[0]
+        if result.boxes and len(result.boxes) > 0:
+            idx = result.boxes.conf.argmax()
+            return result.names[int(result.boxes.cls[idx])], round(float(result.boxes.conf[idx]), 2)
+    return "unknown", 0.0
+
+
+class CandidateModel:
+    """A model being loaded, warmed up and compared against the live one.
+
+    Loading and every shadow inference run on this object's own worker
+    thread; the scan path only pays for a non-blocking hand-off.
+    """
+
+    def __init__(self, path: str, sample_rate: float, is_accepted: Callable[[str, float], bool]):
+        self.path = path
+        self.kind = self.kind_of(path)
+        self.sample_rate = sample_rate
+        self.is_accepted = is_accepted
+        self.status = "loading"
+        self.error: Optional[str] = None
+        self.model = None
+
+        self.samples = 0
+        self.skipped = 0
+        self.class_agreements = 0
+        self.decision_agreements = 0
+        self.live_latency = deque(maxlen=500)
+        self.candidate_latency = deque(maxlen=500)
+
+        self._pending = None
+        self._wake = threading.Condition()
+        self._closed = False
+        self._rng = np.random.default_rng()
+        self._thread = threading.Thread(target=self._run, name="shadow-model", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def kind_of(path: str) -> str:
+        return "student" if path.endswith(".torchscript") else "detector"
+
+    def _load(self):
+        if self.kind == "student":
+            from .student import StudentClassifier
+
+            self.model = StudentClassifier(self.path)
+            return
+        from ultralytics import YOLO
+
+        model = YOLO(self.path)
+        dummy = np.zeros((480, 640, 3), dtype=np.uint8)
+        for _ in range(WARMUP_RUNS):
+            model.predict(source=dummy, conf=0.25, verbose=False)
+        self.model = model
+
+    def classify(self, frame):
+        if self.kind == "student":
+            return self.model.classify(frame)
+        return top_detection(self.model, frame)
+
+    def offer(self, frame, live_class: str, live_confidence: float, live_latency: float):
+        """Maybe queue a live scan for shadow inference; never blocks."""
+        if self.status != "shadow" or self._rng.random() >= self.sample_rate:
+            return
+        with self._wake:
+            if self._pending is not None:
+                self.skipped += 1
+                return
+            self._pending = (frame, live_class, live_confidence, live_latency)
+            self._wake.notify()
+
+    def close(self):
+        with self._wake:
+            self._closed = True
+            self._wake.notify()
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            self._load()
+            self.status = "shadow"
+            logger.info("Candidate model %s ready in %.1fs, shadowing live scans",
+                        self.path, time.perf_counter() - start)
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            logger.exception("Failed to load candidate model %s", self.path)
+            return
+
+        while True:
+            with self._wake:
+                while self._pending is None and not self._closed:
+                    self._wake.wait()
+                if self._closed:
+                    return
+                frame, live_class, live_confidence, live_latency = self._pending
+                self._pending = None
+            try:
+                t0 = time.perf_counter()
+                cand_class, cand_confidence = self.classify(frame)
+                cand_latency = time.perf_counter() - t0
+            except Exception:
+                logger.exception("Shadow inference failed")
+                continue
+
+            self.samples += 1
+            self.class_agreements += int(cand_class == live_class)
+            self.decision_agreements += int(
+                self.is_accepted(cand_class, cand_confidence) == self.is_accepted(live_class, live_confidence)
+            )
+            self.live_latency.append(live_latency)
+            self.candidate_latency.append(cand_latency)
+
+    def report(self) -> dict:
+        def ms(values):
+            return round(statistics.median(values) * 1000, 2) if values else None
+
+        return {
+            "path": self.path,
+            "kind": self.kind,
+            "status": self.status,
+            "error": self.error,
+            "sample_rate": self.sample_rate,
+            "samples": self.samples,
+            "skipped": self.skipped,
+            "class_agreement": self.class_agreements / self.samples if self.samples else None,
+            "decision_agreement": self.decision_agreements / self.samples if self.samples else None,
+            "live_latency_ms_p50": ms(self.live_latency),
+            "candidate_latency_ms_p50": ms(self.candidate_latency),
+        }
@@ -0,0 +1,59 @@
+"""Distilled bottle / not-bottle classifier (see ai/scripts/distill_student.py)."""
+import json
+import logging
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+class StudentClassifier:
+    """Runs the exported TorchScript student on the chute ROI of a frame."""
+
+    def __init__(self, model_path: str, accept_threshold: float = 0.3):
+        model_path = Path(model_path)
+        with open(model_path.with_suffix(".json")) as f:
+            meta = json.load(f)
+
+        self.model = torch.jit.load(str(model_path), map_location="cpu").eval()
+        self.img_size = int(meta["img_size"])
+        self.roi = tuple(meta["roi"])
+        self.names = list(meta["names"])
+        self.model_path = str(model_path)
+        self.accept_threshold = accept_threshold
+        self.bottle_idx = self.names.index("bottle")
+
+        # First call on a frozen TorchScript graph runs the optimizer; pay it now.
+        self.classify(np.zeros((self.img_size, self.img_size, 3), dtype=np.uint8))
+        logger.info("Student classifier loaded (widths=%s)", meta.get("widths"))
+
+    def _preprocess(self, frame):
+        h, w = frame.shape[:2]
+        x0, y0, x1, y1 = self.roi
+        crop = frame[int(y0 * h):int(y1 * h), int(x0 * w):int(x1 * w)]
+        crop = cv2.resize(crop, (self.img_size, self.img_size), interpolation=cv2.INTER_AREA)
+        return torch.from_numpy(np.ascontiguousarray(crop.transpose(2, 0, 1), dtype=np.float32))
+
+    def classify(self, frame):
+        """Return (class_name, confidence) in the same shape as RealAI.detect.
+
+        The bottle class wins whenever its probability clears the acceptance
+        threshold, mirroring how a detector box above threshold is accepted.
+        """
+        return self.classify_batch([frame])[0]
+
+    def classify_batch(self, frames):
+        """classify() for several frames (e.g. one per lane) in one forward pass."""
+        with torch.inference_mode():
+            probs = self.model(torch.stack([self._preprocess(frame) for frame in frames]))
+        return [self._verdict(p) for p in probs]
+
+    def _verdict(self, probs):
+        p_bottle = float(probs[self.bottle_idx])
+        if p_bottle >= self.accept_threshold:
+            return "bottle", p_bottle
+        idx = 1 - self.bottle_idx
+        return self.names[idx], float(probs[idx])
@@ -1,4 +1,7 @@
 """Initialize services package."""
 from .state_manager import StateManager
+from .inference_scheduler import InferenceScheduler
+from .lanes import LaneConfig, LaneRegistry
+from .coupons import CouponService
 
-__all__ = ["StateManager"]
+__all__ = ["StateManager", "InferenceScheduler", "LaneConfig", "LaneRegistry", "CouponService"]
@@ -0,0 +1,416 @@
+"""Coupon issuance, verification and redemption.
+
+Codes are drawn with `secrets` from a pool that a background thread keeps
+topped up, so printing a receipt never waits on code generation or on a
+uniqueness check. Every code ever generated lives in one SQLite table keyed
+by the code itself (a B-tree, so a lookup is O(log n)); in front of it sit
+two cheap rejections that need no disk access: a Luhn mod N check character
+that catches every single-character typo and a Bloom filter over all issued
+codes that turns away codes which were never handed out.
+
+The filter is sized from the number of issued codes with room to grow,
+rebuilt in the background at twice the size when it fills up, and saved
+next to the database on shutdown so a restart only hashes the codes issued
+since (plus a margin) instead of every code ever issued.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import queue
+import secrets
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).parent.parent.parent / "data"
+COUPON_DB = DATA_DIR / "coupons.db"
+
+# No 0/O or 1/I so codes survive being read off a thermal receipt.
+ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+RANDOM_CHARS = 9  # 32**9 ~ 3.5e13 codes, plus one check character
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS coupons (
+    code TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pool',
+    lane_id TEXT,
+    item TEXT,
+    issued_at REAL,
+    redeemed_at REAL,
+    partner_id TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS coupons_issued_at ON coupons (issued_at);
+"""
+
+MAX_GROUP = 256
+# The filter is built for this many times the issued codes, so it can grow
+# before its false-positive rate degrades; it is rebuilt once it is full.
+BLOOM_HEADROOM = 2
+# Codes issued this close to a saved filter's timestamp are re-added on load.
+BLOOM_SAVE_MARGIN = 60.0
+
+
+def _check_char(body: str) -> str:
+    """Luhn mod N check character over ALPHABET.
+
+    Doubling every other position and folding the result back into the
+    alphabet is a permutation, so any single substituted character changes
+    the sum, and so does swapping two adjacent characters (unless they
+    are the two characters the folding maps onto each other).
+    """
+    n = len(ALPHABET)
+    total = 0
+    for i, c in enumerate(reversed(body)):
+        value = ALPHABET.index(c) * (2 if i % 2 == 0 else 1)
+        total += value // n + value % n
+    return ALPHABET[-total % n]
+
+
+def generate_code() -> str:
+    body = "".join(secrets.choice(ALPHABET) for _ in range(RANDOM_CHARS))
+    return body + _check_char(body)
+
+
+def normalize_code(code: str) -> Optional[str]:
+    """Upper-case and strip separators; None if the code is malformed."""
+    code = code.strip().upper().replace("-", "").replace(" ", "")
+    if len(code) != RANDOM_CHARS + 1 or any(c not in ALPHABET for c in code):
+        return None
+    if _check_char(code[:-1]) != code[-1]:
+        return None
+    return code
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (blake2b double hashing)."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self._lock = threading.Lock()
+
+    def _indexes(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        indexes = self._indexes(key)
+        with self._lock:
+            for i in indexes:
+                self.bits[i >> 3] |= 1 << (i & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[i >> 3] & (1 << (i & 7)) for i in self._indexes(key))
+
+    def save(self, path: Path, watermark: float):
+        """Write the bitmap atomically; `watermark` is when it was last complete."""
+        header = {
+            "capacity": self.capacity,
+            "error_rate": self.error_rate,
+            "size": self.size,
+            "hashes": self.hashes,
+            "watermark": watermark,
+        }
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(json.dumps(header).encode() + b"\n")
+            with self._lock:
+                f.write(self.bits)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional[Tuple["BloomFilter", float]]:
+        """(filter, watermark) from save(), or None if the file is missing or unusable."""
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                bloom = cls(header["capacity"], header["error_rate"])
+                bits = f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+        if (bloom.size, bloom.hashes) != (header["size"], header["hashes"]) or len(bits) != len(bloom.bits):
+            return None
+        bloom.bits = bytearray(bits)
+        return bloom, header["watermark"]
+
+
+@dataclass
+class Coupon:
+    code: str
+    status: str
+    lane_id: Optional[str] = None
+    item: Optional[str] = None
+    issued_at: Optional[float] = None
+    redeemed_at: Optional[float] = None
+    partner_id: Optional[str] = None
+
+
+class CouponService:
+    """Issue, verify and redeem coupon codes.
+
+    All writes go through one writer thread that commits whatever has queued
+    up in a single transaction, so bursts of redemptions from partners cost
+    one fsync per group rather than one per code. Reads use a connection per
+    calling thread and run concurrently with the writer under WAL.
+    """
+
+    def __init__(
+        self,
+        db_path: Path = COUPON_DB,
+        pool_size: int = 1000,
+        min_bloom_capacity: int = 1_000_000,
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.bloom_path = self.db_path.with_suffix(".bloom")
+        self.pool_size = pool_size
+        self.min_bloom_capacity = min_bloom_capacity
+
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            pooled = conn.execute(
+                "SELECT code FROM coupons WHERE status = 'pool' LIMIT ?", (pool_size,)
+            ).fetchall()
+        self._pool = deque(code for (code,) in pooled)
+        self._pool_lock = threading.Lock()
+        self._refill_needed = threading.Event()
+
+        # Lookups skip the filter until _build_bloom has filled it. While a
+        # bigger filter is being built, issued codes go into both.
+        self.bloom: Optional[BloomFilter] = None
+        self._next_bloom: Optional[BloomFilter] = None
+        self._bloom_count = 0
+        self._bloom_lock = threading.Lock()
+        self._bloom_ready = threading.Event()
+        self._local = threading.local()
+
+        self._writes: "queue.Queue" = queue.Queue()
+        self._closed = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._write_loop, name="coupon-writer", daemon=True),
+            threading.Thread(target=self._refill_loop, name="coupon-pool", daemon=True),
+            threading.Thread(target=self._build_bloom, args=(True,), name="coupon-bloom", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+        self._refill_needed.set()
+
+    # -- public API --------------------------------------------------------
+
+    def issue(self, lane_id: Optional[str] = None, item: Optional[str] = None) -> Coupon:
+        """Take a code from the pool and mark it issued."""
+        while True:
+            code = self._take_from_pool()
+            issued_at = time.time()
+            updated = self._write(
+                "UPDATE coupons SET status = 'issued', lane_id = ?, item = ?, issued_at = ?"
+                " WHERE code = ? AND status = 'pool'",
+                (lane_id, item, issued_at, code),
+            )
+            if updated:
+                self._bloom_add(code)
+                return Coupon(code=code, status="issued", lane_id=lane_id, item=item, issued_at=issued_at)
+
+    def verify(self, code: str) -> Optional[Coupon]:
+        """Look up an issued code; None if it was never issued."""
+        code = normalize_code(code)
+        if code is None:
+            return None
+        if self._bloom_ready.is_set() and code not in self.bloom:
+            return None
+        row = self._reader().execute(
+            "SELECT code, status, lane_id, item, issued_at, redeemed_at, partner_id"
+            " FROM coupons WHERE code = ?",
+            (code,),
+        ).fetchone()
+        if row is None or row[1] == "pool":
+            return None
+        return Coupon(*row)
+
+    def redeem(self, code: str, partner_id: Optional[str] = None) -> Tuple[bool, Optional[Coupon]]:
+        """Redeem a code exactly once.
+
+        Returns (True, coupon) when this call redeemed it, (False, coupon)
+        if it had already been redeemed and (False, None) if it was never
+        issued.
+        """
+        normalized = normalize_code(code)
+        if normalized is None or (self._bloom_ready.is_set() and normalized not in self.bloom):
+            return False, None
+        updated = self._write(
+            "UPDATE coupons SET status = 'redeemed', redeemed_at = ?, partner_id = ?"
+            " WHERE code = ? AND status = 'issued'",
+            (time.time(), partner_id, normalized),
+        )
+        if updated:
+            logger.info("🎟️ Coupon %s redeemed by %s", normalized, partner_id or "unknown partner")
+        return bool(updated), self.verify(normalized)
+
+    def close(self, timeout: float = 5.0):
+        self._closed.set()
+        self._refill_needed.set()
+        self._writes.put(None)
+        for t in self._threads:
+            t.join(timeout)
+        if self._bloom_ready.is_set() and self._next_bloom is None:
+            try:
+                self.bloom.save(self.bloom_path, time.time() - BLOOM_SAVE_MARGIN)
+            except OSError:
+                logger.exception("Failed to save coupon filter")
+
+    # -- pool --------------------------------------------------------------
+
+    def _take_from_pool(self) -> str:
+        with self._pool_lock:
+            if len(self._pool) < self.pool_size // 2:
+                self._refill_needed.set()
+            if self._pool:
+                return self._pool.popleft()
+        # Pool ran dry (burst at startup): generate one inline.
+        code = generate_code()
+        self._write("INSERT OR IGNORE INTO coupons (code) VALUES (?)", (code,))
+        return code
+
+    def _refill_loop(self):
+        while not self._closed.is_set():
+            self._refill_needed.wait()
+            self._refill_needed.clear()
+            if self._closed.is_set():
+                return
+            with self._pool_lock:
+                missing = self.pool_size - len(self._pool)
+            if missing <= 0:
+                continue
+            codes = [generate_code() for _ in range(missing)]
+            try:
+                inserted = self._write_many("INSERT OR IGNORE INTO coupons (code) VALUES (?)", codes)
+            except Exception:
+                logger.exception("Failed to refill coupon pool")
+                continue
+            with self._pool_lock:
+                self._pool.extend(inserted)
+            logger.debug("Coupon pool refilled with %d codes", len(inserted))
+
+    def _bloom_add(self, code: str):
+        with self._bloom_lock:
+            for bloom in (self.bloom, self._next_bloom):
+                if bloom is not None:
+                    bloom.add(code)
+            self._bloom_count += 1
+            full = self.bloom is not None and self._next_bloom is None and self._bloom_count > self.bloom.capacity
+            if full:
+                # Placeholder so only one rebuild starts; _build_bloom replaces it.
+                self._next_bloom = BloomFilter(1)
+        if full:
+            logger.info("Coupon filter is full (%d codes), rebuilding it larger", self._bloom_count)
+            threading.Thread(target=self._build_bloom, args=(False,), name="coupon-bloom", daemon=True).start()
+
+    def _build_bloom(self, use_saved: bool):
+        """Fill a filter sized for the issued codes, then make it the live one.
+
+        A saved filter that is still big enough only needs the codes issued
+        since it was written. Otherwise every issued code is hashed, which
+        costs a few seconds per million codes on a kiosk CPU; lookups fall
+        back to the database (or the old filter) until it is done.
+        """
+        started = time.perf_counter()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            (count,) = conn.execute("SELECT COUNT(*) FROM coupons WHERE status != 'pool'").fetchone()
+            saved = BloomFilter.load(self.bloom_path) if use_saved else None
+            if saved is not None and saved[0].capacity >= count:
+                bloom, watermark = saved
+                query = ("SELECT code FROM coupons WHERE status != 'pool' AND issued_at >= ?", (watermark,))
+            else:
+                bloom = BloomFilter(max(self.min_bloom_capacity, count * BLOOM_HEADROOM))
+                query = ("SELECT code FROM coupons WHERE status != 'pool'", ())
+            # Codes issued from here on are added by _bloom_add; anything
+            # committed before is returned by the query.
+            with self._bloom_lock:
+                self._next_bloom = bloom
+                self._bloom_count = count
+            added = 0
+            for (code,) in conn.execute(*query):
+                bloom.add(code)
+                added += 1
+        finally:
+            conn.close()
+        with self._bloom_lock:
+            self.bloom, self._next_bloom = bloom, None
+        self._bloom_ready.set()
+        logger.info(
+            "Coupon filter ready: capacity %d, %d issued codes, %d hashed in %.1fs",
+            bloom.capacity, count, added, time.perf_counter() - started,
+        )
+
+    # -- storage -----------------------------------------------------------
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def _write(self, sql: str, params: tuple) -> int:
+        future: Future = Future()
+        self._writes.put(("one", sql, params, future))
+        return future.result()
+
+    def _write_many(self, sql: str, codes: list) -> list:
+        future: Future = Future()
+        self._writes.put(("many", sql, codes, future))
+        return future.result()
+
+    def _write_loop(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        while True:
+            job = self._writes.get()
+            if job is None:
+                break
+            group = [job]
+            while len(group) < MAX_GROUP:
+                try:
+                    job = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._writes.put(None)
+                    break
+                group.append(job)
+            self._commit(conn, group)
+        conn.close()
+
+    def _commit(self, conn, group):
+        results = []
+        try:
+            with conn:
+                for kind, sql, params, _ in group:
+                    if kind == "one":
+                        results.append(conn.execute(sql, params).rowcount)
+                    else:
+                        results.append([code for code in params if conn.execute(sql, (code,)).rowcount])
+        except Exception as e:
+            for *_, future in group:
+                future.set_exception(e)
+            return
+        for (*_, future), result in zip(group, results):
+            future.set_result(result)
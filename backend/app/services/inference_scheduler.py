@@ -0,0 +1,105 @@
+"""Shared inference scheduler that batches scans from several lanes."""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import List, Tuple
+
+from app.modules.ai import Detection, RealAI
+from app.modules.cpu_budget import pin_thread
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceScheduler:
+    """Collects scan frames from all lanes and runs them as one predict call.
+
+    Lanes announce a scan with scanning() before they capture. A batch is
+    dispatched as soon as it holds a frame from every lane that is currently
+    scanning (so a lone scan never waits, even on a multi-lane kiosk) or
+    after max_wait seconds, whichever comes first.
+    """
+
+    def __init__(self, ai: RealAI, lanes: int = 1, max_batch: int = 4, max_wait: float = 0.015):
+        self.ai = ai
+        self.lanes = lanes
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+
+        self._pending: List[Tuple[object, Future]] = []
+        self._active = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+        self._thread.start()
+
+    @contextmanager
+    def scanning(self):
+        """Mark a lane as mid-scan (capturing or waiting) for the duration of the block."""
+        with self._cond:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                # A batch may have been waiting for this lane's frame.
+                self._cond.notify()
+
+    def detect(self, frame) -> Detection:
+        """Blocking: queue a frame and wait for its detection."""
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Inference scheduler is shut down")
+            self._pending.append((frame, future))
+            self._cond.notify()
+        return future.result()
+
+    def shutdown(self, timeout: float = 5.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return None
+
+            deadline = time.monotonic() + self.max_wait
+            while len(self._pending) < self._batch_target() and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            return batch
+
+    def _batch_target(self) -> int:
+        # Caller holds self._cond. Frames submitted outside scanning() count
+        # as their own lane, hence the floor of one.
+        return min(self.max_batch, self.lanes, max(self._active, 1))
+
+    def _run(self):
+        pin_thread(self.ai.cpu_profile, "inference")
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            frames = [frame for frame, _ in batch]
+            try:
+                detections = self.ai.detect_batch(frames)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            if len(batch) > 1:
+                logger.info("Batched %d lane scans into one inference call", len(batch))
+            for (_, future), detection in zip(batch, detections):
+                future.set_result(detection)
@@ -0,0 +1,76 @@
+"""Lane (intake chute) configuration and registry."""
+import json
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.modules.ai import RealAI
+from app.modules.capture import DetectorLabeler, HardNegativeCollector
+from .inference_scheduler import InferenceScheduler
+from .state_manager import StateManager
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).parent.parent.parent
+LANES_FILE = BACKEND_DIR / "lanes.json"
+
+
+@dataclass
+class LaneConfig:
+    lane_id: str
+    camera_device: int
+    arduino_port: Optional[str] = None
+
+
+def load_lane_configs(path: Path = LANES_FILE) -> List[LaneConfig]:
+    """Read lanes.json, e.g. [{"lane_id": "0", "camera_device": 0, "arduino_port": "/dev/ttyACM0"}].
+
+    Without the file the machine runs a single lane "0" on camera 0 with
+    the default Arduino port, exactly as before lanes existed.
+    """
+    if not path.exists():
+        return [LaneConfig(lane_id="0", camera_device=0)]
+    with open(path) as f:
+        configs = [LaneConfig(**{**entry, "lane_id": str(entry["lane_id"])}) for entry in json.load(f)]
+    if not configs:
+        raise ValueError(f"{path} defines no lanes")
+    return configs
+
+
+class LaneRegistry:
+    """Builds one StateManager per lane around a shared model and scheduler."""
+
+    def __init__(self, configs: Optional[List[LaneConfig]] = None):
+        configs = configs or load_lane_configs()
+
+        self.ai = RealAI()
+        self.scheduler = InferenceScheduler(self.ai, lanes=len(configs))
+        ai_root = BACKEND_DIR.parent / "ai"
+        self.hard_negatives = HardNegativeCollector(
+            ai_root / "dataset" / "captured",
+            labeler=DetectorLabeler(lambda: self.ai.model_path),
+        )
+
+        self.lanes: Dict[str, StateManager] = {}
+        for config in configs:
+            self.lanes[config.lane_id] = StateManager(
+                lane_id=config.lane_id,
+                camera_device=config.camera_device,
+                arduino_port=config.arduino_port,
+                ai=self.ai,
+                scheduler=self.scheduler,
+                hard_negatives=self.hard_negatives,
+            )
+        self.default = self.lanes[configs[0].lane_id]
+        logger.info("Lanes ready: %s", ", ".join(self.lanes))
+
+    def get(self, lane_id: str) -> Optional[StateManager]:
+        return self.lanes.get(lane_id)
+
+    def shutdown(self):
+        for lane in self.lanes.values():
+            lane.shutdown()
+        self.scheduler.shutdown()
+        self.hard_negatives.close()
+        self.ai.release_camera()
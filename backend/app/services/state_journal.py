@@ -0,0 +1,181 @@
+"""Append-only journal of lane state transitions and hardware actions.
+
+Each lane writes one record per transition, trapdoor action and receipt
+print to journal.log. A writer thread batches whatever has queued up into
+a single write + fsync (group commit), so StateManager only pays for a
+queue put. Every `snapshot_every` records the folded lane state is written
+to snapshot.json and the journal restarts empty, so recovery reads one
+small JSON file plus at most a few hundred lines.
+
+Lines are "<crc32> <json>"; a torn last line from a crash fails its CRC
+and replay stops there.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def empty_view() -> dict:
+    return {
+        "seq": 0,
+        "state": {"state": "idle"},
+        "bottle_id": 0,
+        "trapdoor": "closed",
+        "trapdoor_auto_close_at": None,
+        "pending_prints": [],
+    }
+
+
+def apply_record(view: dict, record: dict) -> dict:
+    """Fold one journal record into the lane view."""
+    kind = record["type"]
+    if kind == "state":
+        view["state"] = record["state"]
+    elif kind == "trapdoor":
+        view["trapdoor"] = record["action"]
+        view["trapdoor_auto_close_at"] = record.get("auto_close_at")
+    elif kind == "bottle":
+        view["bottle_id"] = record["bottle_id"]
+    elif kind == "print_pending":
+        job = record["job"]
+        jobs = [j for j in view["pending_prints"] if j["bottle_id"] != job["bottle_id"]]
+        view["pending_prints"] = jobs + [job]
+    elif kind == "print_done":
+        view["pending_prints"] = [j for j in view["pending_prints"] if j["bottle_id"] != record["bottle_id"]]
+    view["seq"] = record["seq"]
+    return view
+
+
+def _encode(record: dict) -> bytes:
+    body = json.dumps(record, separators=(",", ":")).encode()
+    return b"%08x %s\n" % (zlib.crc32(body), body)
+
+
+def _decode(line: bytes) -> Optional[dict]:
+    try:
+        crc, body = line.rstrip(b"\n").split(b" ", 1)
+        if int(crc, 16) != zlib.crc32(body):
+            return None
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+class StateJournal:
+    """Group-committed journal with periodic snapshots for one lane."""
+
+    def __init__(self, directory: Path, snapshot_every: int = 500, queue_size: int = 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.journal_file = self.directory / "journal.log"
+        self.snapshot_file = self.directory / "snapshot.json"
+        self.snapshot_every = snapshot_every
+
+        self.view = self._recover()
+        self._seq = self.view["seq"]
+        self._seq_lock = threading.Lock()
+        self._since_snapshot = 0
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._file = open(self.journal_file, "ab")
+        self._thread = threading.Thread(target=self._run, name=f"journal-{self.directory.name}", daemon=True)
+        self._thread.start()
+
+    def append(self, kind: str, **data):
+        """Queue a record; never blocks on disk."""
+        with self._seq_lock:
+            self._seq += 1
+            record = {"seq": self._seq, "ts": time.time(), "type": kind, **data}
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                logger.warning("State journal queue full, waiting on disk for %s", kind)
+                self._queue.put(record)
+
+    def close(self, timeout: float = 5.0):
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _recover(self) -> dict:
+        started = time.perf_counter()
+        view = empty_view()
+        if self.snapshot_file.exists():
+            try:
+                view = json.loads(self.snapshot_file.read_text())
+            except ValueError:
+                logger.error("Corrupt snapshot %s, replaying journal only", self.snapshot_file)
+
+        replayed = 0
+        if self.journal_file.exists():
+            valid_bytes = 0
+            with open(self.journal_file, "rb") as f:
+                for line in f:
+                    record = _decode(line)
+                    if record is None:
+                        logger.warning("Journal %s has a torn record, ignoring the tail", self.journal_file)
+                        break
+                    valid_bytes += len(line)
+                    if record["seq"] > view["seq"]:
+                        apply_record(view, record)
+                        replayed += 1
+            if valid_bytes != self.journal_file.stat().st_size:
+                with open(self.journal_file, "r+b") as f:
+                    f.truncate(valid_bytes)
+
+        logger.info(
+            "Recovered lane state from %s (%d journal records) in %.1f ms",
+            self.directory, replayed, (time.perf_counter() - started) * 1000,
+        )
+        return view
+
+    def _snapshot(self):
+        tmp = self.snapshot_file.with_name(self.snapshot_file.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.view, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_file)
+        # Records up to view["seq"] are in the snapshot; start a fresh journal.
+        self._file.close()
+        self._file = open(self.journal_file, "wb")
+        self._since_snapshot = 0
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            stop = record is None
+            group = [] if stop else [record]
+            while True:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                    continue
+                group.append(record)
+
+            try:
+                if group:
+                    self._file.write(b"".join(_encode(r) for r in group))
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    for r in group:
+                        apply_record(self.view, r)
+                    self._since_snapshot += len(group)
+                if self._since_snapshot >= self.snapshot_every or (stop and self._since_snapshot):
+                    self._snapshot()
+            except Exception:
+                logger.exception("State journal write failed")
+
+            if stop:
+                self._file.close()
+                return
@@ -1,30 +1,85 @@
 """State machine service for the vending system."""
+import copy
 import logging
 import csv
+import threading
+from dataclasses import replace
 from datetime import datetime
 from pathlib import Path
+from typing import Dict, List, Optional
 from app.models import State, SystemState
-from app.modules.ai import RealAI
+from app.modules.ai import Detection, RealAI
+from app.modules.capture import DetectorLabeler, HardNegativeCollector
 from app.modules.arduino import ArduinoController
+from app.modules.recorder import ClipRecorder
+from .state_journal import StateJournal
 
 logger = logging.getLogger(__name__)
 
+# Accepted scans below this confidence are kept as retraining samples.
+LOW_CONFIDENCE_ACCEPT = 0.5
+
 
 class StateManager:
-    """Orchestrates system state transitions and core business logic."""
+    """Orchestrates system state transitions and core business logic for one lane.
+
+    Each intake chute (lane) gets its own StateManager with its own camera,
+    trapdoor and state. The AI model, inference scheduler and hard-negative
+    collector can be shared between lanes (see LaneRegistry).
+    """
 
-    def __init__(self):
+    def __init__(
+        self,
+        lane_id: str = "0",
+        camera_device: int = 0,
+        arduino_port: Optional[str] = None,
+        ai: Optional[RealAI] = None,
+        scheduler=None,
+        hard_negatives: Optional[HardNegativeCollector] = None,
+        arduino: Optional[ArduinoController] = None,
+        logs_dir: Optional[Path] = None,
+    ):
+        self.lane_id = lane_id
+        self.camera_device = camera_device
+        # Single writer: transitions take _write_lock and compare versions;
+        # readers just load current_state, which is never mutated in place.
+        self._write_lock = threading.Lock()
         self.current_state = SystemState(state=State.IDLE)
         self.bottle_id = 0
-        self.ai = RealAI()
-        self.arduino = ArduinoController()
+        self.ai = ai or RealAI()
+        self.scheduler = scheduler
+        if arduino is None:
+            arduino = ArduinoController(arduino_port) if arduino_port else ArduinoController()
+        self.arduino = arduino
 
         base_dir = Path(__file__).parent.parent.parent
-        self.logs_dir = base_dir / "logs"
-        self.logs_dir.mkdir(exist_ok=True)
+        self.logs_dir = Path(logs_dir) if logs_dir is not None else base_dir / "logs"
+        self.logs_dir.mkdir(parents=True, exist_ok=True)
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.csv_file = self.logs_dir / f"bottle_log_{timestamp}.csv"
+        lane_tag = "" if lane_id == "0" else f"lane{lane_id}_"
+        self.csv_file = self.logs_dir / f"bottle_log_{lane_tag}{timestamp}.csv"
+
+        self.recorder = ClipRecorder(self.logs_dir / "clips" / f"lane_{lane_id}")
+        self.ai.add_frame_listener(self.recorder.push, camera_device)
+
+        self.journal = StateJournal(self.logs_dir / "state" / f"lane_{lane_id}")
+        # Receipts confirmed but not printed yet, by bottle id, oldest first.
+        # A job is claimed by one printer call at a time; failed jobs stay
+        # queued for reprint_failed (startup, admin) instead of being
+        # overwritten by the next confirm.
+        self.pending_prints: Dict[int, dict] = {}
+        self._printing = set()
+        self._print_failed = set()
+
+        self._owns_hard_negatives = hard_negatives is None
+        if hard_negatives is None:
+            ai_root = base_dir.parent / "ai"
+            hard_negatives = HardNegativeCollector(
+                ai_root / "dataset" / "captured",
+                labeler=DetectorLabeler(lambda: self.ai.model_path),
+            )
+        self.hard_negatives = hard_negatives
 
         self._initialize()
         self._init_csv()
@@ -46,6 +101,7 @@ class StateManager:
                     [self.bottle_id, timestamp, detected_class, confidence]
                 )
             self.bottle_id += 1
+            self.journal.append("bottle", bottle_id=self.bottle_id)
         except Exception as e:
             logger.error("Failed to write to CSV: %s", e)
 
@@ -61,93 +117,255 @@ class StateManager:
             return False
 
     def _initialize(self):
-        logger.info("Initializing system")
+        logger.info("Initializing lane %s", self.lane_id)
+        self._recover(copy.deepcopy(self.journal.view))
         self.arduino.connect()
-        self.arduino.close_trapdoor()
+        self._close_trapdoor()
         logger.info("System ready")
 
+    def _recover(self, view: dict):
+        """Restore the lane from the journal after a restart or crash."""
+        self.bottle_id = view["bottle_id"]
+        state = SystemState.from_dict(view["state"])
+        if state.state in (State.SCANNING, State.PRINTING):
+            # The scan or confirm never finished; its outcome is not trustworthy.
+            logger.warning("Lane %s restarted mid-%s, returning to IDLE", self.lane_id, state.state.value)
+            state = SystemState(state=State.IDLE)
+        elif state.state != State.IDLE:
+            logger.warning("Lane %s resuming in %s (%s)", self.lane_id, state.state.value, state.item_detected)
+        with self._write_lock:
+            self._set_state(state)
+
+        # The Arduino's auto-close timer is not journaled, so an "open" record
+        # whose deadline has passed just means the timer already closed it.
+        auto_close_at = view.get("trapdoor_auto_close_at")
+        if view["trapdoor"] == "unknown":
+            logger.warning("Trapdoor on lane %s failed to close before the backend stopped, closing it", self.lane_id)
+        elif view["trapdoor"] == "open" and (auto_close_at is None or auto_close_at > datetime.now().timestamp()):
+            logger.warning("Trapdoor on lane %s was open when the backend stopped, closing it", self.lane_id)
+        self.pending_prints = {job["bottle_id"]: job for job in view["pending_prints"]}
+        self._print_failed = set(self.pending_prints)
+        if self.pending_prints:
+            logger.warning("Lane %s has unprinted receipts for bottles %s", self.lane_id, sorted(self.pending_prints))
+
+    def _set_state(self, state: SystemState) -> SystemState:
+        """Publish the next state. Caller must hold _write_lock."""
+        state = replace(state, version=self.current_state.version + 1)
+        self.current_state = state
+        self.journal.append("state", state=state.to_dict())
+        return state
+
+    def _open_trapdoor(self, auto_close_delay: float):
+        if self.arduino.open_trapdoor_with_timer(auto_close_delay=auto_close_delay):
+            self.journal.append("trapdoor", action="open", auto_close_at=datetime.now().timestamp() + auto_close_delay)
+
+    def _close_trapdoor(self):
+        # A failed close may have left it open; "unknown" makes recovery
+        # treat it as open rather than trust an earlier "closed".
+        closed = self.arduino.close_trapdoor()
+        self.journal.append("trapdoor", action="closed" if closed else "unknown")
+        return closed
+
     def get_status(self) -> SystemState:
+        """Lock-free: states are immutable and swapped in with one assignment."""
         return self.current_state
 
     def start_scan(self) -> SystemState:
-        if self.current_state.state != State.IDLE:
-            return self.current_state
+        current = self.current_state
+        if current.state != State.IDLE:
+            return current
 
-        self.current_state = SystemState(state=State.SCANNING)
+        with self._write_lock:
+            if self.current_state.version != current.version:
+                return self.current_state  # another request started a scan first
+            scanning = self._set_state(SystemState(state=State.SCANNING))
         logger.info("State transition: IDLE -> SCANNING")
 
-        detected_class, confidence = self.ai.detect(0)
+        detection = self._detect()
+        detected_class, confidence = detection.detected_class, detection.confidence
         is_bottle = self.ai.is_water_bottle(detected_class, confidence)
 
-        if is_bottle:
-            self.current_state = SystemState(
-                state=State.VALID_ITEM,
-                item_detected=detected_class,
-                confidence=confidence,
-            )
-            logger.info("State transition: SCANNING -> VALID_ITEM")
-            logger.info(f"✅ Valid item detected: {detected_class} ({confidence:.2%})")
-            self.arduino.open_trapdoor_with_timer(auto_close_delay=2.0)
-        else:
-            self.current_state = SystemState(
-                state=State.INVALID_ITEM,
-                item_detected=detected_class,
-                confidence=confidence,
-                error_message="Invalid item. Please remove and try again.",
+        reason = "invalid" if not is_bottle else "low_conf"
+        if (not is_bottle or confidence < LOW_CONFIDENCE_ACCEPT) and detection.source != "none":
+            # Student verdicts come without boxes; the collector has the
+            # detector label those on its own thread.
+            self.hard_negatives.submit(
+                detection.frame,
+                detection.boxes if detection.source == "detector" else None,
+                reason,
+                detected_class,
+                confidence,
             )
-            logger.info("State transition: SCANNING -> INVALID_ITEM")
 
-        return self.current_state
+        with self._write_lock:
+            if self.current_state.version != scanning.version:
+                logger.warning("Lane %s changed during scan, discarding result", self.lane_id)
+                return self.current_state
+            if is_bottle:
+                result = self._set_state(SystemState(
+                    state=State.VALID_ITEM,
+                    item_detected=detected_class,
+                    confidence=confidence,
+                ))
+                logger.info("State transition: SCANNING -> VALID_ITEM")
+                logger.info(f"✅ Valid item detected: {detected_class} ({confidence:.2%})")
+                self._open_trapdoor(auto_close_delay=2.0)
+            else:
+                result = self._set_state(SystemState(
+                    state=State.INVALID_ITEM,
+                    item_detected=detected_class,
+                    confidence=confidence,
+                    error_message="Invalid item. Please remove and try again.",
+                ))
+                logger.info("State transition: SCANNING -> INVALID_ITEM")
+
+        self.recorder.trigger("scan", result.to_dict())
+        return result
+
+    def _detect(self) -> Detection:
+        if self.scheduler is None:
+            return self.ai.detect_details(self.camera_device)
+        with self.scheduler.scanning():
+            frame = self.ai.capture_frame(self.camera_device)
+            if frame is None:
+                logger.warning("Could not capture frame for detection")
+                return Detection("unknown", 0.0, source="none")
+            return self.scheduler.detect(frame)
 
     def confirm_drop(self) -> SystemState:
-        if self.current_state.state != State.VALID_ITEM:
-            return self.current_state
+        current = self.current_state
+        if current.state != State.VALID_ITEM:
+            return current
 
-        self._print_coupon()
-        logger.info("Coupon print signal sent to PC printer")
+        with self._write_lock:
+            if self.current_state.version != current.version:
+                return self.current_state  # already confirmed or reset
 
-        self.current_state = SystemState(
-            state=State.PRINTING,
-            item_detected=self.current_state.item_detected,
-            confidence=self.current_state.confidence,
-        )
-        logger.info("State transition: VALID_ITEM -> PRINTING")
+            self._print_coupon()
+            logger.info("Coupon print signal sent to PC printer")
 
-        logger.info(
-            "Bottle accepted | bottle_id=%d | confidence=%.2f",
-            self.bottle_id,
-            self.current_state.confidence,
-        )
+            job = {
+                "bottle_id": self.bottle_id,
+                "item_detected": current.item_detected,
+                "confidence": current.confidence,
+            }
+            self.pending_prints[job["bottle_id"]] = job
+            self.journal.append("print_pending", job=job)
+            self._set_state(SystemState(
+                state=State.PRINTING,
+                item_detected=current.item_detected,
+                confidence=current.confidence,
+            ))
+            logger.info("State transition: VALID_ITEM -> PRINTING")
 
-        self._log_to_csv(
-            self.current_state.item_detected or "unknown",
-            self.current_state.confidence or 0.0,
-        )
+            logger.info(
+                "Bottle accepted | bottle_id=%d | confidence=%.2f",
+                self.bottle_id,
+                current.confidence,
+            )
 
-        logger.info("Reward printing triggered (placeholder)")
-        
-        self.current_state = SystemState(state=State.IDLE)
-        logger.info("State transition: PRINTING -> IDLE")
+            self._log_to_csv(
+                current.item_detected or "unknown",
+                current.confidence or 0.0,
+            )
+            bottle_id = self.bottle_id - 1
 
-        return self.current_state
+            result = self._set_state(SystemState(state=State.IDLE))
+            logger.info("State transition: PRINTING -> IDLE")
+
+        logger.info("Reward printing triggered (placeholder)")
+        self.recorder.trigger(
+            "confirm",
+            {
+                "bottle_id": bottle_id,
+                "item_detected": current.item_detected,
+                "confidence": current.confidence,
+            },
+        )
+        return result
 
     def handle_invalid_removal(self) -> SystemState:
-        if self.current_state.state != State.INVALID_ITEM:
-            return self.current_state
+        current = self.current_state
+        if current.state != State.INVALID_ITEM:
+            return current
 
-        self.current_state = SystemState(state=State.IDLE)
+        with self._write_lock:
+            if self.current_state.version != current.version:
+                return self.current_state
+            result = self._set_state(SystemState(state=State.IDLE))
         logger.info("State transition: INVALID_ITEM -> IDLE")
-        return self.current_state
+        self.recorder.trigger("invalid_removed", current.to_dict())
+        return result
+
+    def claim_print_job(self) -> Optional[dict]:
+        """Hand a freshly confirmed receipt to exactly one caller.
+
+        Concurrent confirms for the same item all see the lane go idle; only
+        the first to claim the job prints the receipt. Jobs whose print
+        failed are not handed out here, so they never end up on the next
+        customer's receipt.
+        """
+        with self._write_lock:
+            for bottle_id, job in self.pending_prints.items():
+                if bottle_id not in self._printing and bottle_id not in self._print_failed:
+                    self._printing.add(bottle_id)
+                    return dict(job)
+            return None
+
+    def claim_failed_print_jobs(self) -> List[dict]:
+        """Claim every receipt whose print failed (or was cut off by a restart)."""
+        with self._write_lock:
+            jobs = [
+                dict(job) for bottle_id, job in self.pending_prints.items()
+                if bottle_id in self._print_failed and bottle_id not in self._printing
+            ]
+            self._printing.update(job["bottle_id"] for job in jobs)
+            return jobs
+
+    def pending_print_ids(self) -> List[int]:
+        """Bottle ids whose receipt has not been printed yet."""
+        with self._write_lock:
+            return sorted(self.pending_prints)
+
+    def attach_coupon(self, bottle_id: int, coupon_code: str):
+        """Journal the coupon issued for a receipt so a reprint reuses it."""
+        with self._write_lock:
+            job = self.pending_prints.get(bottle_id)
+            if job is None:
+                return
+            job = self.pending_prints[bottle_id] = {**job, "coupon_code": coupon_code}
+            self.journal.append("print_pending", job=job)
+
+    def print_finished(self, bottle_id: int):
+        """Record that the receipt for a bottle went out."""
+        with self._write_lock:
+            if self.pending_prints.pop(bottle_id, None) is None:
+                return
+            self._printing.discard(bottle_id)
+            self._print_failed.discard(bottle_id)
+            self.journal.append("print_done", bottle_id=bottle_id)
+
+    def print_failed(self, bottle_id: int):
+        """Release a claimed job so it stays queued for a reprint."""
+        with self._write_lock:
+            self._printing.discard(bottle_id)
+            if bottle_id in self.pending_prints:
+                self._print_failed.add(bottle_id)
 
     def reset(self) -> SystemState:
-        self.arduino.close_trapdoor()
-        self.current_state = SystemState(state=State.IDLE)
+        with self._write_lock:
+            self._close_trapdoor()
+            result = self._set_state(SystemState(state=State.IDLE))
         logger.warning("System reset to IDLE")
-        return self.current_state
+        return result
 
     def shutdown(self):
         logger.info("Shutting down system")
-        self.arduino.close_trapdoor()
+        self._close_trapdoor()
         self.arduino.disconnect()
-        self.ai.release_camera()
+        self.ai.release_camera(self.camera_device)
+        self.recorder.close()
+        if self._owns_hard_negatives:
+            self.hard_negatives.close()
+        self.journal.close()
         logger.info("Shutdown complete")
\ No newline at end of file
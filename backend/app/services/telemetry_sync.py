@@ -0,0 +1,367 @@
+"""Offline-first sync of transaction logs to a fleet telemetry collector.
+
+Two background threads:
+
+- The packer tails backend/logs/bottle_log_*.csv and seals new rows into
+  gzip-compressed, SHA-256 checksummed segments in an on-disk outbox. Each
+  segment carries a per-machine sequence number and the log offsets it
+  covers, so a crash between sealing a segment and saving the tail state
+  is repaired on restart instead of producing a second copy.
+- The uploader pushes segments oldest-first to the collector, retrying
+  with exponential backoff. The collector dedupes on (machine_id, seq),
+  so re-sending after a lost response is harmless.
+
+The collector also keeps the log offsets each segment covers. If the
+local state is gone (no state.json and no queued segments) or the
+collector answers 409 (it holds that seq with other contents), the agent
+resumes from the collector's last seq and offsets: queued segments are
+dropped and anything past those offsets is packed again from the CSVs,
+so rows are neither lost nor stored twice.
+
+Run standalone with:
+    python -m app.services.telemetry_sync --url http://collector:8100
+"""
+import argparse
+import csv
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+LOGS_DIR = Path(__file__).parent.parent.parent / "logs"
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class TelemetrySync:
+    """Tails transaction CSVs into an outbox and uploads it to a collector."""
+
+    def __init__(
+        self,
+        collector_url: str,
+        machine_id: Optional[str] = None,
+        logs_dir: Path = LOGS_DIR,
+        batch_records: int = 500,
+        batch_seconds: float = 30.0,
+        poll_seconds: float = 2.0,
+        max_backoff: float = 300.0,
+        timeout: float = 10.0,
+    ):
+        self.collector_url = collector_url.rstrip("/")
+        self.machine_id = machine_id or socket.gethostname()
+        self.logs_dir = Path(logs_dir)
+        self.outbox_dir = self.logs_dir / "outbox"
+        self.rejected_dir = self.outbox_dir / "rejected"
+        self.state_file = self.outbox_dir / "state.json"
+        self.batch_records = batch_records
+        self.batch_seconds = batch_seconds
+        self.poll_seconds = poll_seconds
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+        self.outbox_dir.mkdir(parents=True, exist_ok=True)
+        self.rejected_dir.mkdir(exist_ok=True)
+        self.offsets, self.next_seq, known = self._load_state()
+        # Sealing and resyncing both move offsets and sequence numbers.
+        self._seq_lock = threading.Lock()
+        # Cleared until the collector says where to resume; set by _resync
+        # to make the packer drop what it has read and start from self.offsets.
+        self._state_known = threading.Event()
+        if known:
+            self._state_known.set()
+        self._rewind = threading.Event()
+
+        self._stop = threading.Event()
+        self._outbox_ready = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._pack_loop, name="telemetry-packer", daemon=True),
+            threading.Thread(target=self._upload_loop, name="telemetry-uploader", daemon=True),
+        ]
+
+    def start(self):
+        for t in self._threads:
+            t.start()
+        logger.info("Telemetry sync started (machine=%s, collector=%s)", self.machine_id, self.collector_url)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._outbox_ready.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    # -- state -------------------------------------------------------------
+
+    def _load_state(self):
+        """(offsets, next_seq, known); known is False when there is nothing local to go on."""
+        offsets, next_seq, known = {}, 0, False
+        if self.state_file.exists():
+            state = json.loads(self.state_file.read_text())
+            offsets, next_seq, known = state["offsets"], state["next_seq"], True
+
+        # A segment sealed after the last state save already covers its rows.
+        for path in sorted(self.outbox_dir.glob("seg-*.json.gz")):
+            seq = int(path.name.split("-")[1].split(".")[0])
+            if seq >= next_seq:
+                with gzip.open(path, "rt") as f:
+                    offsets = json.load(f)["offsets_after"]
+                next_seq = seq + 1
+                known = True
+        return offsets, next_seq, known
+
+    def _save_state(self):
+        state = {"offsets": self.offsets, "next_seq": self.next_seq}
+        _write_atomic(self.state_file, json.dumps(state).encode())
+
+    # -- packer ------------------------------------------------------------
+
+    def _read_new_rows(self, positions):
+        """Read complete new lines from every log.
+
+        Returns (rows, new read positions). Each row remembers the byte
+        offset just past its line so a segment can record exactly how far
+        it covers, even when one read is split across several segments.
+        """
+        rows = []
+        positions = dict(positions)
+        for path in sorted(self.logs_dir.glob("bottle_log_*.csv")):
+            start = positions.get(path.name, 0)
+            if path.stat().st_size <= start:
+                continue
+            with open(path, "rb") as f:
+                f.seek(start)
+                chunk = f.read()
+            end = chunk.rfind(b"\n") + 1  # leave a half-written last line for later
+            if end == 0:
+                continue
+
+            pos = start
+            for line in chunk[:end].split(b"\n")[:-1]:
+                line_start, pos = pos, pos + len(line) + 1
+                if line_start == 0:
+                    continue  # header
+                try:
+                    record = next(csv.reader([line.decode("utf-8")]), [])
+                    if len(record) < 4:
+                        continue
+                    row = {
+                        "source": path.name,
+                        "bottle_id": int(record[0]),
+                        "timestamp": record[1],
+                        "detected_class": record[2],
+                        "confidence": float(record[3]),
+                        "_end": pos,
+                    }
+                except (ValueError, csv.Error) as e:
+                    # Skipped for good: positions still move past it.
+                    logger.warning("Skipping malformed row at byte %d of %s: %s", line_start, path.name, e)
+                    continue
+                rows.append(row)
+            positions[path.name] = start + end
+        return rows, positions
+
+    def _write_segment(self, payload: dict):
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode="wb", mtime=0) as gz:
+            gz.write(json.dumps(payload, separators=(",", ":")).encode())
+        _write_atomic(self.outbox_dir / f"seg-{payload['seq']:012d}.json.gz", buf.getvalue())
+
+    def _seal(self, rows):
+        with self._seq_lock:
+            if self._rewind.is_set():
+                return  # read before a resync; the packer re-reads from the new offsets
+            offsets_after = dict(self.offsets)
+            for row in rows:
+                offsets_after[row["source"]] = row.pop("_end")
+            seq = self.next_seq
+            self._write_segment({
+                "machine_id": self.machine_id,
+                "seq": seq,
+                "created": time.time(),
+                "offsets_after": offsets_after,
+                "records": rows,
+            })
+            self.offsets = offsets_after
+            self.next_seq = seq + 1
+            self._save_state()
+        self._outbox_ready.set()
+        logger.info("Sealed telemetry segment %d (%d records)", seq, len(rows))
+
+    def _pack_loop(self):
+        # Packing from offset 0 would re-send every row the collector has.
+        while not self._state_known.is_set():
+            if self._stop.wait(self.poll_seconds):
+                return
+        pending, positions, first_seen = [], dict(self.offsets), None
+        while not self._stop.is_set():
+            if self._rewind.is_set():
+                self._rewind.clear()
+                pending, positions, first_seen = [], dict(self.offsets), None
+            try:
+                rows, positions = self._read_new_rows(positions)
+                if rows:
+                    pending.extend(rows)
+                    first_seen = first_seen or time.monotonic()
+
+                while len(pending) >= self.batch_records:
+                    batch, pending = pending[:self.batch_records], pending[self.batch_records:]
+                    self._seal(batch)
+                if pending and time.monotonic() - first_seen >= self.batch_seconds:
+                    self._seal(pending)
+                    pending = []
+                if not pending:
+                    first_seen = None
+            except Exception:
+                logger.exception("Telemetry packer error")
+            self._stop.wait(self.poll_seconds)
+
+        if pending:
+            self._seal(pending)
+
+    # -- uploader ----------------------------------------------------------
+
+    def _upload(self, path: Path) -> str:
+        data = path.read_bytes()
+        seq = int(path.name.split("-")[1].split(".")[0])
+        request = urllib.request.Request(
+            f"{self.collector_url}/v1/segments",
+            data=data,
+            method="POST",
+            headers={
+                "Content-Type": "application/gzip",
+                "X-Machine-Id": self.machine_id,
+                "X-Sequence": str(seq),
+                "X-Checksum-SHA256": hashlib.sha256(data).hexdigest(),
+            },
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read() or b"{}").get("status", "stored")
+        except urllib.error.HTTPError as e:
+            if e.code == 409:
+                return "conflict"
+            if e.code in (400, 422):
+                return "rejected"
+            raise
+
+    def _collector_position(self):
+        """(last_seq, offsets) the collector has stored for this machine; (-1, {}) if none."""
+        url = f"{self.collector_url}/v1/machines/{urllib.parse.quote(self.machine_id, safe='')}"
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                machine = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return -1, {}
+            raise
+        return machine["last_seq"], machine["offsets"]
+
+    def _resync(self) -> int:
+        """Resume from the collector's last seq and offsets; returns the number of dropped segments.
+
+        The CSVs are the source of truth: rows up to the collector's offsets
+        are already stored, rows after them are packed again, so queued
+        segments can simply be dropped.
+        """
+        last_seq, offsets = self._collector_position()
+        with self._seq_lock:
+            segments = list(self.outbox_dir.glob("seg-*.json.gz"))
+            for path in segments:
+                path.unlink()
+            self.offsets = offsets
+            self.next_seq = last_seq + 1
+            self._save_state()
+            self._rewind.set()
+        self._state_known.set()
+        return len(segments)
+
+    def _wait_backoff(self, backoff: float, message: str, *args) -> float:
+        delay = min(self.max_backoff, backoff) * random.uniform(0.5, 1.0)
+        logger.warning(message + ", retrying in %.0fs", *args, delay)
+        self._stop.wait(delay)
+        return min(self.max_backoff, backoff * 2)
+
+    def _upload_loop(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            if not self._state_known.is_set():
+                try:
+                    self._resync()
+                except (urllib.error.URLError, OSError, ValueError, KeyError) as e:
+                    backoff = self._wait_backoff(backoff, "No local telemetry state and collector unreachable (%s)", e)
+                    continue
+                logger.warning("No local telemetry state, resumed from collector at seq %d", self.next_seq)
+                continue
+
+            segments = sorted(self.outbox_dir.glob("seg-*.json.gz"))
+            if not segments:
+                self._outbox_ready.clear()
+                self._outbox_ready.wait(self.poll_seconds * 5)
+                continue
+
+            path = segments[0]
+            try:
+                status = self._upload(path)
+            except (urllib.error.URLError, OSError) as e:
+                backoff = self._wait_backoff(backoff, "Telemetry upload failed (%s)", e)
+                continue
+
+            if status == "conflict":
+                try:
+                    dropped = self._resync()
+                except (urllib.error.URLError, OSError, ValueError, KeyError) as e:
+                    backoff = self._wait_backoff(backoff, "Sequence conflict on %s, collector state unavailable (%s)",
+                                                 path.name, e)
+                    continue
+                logger.error(
+                    "Collector already has %s with different contents (telemetry state reset?); "
+                    "resumed from collector at seq %d and dropped %d queued segments",
+                    path.name, self.next_seq, dropped,
+                )
+                continue
+
+            backoff = 1.0
+            if status == "rejected":
+                logger.error("Collector rejected segment %s, moving it aside", path.name)
+                os.replace(path, self.rejected_dir / path.name)
+            else:
+                path.unlink()
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync transaction logs to a telemetry collector")
+    parser.add_argument("--url", required=True, help="Collector base URL")
+    parser.add_argument("--machine-id", default=None)
+    parser.add_argument("--logs-dir", default=str(LOGS_DIR))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    sync = TelemetrySync(args.url, args.machine_id, Path(args.logs_dir))
+    sync.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        sync.stop()
+
+
+if __name__ == "__main__":
+    main()
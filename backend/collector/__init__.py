@@ -0,0 +1,4 @@
+"""Reference fleet telemetry collector (see app/services/telemetry_sync.py)."""
+from .app import create_app
+
+__all__ = ["create_app"]
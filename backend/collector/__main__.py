@@ -0,0 +1,20 @@
+"""Run the reference collector locally: python -m collector --port 8100"""
+import argparse
+
+import uvicorn
+
+from .app import create_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reference telemetry collector")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--db", default="collector.db", help="SQLite database file")
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.db), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
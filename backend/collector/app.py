@@ -0,0 +1,200 @@
+"""FastAPI collector that ingests telemetry segments from many machines."""
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    machine_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    checksum TEXT NOT NULL,
+    record_count INTEGER NOT NULL,
+    offsets_after TEXT NOT NULL DEFAULT '{}',
+    received_at TEXT NOT NULL DEFAULT (datetime('now')),
+    PRIMARY KEY (machine_id, seq)
+);
+CREATE TABLE IF NOT EXISTS records (
+    machine_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    source TEXT,
+    bottle_id INTEGER,
+    timestamp TEXT,
+    detected_class TEXT,
+    confidence REAL
+);
+CREATE INDEX IF NOT EXISTS records_machine_time ON records (machine_id, timestamp);
+"""
+
+MAX_GROUP = 256
+
+
+class SegmentStore:
+    """Single SQLite writer with group commit.
+
+    Request handlers only verify and decode payloads; inserts from all
+    concurrent uploads are funnelled to one thread and committed together,
+    which keeps SQLite's single-writer model from serializing requests.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._queue: "queue.Queue" = queue.Queue()
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        self._thread = threading.Thread(target=self._run, name="collector-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, machine_id: str, seq: int, checksum: str, records: list, offsets_after: dict) -> Future:
+        future: Future = Future()
+        self._queue.put((machine_id, seq, checksum, records, offsets_after, future))
+        return future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(5.0)
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            group = [job]
+            while len(group) < MAX_GROUP:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._queue.put(None)
+                    break
+                group.append(job)
+            self._commit(conn, group)
+        conn.close()
+
+    def _commit(self, conn, group):
+        results = []
+        try:
+            with conn:
+                for machine_id, seq, checksum, records, offsets_after, _ in group:
+                    row = conn.execute(
+                        "SELECT checksum FROM segments WHERE machine_id = ? AND seq = ?",
+                        (machine_id, seq),
+                    ).fetchone()
+                    if row is not None:
+                        results.append("duplicate" if row[0] == checksum else "conflict")
+                        continue
+                    conn.execute(
+                        "INSERT INTO segments (machine_id, seq, checksum, record_count, offsets_after)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        (machine_id, seq, checksum, len(records), json.dumps(offsets_after)),
+                    )
+                    conn.executemany(
+                        "INSERT INTO records (machine_id, seq, source, bottle_id, timestamp, detected_class, confidence)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [
+                            (machine_id, seq, r.get("source"), r.get("bottle_id"), r.get("timestamp"),
+                             r.get("detected_class"), r.get("confidence"))
+                            for r in records
+                        ],
+                    )
+                    results.append("stored")
+        except Exception as e:
+            logger.exception("Failed to commit %d segments", len(group))
+            for *_, future in group:
+                future.set_exception(e)
+            return
+        for (*_, future), status in zip(group, results):
+            future.set_result(status)
+
+    def machines(self):
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute(
+                "SELECT machine_id, MAX(seq), COUNT(*), SUM(record_count), MAX(received_at)"
+                " FROM segments GROUP BY machine_id ORDER BY machine_id"
+            ).fetchall()
+        return [
+            {"machine_id": m, "last_seq": s, "segments": n, "records": r, "last_received": t}
+            for m, s, n, r, t in rows
+        ]
+
+    def machine(self, machine_id: str):
+        """Last seq and the log offsets it covers; what an agent resumes from."""
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT seq, offsets_after FROM segments WHERE machine_id = ? ORDER BY seq DESC LIMIT 1",
+                (machine_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"machine_id": machine_id, "last_seq": row[0], "offsets": json.loads(row[1])}
+
+
+def _decode(body: bytes):
+    return json.loads(gzip.decompress(body))
+
+
+def create_app(db_path: str = "collector.db") -> FastAPI:
+    app = FastAPI(title="RVM Telemetry Collector", version="0.1.0")
+    store = SegmentStore(db_path)
+
+    @app.on_event("shutdown")
+    def shutdown_event():
+        store.close()
+
+    @app.get("/health")
+    def health_check():
+        return {"status": "healthy", "service": "rvm-telemetry-collector"}
+
+    @app.post("/v1/segments")
+    async def ingest_segment(request: Request):
+        machine_id = request.headers.get("X-Machine-Id")
+        seq = request.headers.get("X-Sequence")
+        checksum = request.headers.get("X-Checksum-SHA256")
+        if not machine_id or seq is None or not checksum:
+            raise HTTPException(status_code=400, detail="Missing machine, sequence or checksum header")
+
+        body = await request.body()
+        if hashlib.sha256(body).hexdigest() != checksum:
+            raise HTTPException(status_code=400, detail="Checksum mismatch")
+        try:
+            payload = await run_in_threadpool(_decode, body)
+        except (OSError, ValueError):
+            raise HTTPException(status_code=400, detail="Segment is not valid gzip JSON")
+        if payload.get("machine_id") != machine_id or str(payload.get("seq")) != seq:
+            raise HTTPException(status_code=400, detail="Headers do not match segment contents")
+
+        status = await asyncio.wrap_future(
+            store.submit(
+                machine_id, int(seq), checksum, payload.get("records", []), payload.get("offsets_after", {})
+            )
+        )
+        if status == "conflict":
+            raise HTTPException(status_code=409, detail="Sequence already stored with different contents")
+        return {"status": status, "machine_id": machine_id, "seq": int(seq)}
+
+    @app.get("/v1/machines")
+    async def list_machines():
+        return await run_in_threadpool(store.machines)
+
+    @app.get("/v1/machines/{machine_id}")
+    async def get_machine(machine_id: str):
+        machine = await run_in_threadpool(store.machine, machine_id)
+        if machine is None:
+            raise HTTPException(status_code=404, detail="No segments stored for this machine")
+        return machine
+
+    return app
@@ -0,0 +1,164 @@
+"""Shared pytest setup: import paths, polling helper and hardware fakes."""
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from app.modules.ai import Detection, RealAI  # noqa: E402
+from app.modules.cpu_budget import PROFILES  # noqa: E402
+
+
+def wait_for(condition, timeout: float = 10.0, interval: float = 0.02) -> bool:
+    """Poll until condition() is truthy; background threads need a moment."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(interval)
+    return bool(condition())
+
+
+def bottle(confidence: float = 0.9, source: str = "detector", frame=None) -> Detection:
+    boxes = [(0, 0.5, 0.5, 0.2, 0.4, confidence)] if source == "detector" else []
+    return Detection("bottle", confidence, frame, boxes, source=source)
+
+
+class FakeAI:
+    """Stands in for RealAI without a camera or model.
+
+    Every detection call returns `detection` (with the frame filled in)
+    after `delay` seconds and is counted in `calls`.
+    """
+
+    is_water_bottle = RealAI.is_water_bottle
+
+    def __init__(self, detection: Detection = None, delay: float = 0.0):
+        self.detection = detection or bottle()
+        self.delay = delay
+        self.calls = 0
+        self.batches = []
+        self.model_path = None
+        self.cpu_profile = PROFILES["default"]
+        self._lock = threading.Lock()
+
+    def add_frame_listener(self, callback, device=None):
+        pass
+
+    def release_camera(self, device=None):
+        pass
+
+    def capture_frame(self, device=None):
+        return np.random.default_rng().integers(0, 255, (48, 64, 3), dtype=np.uint8)
+
+    def detect_details(self, source):
+        frame = self.capture_frame() if isinstance(source, int) else source
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames):
+        with self._lock:
+            self.calls += 1
+            self.batches.append(len(frames))
+        time.sleep(self.delay)
+        d = self.detection
+        return [Detection(d.detected_class, d.confidence, frame, list(d.boxes), source=d.source) for frame in frames]
+
+
+class FakeArduino:
+    """Records trapdoor commands; `working=False` behaves like a failed or unplugged board."""
+
+    def __init__(self, working: bool = True):
+        self.working = working
+        self.actions = []
+
+    def connect(self):
+        return self.working
+
+    def disconnect(self):
+        return True
+
+    def open_trapdoor_with_timer(self, auto_close_delay: float = 2.0):
+        self.actions.append("open")
+        return self.working
+
+    def close_trapdoor(self):
+        self.actions.append("close")
+        return self.working
+
+
+class FakeCollector:
+    def __init__(self):
+        self.samples = []
+
+    def submit(self, frame, boxes, reason, detected_class, confidence):
+        self.samples.append((boxes, reason, detected_class, confidence))
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def make_manager(tmp_path):
+    """Factory for StateManagers on fakes, all sharing one logs dir under tmp_path."""
+    from app.services.state_manager import StateManager
+
+    managers = []
+
+    def factory(ai=None, arduino=None, hard_negatives=None, **kwargs):
+        manager = StateManager(
+            ai=ai or FakeAI(),
+            arduino=arduino or FakeArduino(),
+            hard_negatives=hard_negatives or FakeCollector(),
+            logs_dir=tmp_path / "logs",
+            **kwargs,
+        )
+        managers.append(manager)
+        return manager
+
+    yield factory
+    for manager in managers:
+        manager.shutdown()
+
+
+class FakeLanes:
+    """LaneRegistry stand-in holding one lane built on fakes."""
+
+    def __init__(self, manager, ai):
+        self.default = manager
+        self.lanes = {manager.lane_id: manager}
+        self.ai = ai
+
+    def get(self, lane_id):
+        return self.lanes.get(lane_id)
+
+    def shutdown(self):
+        pass
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path, make_manager):
+    """app.main imported against one fake lane and a coupon database under tmp_path.
+
+    Startup hooks are not run; tests call the route helpers directly or
+    use a TestClient without entering it.
+    """
+    import app.services
+    from app.services.coupons import CouponService
+
+    ai = FakeAI()
+    manager = make_manager(ai=ai)
+    coupons = CouponService(tmp_path / "coupons.db", pool_size=20)
+    monkeypatch.setattr(app.services, "LaneRegistry", lambda: FakeLanes(manager, ai))
+    monkeypatch.setattr(app.services, "CouponService", lambda: coupons)
+    monkeypatch.delitem(sys.modules, "app.main", raising=False)
+    import app.main as main
+
+    yield main
+    coupons.close()
+    sys.modules.pop("app.main", None)
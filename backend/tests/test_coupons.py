@@ -0,0 +1,132 @@
+"""Coupon codes: issue/redeem once, typo and unknown-code rejection, the Bloom filter, partner auth."""
+import sqlite3
+
+import pytest
+from fastapi import HTTPException
+
+from app.auth import require_admin, require_partner
+from app.models import CouponRequest
+from app.services.coupons import ALPHABET, BloomFilter, CouponService, generate_code, normalize_code
+from conftest import wait_for
+
+
+@pytest.fixture
+def service(tmp_path):
+    services = []
+
+    def factory(**kwargs):
+        kwargs.setdefault("pool_size", 20)
+        svc = CouponService(tmp_path / "coupons.db", **kwargs)
+        services.append(svc)
+        assert wait_for(svc._bloom_ready.is_set)
+        return svc
+
+    yield factory
+    for svc in services:
+        svc.close()
+
+
+def test_code_redeems_exactly_once(service):
+    coupons = service()
+    code = coupons.issue(lane_id="0", item="bottle").code
+
+    assert coupons.verify(code.lower()).status == "issued"
+    redeemed, coupon = coupons.redeem(code, "shop")
+    assert redeemed and coupon.status == "redeemed" and coupon.partner_id == "shop"
+    redeemed, coupon = coupons.redeem(code, "other")
+    assert not redeemed and coupon.partner_id == "shop"
+
+
+def test_pooled_and_unknown_codes_are_rejected(service):
+    coupons = service()
+    assert wait_for(lambda: coupons._pool)  # filled by the refill thread
+    pooled = coupons._pool[0]
+
+    assert coupons.verify(pooled) is None
+    assert coupons.redeem(generate_code(), "shop") == (False, None)
+
+
+def test_check_character_catches_every_single_substitution():
+    code = generate_code()
+    for i, original in enumerate(code):
+        for c in ALPHABET:
+            if c != original:
+                assert normalize_code(code[:i] + c + code[i + 1:]) is None
+
+
+def test_bloom_filter_is_sized_from_issued_codes(tmp_path, service):
+    db = tmp_path / "coupons.db"
+    with sqlite3.connect(db) as conn:
+        conn.execute("CREATE TABLE coupons (code TEXT PRIMARY KEY, status TEXT NOT NULL DEFAULT 'pool',"
+                     " lane_id TEXT, item TEXT, issued_at REAL, redeemed_at REAL, partner_id TEXT) WITHOUT ROWID")
+        conn.executemany("INSERT INTO coupons (code, status, issued_at) VALUES (?, 'issued', 1.0)",
+                         [(generate_code(),) for _ in range(300)])
+
+    coupons = service(min_bloom_capacity=100)
+
+    assert coupons.bloom.capacity == 600
+
+
+def test_bloom_filter_is_rebuilt_when_full(service):
+    coupons = service(min_bloom_capacity=10)
+    codes = [coupons.issue().code for _ in range(15)]
+
+    assert wait_for(lambda: coupons.bloom.capacity > 10 and coupons._next_bloom is None)
+    assert all(code in coupons.bloom for code in codes)
+    assert all(coupons.verify(code) is not None for code in codes)
+
+
+def test_saved_filter_is_reused_and_caught_up(tmp_path, service, caplog):
+    coupons = service()
+    first = coupons.issue().code
+    coupons.close()
+    saved, _ = BloomFilter.load(tmp_path / "coupons.bloom")
+    assert first in saved
+
+    # Backdate the saved code so only codes issued after the save get
+    # hashed again, and issue one behind the service's back as if it was
+    # printed just before a crash.
+    with sqlite3.connect(tmp_path / "coupons.db") as conn:
+        conn.execute("UPDATE coupons SET issued_at = 1.0 WHERE code = ?", (first,))
+        (later,) = conn.execute("SELECT code FROM coupons WHERE status = 'pool' LIMIT 1").fetchone()
+        conn.execute("UPDATE coupons SET status = 'issued', issued_at = strftime('%s', 'now') + 1000"
+                     " WHERE code = ?", (later,))
+
+    with caplog.at_level("INFO", logger="app.services.coupons"):
+        reopened = service()
+
+    assert first in reopened.bloom and later in reopened.bloom
+    assert reopened.verify(later) is not None
+    assert "2 issued codes, 1 hashed" in caplog.text
+
+
+def _status(call, *args):
+    try:
+        call(*args)
+    except HTTPException as e:
+        return e.status_code
+    return 200
+
+
+def test_admin_and_partner_tokens(monkeypatch):
+    monkeypatch.delenv("RVM_ADMIN_TOKEN", raising=False)
+    monkeypatch.delenv("RVM_PARTNER_TOKENS", raising=False)
+    assert _status(require_admin, "anything") == 403
+    assert _status(require_partner, "anything") == 403
+
+    monkeypatch.setenv("RVM_ADMIN_TOKEN", "admin-secret")
+    monkeypatch.setenv("RVM_PARTNER_TOKENS", "shop:shop-secret, cafe:cafe-secret")
+    assert _status(require_admin, None) == 401
+    assert _status(require_admin, "nope") == 401
+    assert _status(require_admin, "admin-secret") == 200
+    assert _status(require_partner, "admin-secret") == 401
+    assert require_partner("cafe-secret") == "cafe"
+
+
+def test_redeem_routes(api):
+    code = api.issue_coupon().code
+
+    response = api.redeem_coupon(CouponRequest(code=code), partner_id="cafe")
+    assert response.status == "redeemed" and response.partner_id == "cafe"
+    assert _status(api.redeem_coupon, CouponRequest(code=code), "shop") == 409
+    assert _status(api.verify_coupon, CouponRequest(code=generate_code())) == 404
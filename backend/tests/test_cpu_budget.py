@@ -0,0 +1,54 @@
+"""CPU profiles: the default leaves the machine alone; pinned threads size torch to their CPUs."""
+import os
+import threading
+
+import pytest
+import torch
+
+from app.modules.cpu_budget import PROFILES, CpuProfile, load_profile, pin_thread
+
+
+def _in_thread(fn):
+    result = []
+    t = threading.Thread(target=lambda: result.append(fn()))
+    t.start()
+    t.join()
+    return result[0]
+
+
+@pytest.fixture
+def restore_torch_threads():
+    threads = torch.get_num_threads()
+    yield
+    torch.set_num_threads(threads)
+
+
+def test_default_profile_changes_nothing(monkeypatch):
+    monkeypatch.delenv("RVM_CPU_PROFILE", raising=False)
+    assert load_profile() == CpuProfile("default")
+    assert load_profile("no-such-profile") == PROFILES["default"]
+
+
+def test_pin_is_skipped_without_the_listed_cpus():
+    profile = CpuProfile("big", torch_threads=8, io_cpus=(0, 4096))
+
+    def pin():
+        before = os.sched_getaffinity(0), torch.get_num_threads()
+        pin_thread(profile, "io")
+        return before == (os.sched_getaffinity(0), torch.get_num_threads())
+
+    assert _in_thread(pin)
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="no CPU affinity")
+def test_pinned_thread_caps_torch_at_its_cpus(restore_torch_threads):
+    cpu = min(os.sched_getaffinity(0))
+    profile = CpuProfile("one_io_core", torch_threads=3, io_cpus=(cpu,))
+    torch.set_num_threads(3)
+
+    def pin():
+        pin_thread(profile, "io")
+        return os.sched_getaffinity(0), torch.get_num_threads()
+
+    assert _in_thread(pin) == ({cpu}, 1)
+    assert torch.get_num_threads() == 3  # the calling thread's pool is untouched
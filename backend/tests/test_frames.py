@@ -0,0 +1,91 @@
+"""MJPEG passthrough: camera JPEGs reach the preview untouched and are decoded at most once."""
+import asyncio
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+from app.modules.ai import RealAI
+from app.modules.frames import MJPG, CameraFrame
+
+
+def _jpeg():
+    image = np.zeros((48, 64, 3), dtype=np.uint8)
+    image[:, 32:] = 255
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def test_mjpeg_read_keeps_the_camera_jpeg():
+    jpeg = _jpeg()
+    frame = CameraFrame.from_capture(np.frombuffer(jpeg, np.uint8)[None])
+
+    assert frame.to_jpeg() is frame.jpeg and frame.jpeg == jpeg
+    assert frame.image.shape == (48, 64, 3)
+    assert frame.image is frame.image  # decoded once
+
+
+def test_bgr_read_is_encoded_on_demand():
+    image = np.zeros((48, 64, 3), dtype=np.uint8)
+    frame = CameraFrame.from_capture(image)
+
+    assert frame.image is image
+    assert cv2.imdecode(np.frombuffer(frame.to_jpeg(), np.uint8), cv2.IMREAD_COLOR).shape == image.shape
+
+
+def test_corrupt_jpeg_decodes_to_none():
+    assert CameraFrame(jpeg=b"not a jpeg").image is None
+
+
+class FakeCapture:
+    def __init__(self, fourcc):
+        self.fourcc = fourcc
+        self.props = {}
+
+    def set(self, prop, value):
+        self.props[prop] = value
+        return True
+
+    def get(self, prop):
+        return self.fourcc
+
+
+def test_raw_output_only_when_the_camera_confirms_mjpeg():
+    ai = RealAI.__new__(RealAI)
+    yuyv, mjpg = FakeCapture(cv2.VideoWriter_fourcc(*"YUYV")), FakeCapture(MJPG)
+
+    ai._request_mjpeg(yuyv, 0)
+    ai._request_mjpeg(mjpg, 0)
+
+    assert cv2.CAP_PROP_CONVERT_RGB not in yuyv.props
+    assert mjpg.props[cv2.CAP_PROP_CONVERT_RGB] == 0
+
+
+class PreviewAI:
+    model = None
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def get_camera(self, device):
+        return object()
+
+    def read_frame(self, device):
+        return self.frame
+
+
+def test_preview_without_overlay_forwards_camera_bytes(api):
+    jpeg = _jpeg()
+    frame = CameraFrame(jpeg=jpeg)
+    lane = SimpleNamespace(camera_device=0, ai=PreviewAI(frame))
+
+    async def first_part():
+        stream = api._video_feed(lane, overlay=False).body_iterator
+        try:
+            return await stream.__anext__()
+        finally:
+            await stream.aclose()
+
+    part = asyncio.run(first_part())
+
+    assert part == b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n"
+    assert frame._image is None  # never decoded
@@ -0,0 +1,84 @@
+"""Hard-negative capture: which scans become samples and how they are labelled."""
+import json
+
+import numpy as np
+
+from app.modules.capture import HardNegativeCollector
+from conftest import FakeAI, bottle, wait_for
+
+BOX = (0, 0.5, 0.5, 0.2, 0.4, 0.8)
+
+
+def _frame(seed):
+    return np.random.default_rng(seed).integers(0, 255, (48, 64, 3), dtype=np.uint8)
+
+
+def _samples(directory):
+    index = directory / "captures.jsonl"
+    if not index.exists():
+        return []
+    return [json.loads(line) for line in index.read_text().splitlines()]
+
+
+def _labels(directory, sample):
+    return (directory / "labels" / f"{sample['name']}.txt").read_text()
+
+
+def test_unlabelled_frames_are_labelled_by_the_detector(tmp_path):
+    collector = HardNegativeCollector(tmp_path, labeler=lambda frame: [BOX])
+    collector.submit(_frame(1), None, "low_conf", "bottle", 0.4)
+    collector.close()
+
+    [sample] = _samples(tmp_path)
+    assert _labels(tmp_path, sample).startswith("0 0.500000 0.500000 0.200000 0.400000")
+
+
+def test_accepted_frame_without_boxes_is_never_saved_as_background(tmp_path):
+    collector = HardNegativeCollector(tmp_path, labeler=lambda frame: [])
+    collector.submit(_frame(1), None, "low_conf", "bottle", 0.4)
+    collector.submit(_frame(2), [], "low_conf", "bottle", 0.4)
+    collector.close()
+
+    assert _samples(tmp_path) == []
+
+
+def test_rejected_frame_with_no_detections_is_background(tmp_path):
+    collector = HardNegativeCollector(tmp_path, labeler=lambda frame: [])
+    collector.submit(_frame(1), None, "invalid", "unknown", 0.0)
+    collector.close()
+
+    [sample] = _samples(tmp_path)
+    assert _labels(tmp_path, sample) == ""
+
+
+def test_unlabelled_frame_is_skipped_without_a_labeler(tmp_path):
+    collector = HardNegativeCollector(tmp_path)
+    collector.submit(_frame(1), None, "invalid", "can", 0.9)
+    collector.close()
+
+    assert _samples(tmp_path) == []
+
+
+def test_low_confidence_student_scan_produces_a_sample(tmp_path, make_manager):
+    labelled = []
+
+    def labeler(frame):
+        labelled.append(frame.shape)
+        return [BOX]
+
+    collector = HardNegativeCollector(tmp_path / "captured", labeler=labeler)
+    manager = make_manager(ai=FakeAI(bottle(0.4, source="student")), hard_negatives=collector)
+
+    assert manager.start_scan().state.value == "valid_item"
+    assert wait_for(lambda: _samples(tmp_path / "captured"))
+    collector.close()
+
+    [sample] = _samples(tmp_path / "captured")
+    assert sample["reason"] == "low_conf"
+    assert labelled == [(48, 64, 3)]
+
+
+def test_confident_scans_are_not_captured(make_manager):
+    manager = make_manager(ai=FakeAI(bottle(0.9, source="student")))
+    manager.start_scan()
+    assert manager.hard_negatives.samples == []
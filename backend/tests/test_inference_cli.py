@@ -0,0 +1,76 @@
+"""Batch inference CLI: a resumed run neither duplicates nor loses rows."""
+import json
+import queue
+import sys
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "ai" / "scripts"))
+from inference import JsonlWriter, Progress, collect_sources, decode_worker  # noqa: E402
+
+
+def _rows(path):
+    return [json.loads(line)["frame"] for line in open(path)]
+
+
+def test_resume_discards_output_written_after_the_last_checkpoint(tmp_path):
+    out = tmp_path / "detections.jsonl"
+    progress, writer = Progress(out, resume=False), JsonlWriter(out, 0)
+    writer.write([{"frame": 0}, {"frame": 1}])
+    progress.commit(writer.flush(), ["a.jpg"], {"clip.mp4": 4}, [])
+    writer.write([{"frame": 2}])  # flushed by the OS but never checkpointed
+    writer.flush()
+    writer.close()
+    progress.close()
+    with open(progress.path, "a") as f:
+        f.write('{"position": 99, "ima')  # torn by the crash
+
+    resumed = Progress(out, resume=True)
+    JsonlWriter(out, resumed.position).close()
+    resumed.close()
+
+    assert _rows(out) == [0, 1]
+    assert resumed.done_images == {"a.jpg"} and resumed.video_frames == {"clip.mp4": 4}
+
+
+def test_fresh_run_starts_over(tmp_path):
+    out = tmp_path / "detections.jsonl"
+    first = Progress(out, resume=False)
+    first.commit(10, ["a.jpg"], {}, [])
+    first.close()
+
+    second = Progress(out, resume=False)
+    second.close()
+    assert second.done_images == set() and second.path.read_text() == ""
+
+
+def test_video_resumes_after_the_last_checkpointed_frame(tmp_path):
+    video = tmp_path / "clip.avi"
+    writer = cv2.VideoWriter(str(video), cv2.VideoWriter_fourcc(*"MJPG"), 10.0, (64, 48))
+    for i in range(8):
+        writer.write(np.full((48, 64, 3), i * 20, dtype=np.uint8))
+    writer.release()
+    progress = Progress(tmp_path / "out.jsonl", resume=False)
+    progress.video_frames[str(video)] = 3
+    units, frames = queue.Queue(), queue.Queue()
+    units.put(("video", video))
+
+    decode_worker(units, frames, progress, vid_stride=2, stop=threading.Event())
+    progress.close()
+
+    items = [frames.get_nowait() for _ in range(frames.qsize())]
+    assert [item[2] for item in items[:-1]] == [4, 6]
+    assert items[-1] == ("video_end", str(video))
+
+
+def test_sources_are_split_and_sorted(tmp_path):
+    for name in ("b.jpg", "a.PNG", "c.mp4", "notes.txt"):
+        (tmp_path / name).touch()
+
+    images, videos = collect_sources([tmp_path])
+
+    assert [p.name for p in images] == ["a.PNG", "b.jpg"]
+    assert [p.name for p in videos] == ["c.mp4"]
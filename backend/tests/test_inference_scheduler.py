@@ -0,0 +1,84 @@
+"""Cross-lane batching: lone scans run at once, concurrent lanes share a call."""
+import threading
+import time
+
+import pytest
+
+from app.services.inference_scheduler import InferenceScheduler
+from conftest import FakeAI, wait_for
+
+
+@pytest.fixture
+def scheduler():
+    schedulers = []
+
+    def factory(ai, **kwargs):
+        schedulers.append(InferenceScheduler(ai, **kwargs))
+        return schedulers[-1]
+
+    yield factory
+    for s in schedulers:
+        s.shutdown()
+
+
+def _scan(scheduler, results, hold=0.0):
+    with scheduler.scanning():
+        time.sleep(hold)  # capture time
+        results.append(scheduler.detect("frame"))
+
+
+def test_lone_scan_is_not_delayed(scheduler):
+    ai = FakeAI()
+    sched = scheduler(ai, lanes=4, max_wait=1.0)
+
+    started = time.perf_counter()
+    with sched.scanning():
+        sched.detect("frame")
+
+    assert time.perf_counter() - started < 0.5
+    assert ai.batches == [1]
+
+
+def test_concurrent_lanes_share_one_call(scheduler):
+    ai = FakeAI(delay=0.1)
+    sched = scheduler(ai, lanes=4, max_wait=1.0)
+    results = []
+
+    # The first lane runs alone; the next three scan while it is in
+    # inference and are grouped once all three frames are in.
+    first = threading.Thread(target=_scan, args=(sched, results))
+    first.start()
+    assert wait_for(lambda: ai.calls == 1)
+    others = [threading.Thread(target=_scan, args=(sched, results, 0.01 * i)) for i in range(3)]
+    for t in others:
+        t.start()
+    for t in [first] + others:
+        t.join()
+
+    assert ai.batches == [1, 3]
+    assert len(results) == 4
+
+
+def test_batch_is_capped_by_max_wait(scheduler):
+    ai = FakeAI()
+    sched = scheduler(ai, lanes=2, max_wait=0.05)
+    results = []
+
+    with sched.scanning():  # a second lane that never sends its frame
+        started = time.perf_counter()
+        _scan(sched, results)
+
+    assert 0.04 <= time.perf_counter() - started < 0.5
+    assert ai.batches == [1]
+
+
+def test_inference_errors_reach_every_caller(scheduler):
+    ai = FakeAI()
+    ai.detect_batch = lambda frames: 1 / 0
+    sched = scheduler(ai)
+
+    with pytest.raises(ZeroDivisionError):
+        sched.detect("frame")
+    sched.shutdown()
+    with pytest.raises(RuntimeError):
+        sched.detect("frame")
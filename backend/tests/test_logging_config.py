@@ -0,0 +1,81 @@
+"""Hot-path logging: per-site rate limits, sampling, the JSON format and the non-blocking queue."""
+import json
+import logging
+import queue
+
+import pytest
+
+from app import logging_config
+from app.logging_config import JsonFormatter, RateLimitFilter, _DroppingQueueHandler, every, sample
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(logging_config.time, "monotonic", clock)
+    return clock
+
+
+def _record(lineno=10, msg="frame dropped", extra=None):
+    record = logging.LogRecord("app.test", logging.WARNING, "site.py", lineno, msg, (), None)
+    record.__dict__.update(extra or {})
+    return record
+
+
+def test_every_passes_once_per_interval_and_counts_the_rest(clock):
+    limit = RateLimitFilter()
+
+    assert limit.filter(_record(extra=every(5.0)))
+    assert not any(limit.filter(_record(extra=every(5.0))) for _ in range(3))
+    clock.now += 5.0
+    record = _record(extra=every(5.0))
+
+    assert limit.filter(record)
+    assert record.suppressed == 3
+
+
+def test_flood_guard_is_per_call_site(clock):
+    limit = RateLimitFilter(per_second=20.0, burst=5.0)
+
+    assert [limit.filter(_record()) for _ in range(6)] == [True] * 5 + [False]
+    assert limit.filter(_record(lineno=11))  # another line has its own bucket
+    clock.now += 0.1  # tokens come back at 20/s
+    assert limit.filter(_record())
+
+
+def test_sampling(clock):
+    limit = RateLimitFilter()
+    assert not any(limit.filter(_record(extra=sample(0.0))) for _ in range(10))
+    assert all(limit.filter(_record(lineno=11, extra=sample(1.0))) for _ in range(10))
+
+
+def test_json_lines_carry_extra_fields_but_not_controls():
+    record = _record(msg="scan %s", extra={"lane": "2", **every(5.0)})
+    record.args = ("done",)
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["msg"] == "scan done" and entry["lane"] == "2" and entry["level"] == "WARNING"
+    assert "rate_limit" not in entry
+
+
+def test_full_queue_drops_instead_of_blocking():
+    log_queue = queue.Queue(maxsize=1)
+    handler = _DroppingQueueHandler(log_queue)
+
+    handler.emit(_record(msg="first"))
+    handler.emit(_record(msg="second"))
+    handler.emit(_record(msg="third"))
+    assert log_queue.get_nowait().msg == "first"
+    handler.emit(_record(msg="fourth"))
+
+    record = log_queue.get_nowait()
+    assert record.msg == "fourth" and record.dropped == 2
@@ -0,0 +1,77 @@
+"""Model hot swap guards: candidate paths, the promotion minimum and admin-only routes."""
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.auth import require_admin
+from app.modules.ai import DEFAULT_PROMOTE_MIN_SAMPLES, RealAI
+
+
+@pytest.fixture
+def ai():
+    """A RealAI with its hot-swap state only; no model or camera is loaded."""
+    ai = RealAI.__new__(RealAI)
+    ai.swap_lock = threading.Lock()
+    ai.model, ai.model_path, ai.model_loaded = "live", "live.pt", True
+    ai.student = ai.student_path = None
+    ai.candidate = ai.previous = None
+    return ai
+
+
+def _shadowing(samples):
+    return SimpleNamespace(
+        status="shadow", kind="detector", samples=samples, path="candidate.pt", model="candidate",
+        close=lambda: None, report=lambda: {"samples": samples},
+    )
+
+
+def test_promotion_needs_the_configured_samples(ai, monkeypatch):
+    monkeypatch.setenv("RVM_PROMOTE_MIN_SAMPLES", "5")
+    ai.candidate = _shadowing(4)
+    with pytest.raises(ValueError, match="4 shadow samples, 5 required"):
+        ai.promote_candidate()
+    assert ai.model == "live"
+
+    ai.candidate.samples = 5
+    ai.promote_candidate()
+    assert ai.model == "candidate" and ai.previous == ("detector", "live", "live.pt")
+
+
+def test_promotion_without_samples_needs_force(ai):
+    ai.candidate = _shadowing(0)
+    with pytest.raises(ValueError, match="force"):
+        ai.promote_candidate(min_samples=0)
+    with pytest.raises(ValueError, match="required"):
+        ai.promote_candidate()
+
+    ai.promote_candidate(min_samples=0, force=True)
+    assert ai.model == "candidate"
+
+
+def test_invalid_minimum_falls_back_to_default(monkeypatch):
+    monkeypatch.setenv("RVM_PROMOTE_MIN_SAMPLES", "lots")
+    assert RealAI.promote_min_samples() == DEFAULT_PROMOTE_MIN_SAMPLES
+
+
+def test_candidate_paths_stay_inside_models_dir(ai, tmp_path, monkeypatch):
+    models = tmp_path / "models"
+    models.mkdir()
+    (models / "good.pt").touch()
+    (tmp_path / "evil.pt").touch()
+    (models / "link.pt").symlink_to(tmp_path / "evil.pt")
+    monkeypatch.setenv("RVM_MODELS_DIR", str(models))
+
+    assert ai.resolve_candidate_path("good.pt") == str(models / "good.pt")
+    for path in ("../evil.pt", str(tmp_path / "evil.pt"), "link.pt"):
+        with pytest.raises(ValueError, match="must be inside"):
+            ai.resolve_candidate_path(path)
+    with pytest.raises(ValueError, match="not found"):
+        ai.resolve_candidate_path("missing.pt")
+
+
+def test_admin_routes_require_the_admin_token(api):
+    admin_routes = [route for route in api.app.routes if route.path.startswith("/api/admin/")]
+    assert admin_routes
+    for route in admin_routes:
+        assert require_admin in [d.call for d in route.dependant.dependencies], route.path
@@ -0,0 +1,68 @@
+"""Preview overlay: boxes and labels on a reused buffer, clipped to the frame."""
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+from app.modules.overlay import PALETTE, OverlayRenderer
+
+
+class Boxes:
+    def __init__(self, xyxy, cls, conf):
+        self.xyxy = torch.tensor(xyxy, dtype=torch.float32)
+        self.cls = torch.tensor(cls, dtype=torch.float32)
+        self.conf = torch.tensor(conf, dtype=torch.float32)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+
+def _result(xyxy, cls, conf):
+    return SimpleNamespace(boxes=Boxes(xyxy, cls, conf), names={0: "bottle", 1: "can"})
+
+
+def _frame():
+    return np.zeros((120, 160, 3), dtype=np.uint8)
+
+
+def test_draws_box_edges_and_label_without_touching_the_source():
+    renderer = OverlayRenderer()
+    renderer.update(_result([[40, 50, 100, 110]], [1], [0.87]))
+    frame = _frame()
+
+    canvas = renderer.draw(frame)
+
+    assert not frame.any()
+    color = PALETTE[1]
+    assert tuple(canvas[80, 40]) == color and tuple(canvas[110, 70]) == color  # left and bottom edges
+    assert not canvas[80, 70].any()  # inside the box
+    assert canvas[35:50, 40:100].any()  # label above the box
+
+
+def test_boxes_past_the_edges_are_clipped():
+    renderer = OverlayRenderer()
+    renderer.update(_result([[-20, -20, 400, 400], [150, 0, 170, 10]], [0, 0], [0.5, 0.3]))
+
+    canvas = renderer.draw(_frame())
+
+    assert tuple(canvas[119, 80]) == PALETTE[0] and tuple(canvas[60, 159]) == PALETTE[0]
+
+
+def test_buffer_and_glyphs_are_reused():
+    renderer = OverlayRenderer()
+    renderer.update(_result([[10, 30, 60, 80]], [0], [0.9]))
+
+    first = renderer.draw(_frame())
+    second = renderer.draw(_frame())
+
+    assert first is second
+    assert len(renderer._glyphs) == 1
+
+
+def test_empty_result_clears_detections():
+    renderer = OverlayRenderer()
+    renderer.update(_result([[10, 30, 60, 80]], [0], [0.9]))
+    renderer.update(SimpleNamespace(boxes=None, names={}))
+
+    assert not renderer.has_detections
+    assert not renderer.draw(_frame()).any()
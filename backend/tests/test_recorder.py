@@ -0,0 +1,110 @@
+"""Transaction clips: the ring buffer, clip files, lazy MJPEG decode and retention."""
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from app.modules import recorder as recorder_module
+from app.modules.frames import CameraFrame
+from app.modules.recorder import ClipRecorder
+from conftest import wait_for
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(recorder_module.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def make_recorder(tmp_path):
+    recorders = []
+
+    def factory(**kwargs):
+        recorders.append(ClipRecorder(tmp_path / "clips", **kwargs))
+        return recorders[-1]
+
+    yield factory
+    for r in recorders:
+        r.close()
+
+
+def _image(value):
+    return np.full((48, 64, 3), value, dtype=np.uint8)
+
+
+def _clips(recorder):
+    return sorted(recorder.output_dir.glob("*.json"))
+
+
+def test_ring_keeps_the_last_seconds_at_max_fps(make_recorder, clock):
+    recorder = make_recorder(buffer_seconds=2.0, max_fps=2.0)
+    for i in range(30):
+        recorder.push(_image(i))
+        clock.now += 0.25  # 4 fps in, every other frame kept
+
+    assert [frame[0, 0, 0] for _, frame in recorder._frames] == [20, 22, 24, 26, 28]
+
+
+def test_trigger_writes_clip_and_metadata(make_recorder, clock):
+    recorder = make_recorder()
+    jpeg = cv2.imencode(".jpg", _image(200))[1].tobytes()
+    for i in range(5):
+        recorder.push(CameraFrame(jpeg=jpeg) if i % 2 else _image(i))
+        clock.now += 0.1
+
+    recorder.trigger("scan", {"state": "valid_item"})
+
+    assert wait_for(lambda: _clips(recorder))
+    meta = json.loads(_clips(recorder)[0].read_text())
+    assert meta["event"] == "scan" and meta["frames"] == 5 and meta["metadata"] == {"state": "valid_item"}
+    assert _clips(recorder)[0].with_suffix(".mp4").stat().st_size > 0
+
+
+def test_trigger_without_frames_writes_nothing(make_recorder):
+    recorder = make_recorder()
+    recorder.trigger("scan")
+    recorder.close()
+    assert list(recorder.output_dir.iterdir()) == []
+
+
+def test_retention_drops_the_oldest_clips(make_recorder, clock):
+    recorder = make_recorder()
+    old = recorder.output_dir / "20000101_000000_000000_scan.json"
+    old.write_text("{}")
+    os.utime(old, (time.time() - 86400, time.time() - 86400))
+    recorder.max_age_seconds = 3600
+    recorder.push(_image(1))
+
+    recorder.trigger("scan")
+
+    assert wait_for(lambda: not old.exists())
+    assert len(_clips(recorder)) == 1
+
+
+def test_retention_keeps_the_disk_budget(make_recorder, clock):
+    recorder = make_recorder()
+    recorder.push(_image(1))
+    recorder.trigger("first")
+    assert wait_for(lambda: len(_clips(recorder)) == 1)
+    first = _clips(recorder)[0]
+    os.utime(first, (time.time() - 60, time.time() - 60))
+    os.utime(first.with_suffix(".mp4"), (time.time() - 60, time.time() - 60))
+    recorder.max_bytes = sum(p.stat().st_size for p in recorder.output_dir.iterdir()) + 100
+
+    recorder.trigger("second")
+
+    assert wait_for(lambda: not first.exists())
+    assert [json.loads(p.read_text())["event"] for p in _clips(recorder)] == ["second"]
@@ -0,0 +1,68 @@
+"""Lane journal: replay, torn tails, snapshots and the trapdoor state recovery relies on."""
+from app.services.state_journal import StateJournal
+from conftest import FakeArduino
+
+
+def _reopen(journal):
+    journal.close()
+    return StateJournal(journal.directory).view
+
+
+def test_records_replay_after_restart(tmp_path):
+    journal = StateJournal(tmp_path)
+    journal.append("bottle", bottle_id=3)
+    journal.append("print_pending", job={"bottle_id": 3})
+    journal.append("print_pending", job={"bottle_id": 4})
+    journal.append("print_done", bottle_id=3)
+
+    view = _reopen(journal)
+
+    assert view["bottle_id"] == 3
+    assert view["pending_prints"] == [{"bottle_id": 4}]
+
+
+def test_torn_tail_is_ignored_and_truncated(tmp_path):
+    journal = StateJournal(tmp_path)
+    journal.append("bottle", bottle_id=1)
+    journal.close()
+    intact = journal.journal_file.read_bytes()
+    with open(journal.journal_file, "ab") as f:
+        f.write(intact.replace(b'"bottle_id":1', b'"bottle_id":2')[:-5])  # bad CRC, no newline
+
+    view = StateJournal(tmp_path).view
+
+    assert view["bottle_id"] == 1
+    assert journal.journal_file.read_bytes() == intact
+
+
+def test_snapshot_restarts_the_journal(tmp_path):
+    journal = StateJournal(tmp_path, snapshot_every=3)
+    for bottle_id in range(1, 6):
+        journal.append("bottle", bottle_id=bottle_id)
+    journal.close()
+
+    assert journal.snapshot_file.exists()
+    assert StateJournal(tmp_path).view["bottle_id"] == 5
+
+
+def test_failed_close_is_not_journaled_as_closed(make_manager):
+    arduino = FakeArduino()
+    manager = make_manager(arduino=arduino)
+    manager.start_scan()
+
+    arduino.working = False
+    manager.reset()
+
+    assert _reopen(manager.journal)["trapdoor"] == "unknown"
+
+
+def test_unknown_trapdoor_is_closed_on_recovery(make_manager, caplog):
+    broken = make_manager(arduino=FakeArduino(working=False), lane_id="3")
+    broken.journal.close()
+
+    arduino = FakeArduino()
+    restarted = make_manager(arduino=arduino, lane_id="3")
+
+    assert "failed to close" in caplog.text
+    assert arduino.actions == ["close"]
+    assert _reopen(restarted.journal)["trapdoor"] == "closed"
@@ -0,0 +1,130 @@
+"""Lane state machine: compare-and-set transitions and the print-job queue."""
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.models import State, SystemState
+
+
+def _outcome(main, manager):
+    """The scan response's state, or the HTTP status it was refused with."""
+    try:
+        return main._start_scan(manager).state
+    except HTTPException as e:
+        return e.status_code
+
+
+def _scan_concurrently(main, manager, count):
+    barrier = threading.Barrier(count)
+    outcomes = []
+
+    def scan():
+        barrier.wait()
+        outcomes.append(_outcome(main, manager))
+
+    threads = [threading.Thread(target=scan) for _ in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    return outcomes
+
+
+def test_concurrent_scans_run_inference_once(api):
+    manager = api.state_manager
+    manager.ai.delay = 0.3
+
+    outcomes = _scan_concurrently(api, manager, 6)
+
+    assert manager.ai.calls == 1
+    assert sorted(outcomes, key=str) == sorted(["valid_item"] + [409] * 5, key=str)
+    assert manager.get_status().state == State.VALID_ITEM
+
+
+def test_scan_discarded_by_reset_returns_409(api):
+    manager = api.state_manager
+    manager.ai.delay = 0.3
+    result = []
+    scanner = threading.Thread(target=lambda: result.append(_outcome(api, manager)))
+    scanner.start()
+    time.sleep(0.1)
+    manager.reset()
+    scanner.join(5)
+
+    assert result == [409]
+    assert manager.get_status().state == State.IDLE
+
+
+def test_stale_confirm_is_rejected(make_manager):
+    manager = make_manager()
+    manager.start_scan()
+    bottle_id = manager.bottle_id
+
+    # Hold the write lock so confirm reads VALID_ITEM, then publish a newer
+    # state before it can take the lock; its compare-and-set must fail.
+    with manager._write_lock:
+        confirm = threading.Thread(target=manager.confirm_drop)
+        confirm.start()
+        time.sleep(0.1)
+        manager._set_state(SystemState(state=State.IDLE))
+    confirm.join(5)
+
+    assert manager.claim_print_job() is None
+    assert manager.pending_print_ids() == []
+    assert manager.bottle_id == bottle_id
+
+
+def test_duplicate_confirms_print_one_receipt(make_manager):
+    manager = make_manager()
+    manager.start_scan()
+    manager.confirm_drop()
+    manager.confirm_drop()
+
+    assert manager.claim_print_job() is not None
+    assert manager.claim_print_job() is None
+
+
+def test_failed_print_is_kept_for_reprint(make_manager):
+    manager = make_manager()
+    manager.start_scan()
+    manager.confirm_drop()
+    first = manager.claim_print_job()
+    manager.attach_coupon(first["bottle_id"], "AAAA")
+    manager.print_failed(first["bottle_id"])
+
+    manager.start_scan()
+    manager.confirm_drop()
+    second = manager.claim_print_job()
+
+    # The next customer's confirm gets only its own receipt.
+    assert second["bottle_id"] != first["bottle_id"]
+    assert manager.pending_print_ids() == sorted([first["bottle_id"], second["bottle_id"]])
+    [retry] = manager.claim_failed_print_jobs()
+    assert retry["bottle_id"] == first["bottle_id"]
+    assert retry["coupon_code"] == "AAAA"
+
+
+def test_pending_receipts_survive_a_restart(make_manager):
+    manager = make_manager(lane_id="7")
+    manager.start_scan()
+    manager.confirm_drop()
+    job = manager.claim_print_job()
+    manager.attach_coupon(job["bottle_id"], "BBBB")
+    manager.journal.close()
+
+    restarted = make_manager(lane_id="7")
+    [recovered] = restarted.claim_failed_print_jobs()
+    assert recovered["coupon_code"] == "BBBB"
+    assert restarted.bottle_id == manager.bottle_id
+
+
+@pytest.mark.parametrize("lane_state", [State.VALID_ITEM, State.INVALID_ITEM])
+def test_scan_in_a_waiting_state_is_a_400(api, lane_state):
+    manager = api.state_manager
+    with manager._write_lock:
+        manager._set_state(SystemState(state=lane_state))
+    with pytest.raises(HTTPException) as e:
+        api._start_scan(manager)
+    assert e.value.status_code == 400
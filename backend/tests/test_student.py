@@ -0,0 +1,79 @@
+"""Student classifier: export/load, the acceptance rule and batched classification."""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+
+from app.modules.ai import RealAI
+from app.modules.student import StudentClassifier
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "ai" / "scripts"))
+from student_model import StudentNet, export_student, prune_channels  # noqa: E402
+
+
+class CountingModel:
+    def __init__(self, model):
+        self.model = model
+        self.batch_sizes = []
+
+    def __call__(self, x):
+        self.batch_sizes.append(len(x))
+        return self.model(x)
+
+
+@pytest.fixture
+def student(tmp_path):
+    torch.manual_seed(0)
+    path = export_student(StudentNet(widths=(4, 8)), tmp_path, img_size=32)
+    return StudentClassifier(str(path))
+
+
+def _frames(count):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (48, 64, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def test_batch_is_one_forward_pass_with_per_frame_results(student):
+    frames = _frames(3)
+    one_by_one = [student.classify(frame) for frame in frames]
+    student.model = counting = CountingModel(student.model)
+
+    batched = student.classify_batch(frames)
+
+    assert counting.batch_sizes == [3]
+    assert [name for name, _ in batched] == [name for name, _ in one_by_one]
+    assert np.allclose([p for _, p in batched], [p for _, p in one_by_one], atol=1e-5)
+
+
+def test_lane_batch_uses_the_student_once(student):
+    ai = RealAI.__new__(RealAI)
+    counting = CountingModel(student.model)
+    student.model = counting
+
+    detections = ai._infer_batch(None, student, _frames(4))
+
+    assert counting.batch_sizes == [4]
+    assert {d.source for d in detections} == {"student"}
+
+
+def test_bottle_wins_once_it_clears_the_threshold(student):
+    student.model = lambda x: torch.tensor([[0.6, 0.4]] * len(x))  # ["other", "bottle"]
+
+    assert student.classify(_frames(1)[0]) == ("bottle", pytest.approx(0.4))
+    student.accept_threshold = 0.5
+    assert student.classify(_frames(1)[0]) == ("other", pytest.approx(0.6))
+
+
+def test_pruned_student_exports_and_loads(tmp_path):
+    torch.manual_seed(0)
+    net = StudentNet(widths=(8, 16))
+    pruned = prune_channels(net, 0.5)
+    path = export_student(pruned, tmp_path, img_size=32, extra={"pruned": 0.5})
+
+    student = StudentClassifier(str(path))
+
+    assert sum(pruned.widths) < sum(net.widths)
+    name, confidence = student.classify(_frames(1)[0])
+    assert name in ("bottle", "other") and 0.0 <= confidence <= 1.0
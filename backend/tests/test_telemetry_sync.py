@@ -0,0 +1,111 @@
+"""Telemetry agent against the reference collector: exactly-once across state loss."""
+import sqlite3
+import threading
+import time
+
+import pytest
+import uvicorn
+
+from app.services.telemetry_sync import TelemetrySync
+from collector.app import create_app
+from conftest import wait_for
+
+HEADER = "bottle_id,timestamp,detected_class,confidence\n"
+
+
+@pytest.fixture
+def collector(tmp_path):
+    db_path = tmp_path / "collector.db"
+    server = uvicorn.Server(uvicorn.Config(create_app(str(db_path)), host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    assert wait_for(lambda: server.started)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}", db_path
+    server.should_exit = True
+    thread.join(5)
+
+
+def _append_rows(path, ids):
+    new = not path.exists()
+    with open(path, "a") as f:
+        if new:
+            f.write(HEADER)
+        for i in ids:
+            f.write(f"{i},2024-01-01 00:00:{i:02d},bottle,0.9\n")
+
+
+def _bottle_ids(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return [row[0] for row in conn.execute("SELECT bottle_id FROM records ORDER BY bottle_id")]
+
+
+def _agent(url, logs_dir):
+    return TelemetrySync(url, "kiosk-1", logs_dir, batch_records=3, batch_seconds=0, poll_seconds=0.05)
+
+
+def _sync(url, logs_dir, db_path, expected):
+    agent = _agent(url, logs_dir)
+    agent.start()
+    try:
+        assert wait_for(lambda: len(_bottle_ids(db_path)) >= expected)
+        time.sleep(0.3)  # give a duplicate the chance to show up
+    finally:
+        agent.stop()
+
+
+def test_rows_are_uploaded_once(collector, tmp_path):
+    url, db_path = collector
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    _append_rows(logs / "bottle_log_1.csv", range(7))
+
+    _sync(url, logs, db_path, 7)
+
+    assert _bottle_ids(db_path) == list(range(7))
+    assert not list((logs / "outbox").glob("seg-*"))
+
+
+def test_lost_state_resumes_from_collector(collector, tmp_path):
+    url, db_path = collector
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    _append_rows(logs / "bottle_log_1.csv", range(7))
+    _sync(url, logs, db_path, 7)
+
+    (logs / "outbox" / "state.json").unlink()
+    _append_rows(logs / "bottle_log_1.csv", range(7, 9))
+    _sync(url, logs, db_path, 9)
+
+    assert _bottle_ids(db_path) == list(range(9))
+
+
+def test_conflict_resumes_instead_of_resending(collector, tmp_path):
+    url, db_path = collector
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    _append_rows(logs / "bottle_log_1.csv", range(5))
+    _sync(url, logs, db_path, 5)
+
+    # A stale state.json (e.g. restored from a backup) reuses seq 0.
+    (logs / "outbox" / "state.json").write_text('{"offsets": {}, "next_seq": 0}')
+    _append_rows(logs / "bottle_log_1.csv", [5])
+    _sync(url, logs, db_path, 6)
+
+    assert _bottle_ids(db_path) == list(range(6))
+    assert not list((logs / "outbox" / "rejected").iterdir())
+
+
+def test_malformed_row_does_not_stall_the_packer(collector, tmp_path):
+    url, db_path = collector
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    log = logs / "bottle_log_1.csv"
+    _append_rows(log, [0, 1])
+    with open(log, "a") as f:
+        f.write("not-a-number,2024-01-01 00:00:00,bottle,high\n")
+    _append_rows(log, [2, 3])
+
+    _sync(url, logs, db_path, 4)
+
+    assert _bottle_ids(db_path) == [0, 1, 2, 3]